@@ -0,0 +1,278 @@
+import numpy as np
+import pandas as pd
+
+from collections import OrderedDict
+from tdata.datasets.dataset import Dataset
+from tdata.datasets.match_stat_dataset import MatchStatDataset
+from tdata.datasets.sackmann_dataset import SackmannDataset
+from tdata.datasets.sofa_score_dataset import SofaScoreDataset
+from tdata.datasets.oncourt_dataset import OnCourtDataset
+
+
+# The rounds of the fixture's 32-player draws and their round numbers.
+ROUNDS = [('R32', 2), ('R16', 3), ('QF', 4), ('SF', 5), ('F', 6)]
+
+SURFACES = ['hard', 'clay', 'grass', 'i hard']
+
+SCORES = ['6-4 6-4', '7-6(5) 6-3', '6-3 3-6 6-2', '6-7(4) 6-4 7-5',
+          '6-2 6-1', '7-5 4-6 7-6(3)', '6-4 3-6 6-4 6-7(2) 6-3']
+
+# The columns every dataset's stats DataFrame has.
+CORE_COLUMNS = ['winner', 'loser', 'round', 'round_number',
+                'tournament_name', 'start_date', 'surface', 'score', 'year']
+
+
+def simulate_draw(rng, entrants, skills):
+    """Plays out a knockout draw, returning the winner and loser of each
+    match in order of round. The better player wins more often."""
+
+    winners, losers = list(), list()
+    remaining = list(entrants)
+
+    while len(remaining) > 1:
+
+        next_round = list()
+
+        for first, second in zip(remaining[::2], remaining[1::2]):
+
+            p_first = 1. / (1. + np.exp(skills[second] - skills[first]))
+
+            if rng.rand() < p_first:
+                winner, loser = first, second
+            else:
+                winner, loser = second, first
+
+            winners.append(winner)
+            losers.append(loser)
+            next_round.append(winner)
+
+        remaining = next_round
+
+    return winners, losers
+
+
+def simulate_serve(rng, serve_points, p_serve):
+    """Splits serve points into first serves in, first serves won and second
+    serves won."""
+
+    first_in = rng.binomial(serve_points, 0.6)
+    first_won = rng.binomial(first_in, np.clip(p_serve + 0.08, 0, 0.95))
+    second_won = rng.binomial(serve_points - first_in,
+                              np.clip(p_serve - 0.12, 0.05, 1))
+
+    return first_in, first_won, second_won
+
+
+def make_matches(n_players=400, n_tournaments=60, min_year=2010,
+                 max_year=2019, seed=0):
+    """Simulates a deterministic set of matches to benchmark datasets on.
+
+    Each year has n_tournaments 32-player knockout tournaments spread over
+    its weeks. Players are ranked by skill; better players enter more
+    tournaments and win more, so that, as in real data, a few players have
+    hundreds of matches while most have a handful.
+
+    Args:
+        n_players (int): The number of players.
+        n_tournaments (int): The number of tournaments per year.
+        min_year (int): The first year.
+        max_year (int): The last year.
+        seed (int): The random seed.
+
+    Returns:
+        pd.DataFrame: One row per match, with the CORE_COLUMNS, a level
+        column ('G' for the four biggest tournaments of each year, 'A'
+        otherwise) and each player's serve points (winner_serve_points,
+        winner_first_in, winner_first_won, winner_second_won and the same
+        for the loser).
+    """
+
+    rng = np.random.RandomState(seed)
+
+    names = np.array(['Player {:03d}'.format(x) for x in range(n_players)],
+                     dtype=object)
+    skills = np.sort(rng.normal(size=n_players))[::-1]
+    entry_weights = np.exp(-np.arange(n_players) / (n_players / 5.)) + 0.02
+    entry_weights /= entry_weights.sum()
+
+    surfaces = rng.choice(SURFACES, size=n_tournaments, p=[0.5, 0.3, 0.1, 0.1])
+    weeks = np.sort(rng.randint(0, 48, size=n_tournaments))
+    majors = set(rng.choice(n_tournaments, size=4, replace=False))
+
+    rows = list()
+
+    for year in range(min_year, max_year + 1):
+        for tournament in range(n_tournaments):
+
+            entrants = rng.choice(n_players, size=32, replace=False,
+                                  p=entry_weights)
+            winners, losers = simulate_draw(rng, entrants, skills)
+
+            start_date = (pd.Timestamp(year, 1, 1) +
+                          pd.Timedelta(weeks=int(weeks[tournament])))
+
+            round_names = np.repeat([x for x, _ in ROUNDS],
+                                    [16, 8, 4, 2, 1])
+            round_numbers = np.repeat([x for _, x in ROUNDS],
+                                      [16, 8, 4, 2, 1])
+
+            for winner, loser, round_name, round_number in zip(
+                    winners, losers, round_names, round_numbers):
+
+                rows.append({
+                    'winner': names[winner], 'loser': names[loser],
+                    'round': round_name, 'round_number': round_number,
+                    'tournament_name': 'Tournament {:02d}'.format(tournament),
+                    'start_date': start_date,
+                    'surface': surfaces[tournament],
+                    'level': 'G' if tournament in majors else 'A',
+                    'winner_skill': skills[winner],
+                    'loser_skill': skills[loser]})
+
+    matches = pd.DataFrame(rows)
+    matches['year'] = matches['start_date'].dt.year
+    matches['score'] = rng.choice(SCORES, size=matches.shape[0])
+
+    for role in ['winner', 'loser']:
+
+        serve_points = rng.randint(40, 120, size=matches.shape[0])
+        p_serve = 0.62 + 0.03 * matches['{}_skill'.format(role)].values
+
+        first_in, first_won, second_won = simulate_serve(
+            rng, serve_points, p_serve)
+
+        matches['{}_serve_points'.format(role)] = serve_points
+        matches['{}_first_in'.format(role)] = first_in
+        matches['{}_first_won'.format(role)] = first_won
+        matches['{}_second_won'.format(role)] = second_won
+
+    return matches.drop(columns=['winner_skill', 'loser_skill'])
+
+
+def serve_points_won(matches, role):
+
+    return (matches['{}_first_won'.format(role)] +
+            matches['{}_second_won'.format(role)])
+
+
+def match_stat_columns(matches):
+    """Returns the fixture matches with MatchStatDataset's stats columns."""
+
+    df = matches[CORE_COLUMNS].copy()
+
+    for role, other in [('winner', 'loser'), ('loser', 'winner')]:
+
+        other_played = matches['{}_serve_points'.format(other)]
+        other_won = serve_points_won(matches, other)
+
+        df['{}_return_points_won'.format(role)] = other_played - other_won
+        df['{}_return_points_total'.format(role)] = other_played
+        df['{}_return_points_won_pct'.format(role)] = (
+            1 - other_won / other_played)
+        df['{}_serve_points_won_pct'.format(role)] = (
+            serve_points_won(matches, role) /
+            matches['{}_serve_points'.format(role)])
+
+    return df
+
+
+def sackmann_columns(matches):
+    """Returns the fixture matches with SackmannDataset's stats columns."""
+
+    df = matches[CORE_COLUMNS].copy()
+    df['tourney_level'] = matches['level']
+
+    for role in ['winner', 'loser']:
+
+        attempts = matches['{}_serve_points'.format(role)]
+        first_in = matches['{}_first_in'.format(role)]
+        first_won = matches['{}_first_won'.format(role)]
+        second_won = matches['{}_second_won'.format(role)]
+
+        df['{}_serve_1st_attempts'.format(role)] = attempts
+        df['{}_serve_1st_total'.format(role)] = first_in
+        df['{}_serve_1st_won'.format(role)] = first_won
+        df['{}_serve_2nd_won'.format(role)] = second_won
+        df['{}_serve_2nd_total'.format(role)] = attempts - first_in
+        df['{}_first_serve_pct'.format(role)] = first_in / attempts
+        df['{}_first_serve_won_pct'.format(role)] = first_won / first_in
+        df['{}_second_serve_won_pct'.format(role)] = (
+            second_won / (attempts - first_in))
+        df['{}_serve_points_won_pct'.format(role)] = (
+            (first_won + second_won) / attempts)
+
+    return df
+
+
+def sofa_score_columns(matches):
+    """Returns the fixture matches with SofaScoreDataset's stats columns."""
+
+    df = matches[CORE_COLUMNS].copy()
+
+    for role, other in [('winner', 'loser'), ('loser', 'winner')]:
+
+        df['serve_points_played_{}'.format(role)] = (
+            matches['{}_serve_points'.format(role)])
+        df['serve_points_won_{}'.format(role)] = serve_points_won(
+            matches, role)
+        df['return_points_played_{}'.format(role)] = (
+            matches['{}_serve_points'.format(other)])
+        df['return_points_won_{}'.format(role)] = (
+            matches['{}_serve_points'.format(other)] -
+            serve_points_won(matches, other))
+
+    return df
+
+
+def oncourt_columns(matches):
+    """Returns the fixture matches with OnCourtDataset's stats columns."""
+
+    df = matches[CORE_COLUMNS].copy()
+    df['tournament_rank'] = matches['level']
+
+    for suffix, other in [(1, 'loser'), (2, 'winner')]:
+
+        df['RPWOF_{}'.format(suffix)] = (
+            matches['{}_serve_points'.format(other)])
+        df['RPW_{}'.format(suffix)] = (
+            matches['{}_serve_points'.format(other)] -
+            serve_points_won(matches, other))
+        df['UE_{}'.format(suffix)] = np.nan
+        df['WIS_{}'.format(suffix)] = np.nan
+
+    return df
+
+
+# For each dataset: its class, whether its start dates are exact, and the
+# function giving the fixture matches its columns.
+DATASET_FIXTURES = OrderedDict([
+    ('MatchStatDataset', (MatchStatDataset, False, match_stat_columns)),
+    ('SackmannDataset', (SackmannDataset, False, sackmann_columns)),
+    ('SofaScoreDataset', (SofaScoreDataset, True, sofa_score_columns)),
+    ('OnCourtDataset', (OnCourtDataset, True, oncourt_columns))])
+
+
+def make_dataset(dataset_name, matches):
+    """Builds a dataset of the class given over the fixture matches,
+    without reading any files.
+
+    Args:
+        dataset_name (str): A key of DATASET_FIXTURES.
+        matches (pd.DataFrame): The matches made by make_matches.
+
+    Returns:
+        Dataset: The dataset.
+    """
+
+    dataset_class, start_date_is_exact, add_columns = \
+        DATASET_FIXTURES[dataset_name]
+
+    df = add_columns(matches).sort_values(['start_date', 'round_number'],
+                                          kind='mergesort')
+
+    dataset = dataset_class.__new__(dataset_class)
+    dataset.set_stats_df(df.set_index(dataset_class.df_index, drop=False))
+
+    Dataset.__init__(dataset, start_date_is_exact=start_date_is_exact)
+
+    return dataset
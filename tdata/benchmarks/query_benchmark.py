@@ -0,0 +1,362 @@
+import json
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta, timezone
+from tdata.benchmarks.fixture import DATASET_FIXTURES, make_matches, \
+    make_dataset
+
+
+# A single benchmarked call: dataset.<method>(**arguments), reported under
+# its scenario.
+BenchmarkQuery = namedtuple('BenchmarkQuery',
+                            ['scenario', 'method', 'arguments'])
+
+# The date windows queried: everything before a date, about five years, and
+# four weeks.
+WINDOWS = OrderedDict([('all_time', None),
+                       ('long', timedelta(days=5 * 365)),
+                       ('short', timedelta(days=28))])
+
+# The methods which return matches and take the lazy argument.
+MATCH_METHODS = ['get_player_matches', 'get_player_matches_before_event',
+                 'get_matches_between', 'get_head_to_head']
+
+
+def player_groups(dataset, n_top=10):
+    """Splits the dataset's players into the n_top players with the most
+    matches, and journeymen: those between the 10th and 50th percentile of
+    the number of matches played."""
+
+    df = dataset.get_stats_df()
+
+    counts = pd.concat([df['winner'], df['loser']]).value_counts()
+
+    lower, upper = np.percentile(counts.values, [10, 50])
+    journeymen = counts[(counts >= lower) & (counts <= upper)]
+
+    return OrderedDict([('top', list(counts.index[:n_top])),
+                        ('journeyman', list(journeymen.index))])
+
+
+def make_query_mix(dataset, queries_per_scenario=50, seed=0):
+    """Builds a deterministic mix of queries against a dataset.
+
+    The scenarios cover get_player_matches for top players and journeymen
+    over all time, long and short windows, with and without a surface
+    filter; get_player_matches_before_event with and without a round;
+    get_matches_between over long and short windows; calculate_tour_average;
+    get_tournament_serve_average over each window; and get_head_to_head
+    between top players over all time and a long window.
+
+    Args:
+        dataset (Dataset): The dataset to query.
+        queries_per_scenario (int): The number of queries in each scenario.
+        seed (int): The random seed.
+
+    Returns:
+        List[BenchmarkQuery]: The queries, shuffled.
+    """
+
+    rng = np.random.RandomState(seed)
+    df = dataset.get_stats_df()
+
+    groups = player_groups(dataset)
+    surfaces = sorted(df['surface'].dropna().unique())
+    tournaments = sorted(dataset.start_dates)
+    years = sorted(df['year'].unique())
+
+    first_date = df['start_date'].min() + timedelta(days=365)
+    last_date = df['start_date'].max() + timedelta(days=28)
+    n_days = max((last_date - first_date).days, 1)
+
+    def random_date():
+        return (first_date + timedelta(days=int(rng.randint(n_days)))).date()
+
+    def date_range(window):
+        max_date = random_date()
+        min_date = None if window is None else max_date - window
+        return min_date, max_date
+
+    def random_choice(values):
+        return values[rng.randint(len(values))]
+
+    builders = list()
+
+    for group, players in groups.items():
+        for window_name, window in WINDOWS.items():
+            for use_surface in [False, True]:
+
+                scenario = 'get_player_matches[{},{}{}]'.format(
+                    group, window_name, ',surface' if use_surface else '')
+
+                def build(players=players, window=window,
+                          use_surface=use_surface):
+                    min_date, max_date = date_range(window)
+                    return {'player_name': random_choice(players),
+                            'min_date': min_date, 'max_date': max_date,
+                            'surface': (random_choice(surfaces) if
+                                        use_surface else None)}
+
+                builders.append((scenario, 'get_player_matches', build))
+
+        for use_round in [False, True]:
+
+            scenario = 'get_player_matches_before_event[{}{}]'.format(
+                group, ',round' if use_round else '')
+
+            def build(players=players, use_round=use_round):
+                return {'player_name': random_choice(players),
+                        'before_tournament': random_choice(tournaments),
+                        'before_round': (int(rng.randint(2, 7)) if use_round
+                                         else None)}
+
+            builders.append((scenario, 'get_player_matches_before_event',
+                             build))
+
+    for window_name in ['long', 'short']:
+        for use_surface in [False, True]:
+
+            scenario = 'get_matches_between[{}{}]'.format(
+                window_name, ',surface' if use_surface else '')
+
+            def build(window=WINDOWS[window_name], use_surface=use_surface):
+                min_date, max_date = date_range(window)
+                return {'min_date': min_date, 'max_date': max_date,
+                        'surface': (random_choice(surfaces) if use_surface
+                                    else None)}
+
+            builders.append((scenario, 'get_matches_between', build))
+
+    builders.append(('calculate_tour_average', 'calculate_tour_average',
+                     lambda: {'year': int(random_choice(years))}))
+
+    for window_name, window in WINDOWS.items():
+
+        def build(window=window):
+            min_date, max_date = date_range(window)
+            return {'tournament_name': random_choice(tournaments),
+                    'min_date': min_date, 'max_date': max_date}
+
+        builders.append(('get_tournament_serve_average[{}]'.format(
+            window_name), 'get_tournament_serve_average', build))
+
+    for window_name in ['all_time', 'long']:
+
+        def build(window=WINDOWS[window_name]):
+            min_date, max_date = date_range(window)
+            player, opponent = rng.choice(len(groups['top']), size=2,
+                                          replace=False)
+            return {'player_name': groups['top'][player],
+                    'opponent_name': groups['top'][opponent],
+                    'min_date': min_date, 'max_date': max_date}
+
+        builders.append(('get_head_to_head[{}]'.format(window_name),
+                         'get_head_to_head', build))
+
+    queries = [BenchmarkQuery(scenario, method, build())
+               for scenario, method, build in builders
+               for _ in range(queries_per_scenario)]
+
+    return [queries[x] for x in rng.permutation(len(queries))]
+
+
+def summarise(latencies):
+    """Summarises latencies in seconds as their count, p50, p99 and mean in
+    milliseconds, and the throughput in queries per second."""
+
+    latencies = np.asarray(latencies, dtype=float)
+    p50, p99 = np.percentile(latencies, [50, 99])
+
+    return OrderedDict([
+        ('count', int(len(latencies))),
+        ('p50_ms', float(p50 * 1000)),
+        ('p99_ms', float(p99 * 1000)),
+        ('mean_ms', float(latencies.mean() * 1000)),
+        ('throughput_per_s', float(len(latencies) / latencies.sum()))])
+
+
+def run_query(dataset, query, lazy=True):
+    """Runs a query, returning the number of results (1 for averages)."""
+
+    arguments = dict(query.arguments)
+
+    if query.method in MATCH_METHODS:
+        arguments['lazy'] = lazy
+
+    result = getattr(dataset, query.method)(**arguments)
+
+    if query.method in MATCH_METHODS:
+        return len(list(result))
+
+    return 1
+
+
+def run_benchmark(dataset, queries, lazy=True, warm_caches=False):
+    """Times each query of a mix against a dataset.
+
+    Unless warm_caches is True, the dataset's caches are cleared before each
+    query (outside the timing), so that repeated queries measure the lookup
+    rather than a cache hit.
+
+    Args:
+        dataset (Dataset): The dataset to query.
+        queries (Sequence[BenchmarkQuery]): The queries, e.g. from
+            make_query_mix.
+        lazy (bool): Whether to fetch matches as MatchViews, which measures
+            the lookups, or as CompletedMatches, which adds converting each
+            match.
+        warm_caches (bool): Whether to keep the caches filled by earlier
+            queries.
+
+    Returns:
+        OrderedDict: Latency summaries (see summarise) of all queries
+        ('overall'), of each method ('methods') and of each scenario
+        ('scenarios'), the latter with the mean number of results.
+    """
+
+    latencies = OrderedDict()
+    n_results = dict()
+
+    for query in queries:
+
+        if not warm_caches:
+            dataset.clear_caches()
+
+        start = time.perf_counter()
+        count = run_query(dataset, query, lazy=lazy)
+        elapsed = time.perf_counter() - start
+
+        latencies.setdefault((query.method, query.scenario), list()).append(
+            elapsed)
+        n_results.setdefault(query.scenario, list()).append(count)
+
+    methods, scenarios = OrderedDict(), OrderedDict()
+
+    for method, scenario in sorted(latencies):
+
+        methods.setdefault(method, list()).extend(
+            latencies[(method, scenario)])
+
+        scenarios[scenario] = summarise(latencies[(method, scenario)])
+        scenarios[scenario]['mean_results'] = float(
+            np.mean(n_results[scenario]))
+
+    return OrderedDict([
+        ('overall', summarise([x for values in latencies.values()
+                               for x in values])),
+        ('methods', OrderedDict((method, summarise(values))
+                                for method, values in methods.items())),
+        ('scenarios', scenarios)])
+
+
+def run_suite(dataset_names=None, queries_per_scenario=50, seed=0,
+              lazy=True, warm_caches=False, label=None, **fixture_options):
+    """Benchmarks the query mix against each Dataset subclass, all built
+    over the same deterministic fixture (see make_matches).
+
+    Args:
+        dataset_names (Optional[Sequence[str]]): The keys of
+            DATASET_FIXTURES to benchmark. Defaults to all.
+        queries_per_scenario (int): The number of queries in each scenario.
+        seed (int): The seed of the fixture and the query mix.
+        lazy (bool): See run_benchmark.
+        warm_caches (bool): See run_benchmark.
+        label (Optional[str]): A name for the run, e.g. a version.
+        **fixture_options: Passed on to make_matches.
+
+    Returns:
+        OrderedDict: The run's settings and, under 'datasets', the number of
+        matches, build time and benchmark results of each dataset.
+    """
+
+    if dataset_names is None:
+        dataset_names = list(DATASET_FIXTURES)
+
+    matches = make_matches(seed=seed, **fixture_options)
+
+    results = OrderedDict([
+        ('label', label),
+        ('created', datetime.now(timezone.utc).isoformat()),
+        ('python', sys.version.split()[0]),
+        ('numpy', np.__version__),
+        ('pandas', pd.__version__),
+        ('seed', seed),
+        ('queries_per_scenario', queries_per_scenario),
+        ('lazy', lazy),
+        ('warm_caches', warm_caches),
+        ('fixture', fixture_options),
+        ('datasets', OrderedDict())])
+
+    for dataset_name in dataset_names:
+
+        start = time.perf_counter()
+        dataset = make_dataset(dataset_name, matches)
+        build_seconds = time.perf_counter() - start
+
+        queries = make_query_mix(dataset, queries_per_scenario, seed=seed)
+
+        dataset_results = OrderedDict([
+            ('n_matches', int(dataset.get_stats_df().shape[0])),
+            ('build_seconds', build_seconds)])
+        dataset_results.update(run_benchmark(dataset, queries, lazy=lazy,
+                                             warm_caches=warm_caches))
+
+        results['datasets'][dataset_name] = dataset_results
+
+    return results
+
+
+def save_results(results, path):
+    """Saves benchmark results as JSON."""
+
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(path):
+    """Loads benchmark results saved with save_results."""
+
+    with open(path) as f:
+        return json.load(f, object_pairs_hook=OrderedDict)
+
+
+def compare_results(baseline, current, metric='p50_ms', tolerance=0.25):
+    """Finds the scenarios which got slower between two benchmark runs.
+
+    Args:
+        baseline (dict): The results of the earlier run.
+        current (dict): The results of the later run.
+        metric (str): The latency to compare, e.g. p50_ms or p99_ms.
+        tolerance (float): The relative slowdown allowed.
+
+    Returns:
+        List[Tuple[str, str, float, float]]: The dataset, scenario, baseline
+        and current latency of each scenario slower by more than the
+        tolerance.
+    """
+
+    regressions = list()
+
+    for dataset_name, dataset_results in current['datasets'].items():
+
+        old_dataset = baseline['datasets'].get(dataset_name)
+
+        if old_dataset is None:
+            continue
+
+        for scenario, summary in dataset_results['scenarios'].items():
+
+            old_summary = old_dataset['scenarios'].get(scenario)
+
+            if old_summary is None:
+                continue
+
+            if summary[metric] > old_summary[metric] * (1 + tolerance):
+                regressions.append((dataset_name, scenario,
+                                    old_summary[metric], summary[metric]))
+
+    return regressions
@@ -0,0 +1,145 @@
+import threading
+import pandas as pd
+
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """A cache holding at most max_size entries, which evicts the least
+    recently used entry when full.
+
+    Hits, misses and evictions are counted whether or not instrumentation
+    is on, so that long-running processes can check how well a cache works
+    (see stats).
+
+    Attributes:
+        max_size (int): The largest number of entries kept. Zero turns the
+            cache off.
+        hits (int): The number of lookups which found their key.
+        misses (int): The number of lookups which did not.
+        evictions (int): The number of entries evicted to make room.
+    """
+
+    def __init__(self, max_size):
+
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getstate__(self):
+
+        state = dict(vars(self))
+        del state['lock']
+
+        return state
+
+    def __setstate__(self, state):
+
+        vars(self).update(state)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+
+        return len(self.entries)
+
+    def __contains__(self, key):
+
+        return key in self.entries
+
+    def lookup(self, key):
+        """Looks up a key, marking it as recently used.
+
+        Returns:
+            Tuple[bool, object]: Whether the key was found, and its value
+            (None if it was not).
+        """
+
+        with self.lock:
+
+            if key not in self.entries:
+                self.misses += 1
+                return False, None
+
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+            return True, self.entries[key]
+
+    def put(self, key, value):
+        """Adds or replaces an entry, evicting the least recently used ones
+        if the cache is full."""
+
+        with self.lock:
+
+            if self.max_size <= 0:
+                return
+
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            self.evict()
+
+    def evict(self):
+
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, max_size):
+        """Changes the largest number of entries kept, evicting entries if
+        there are now too many."""
+
+        with self.lock:
+            self.max_size = max_size
+            self.evict()
+
+    def discard(self, predicate):
+        """Removes the entries whose key the predicate is true for.
+
+        Returns:
+            int: The number of entries removed.
+        """
+
+        with self.lock:
+
+            stale = [key for key in self.entries if predicate(key)]
+
+            for key in stale:
+                del self.entries[key]
+
+        return len(stale)
+
+    def clear(self):
+        """Removes all entries, keeping the statistics."""
+
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """Returns the number of entries, the largest number kept, the hits,
+        misses and evictions and the proportion of lookups which hit (NaN
+        before any lookup) as a dict."""
+
+        with self.lock:
+
+            lookups = self.hits + self.misses
+
+            return OrderedDict([
+                ('size', len(self.entries)),
+                ('max_size', self.max_size),
+                ('hits', self.hits),
+                ('misses', self.misses),
+                ('evictions', self.evictions),
+                ('hit_rate', (self.hits / float(lookups) if lookups > 0
+                              else float('nan')))])
+
+
+def caches_report(caches):
+    """Returns the stats (see LRUCache.stats) of the caches given, a dict
+    from name to LRUCache, as a DataFrame with one row per cache."""
+
+    return pd.DataFrame.from_dict(
+        OrderedDict((name, cache.stats()) for name, cache in
+                    sorted(caches.items())), orient='index')
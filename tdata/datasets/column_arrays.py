@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+from collections.abc import Mapping
+
+
+class ColumnArrays(object):
+    """Holds the columns of a DataFrame as NumPy arrays, so that single rows
+    can be read by position without building a copy of the data.
+
+    For columns stored in a single block, the arrays are views of the
+    DataFrame's data rather than copies. Categorical columns are kept as
+    Categoricals.
+
+    Attributes:
+        arrays (dict): Maps each column name to its array.
+    """
+
+    def __init__(self, df):
+
+        self.arrays = dict()
+        self.converters = dict()
+        self.categoricals = dict()
+
+        for column_name in df.columns:
+
+            column = df[column_name]
+
+            self.arrays[column_name] = column.values
+
+            if pd.api.types.is_datetime64_any_dtype(column.dtype):
+                # Give Timestamps, as the rest of the code expects.
+                self.converters[column_name] = pd.Timestamp
+
+            elif pd.api.types.is_categorical_dtype(column.dtype):
+                # Read single entries through the codes, which is much faster
+                # than indexing the Categorical.
+                self.categoricals[column_name] = (
+                    column.values.codes,
+                    np.append(column.values.categories.values.astype(object),
+                              np.nan))
+
+        self.length = df.shape[0]
+
+    def __len__(self):
+
+        return self.length
+
+    def __contains__(self, column_name):
+
+        return column_name in self.arrays
+
+    def __getitem__(self, column_name):
+
+        return self.arrays[column_name]
+
+    def value(self, column_name, position):
+        """Returns the entry of the column given at the row position given."""
+
+        if column_name in self.categoricals:
+
+            # Missing entries have code -1, which picks the trailing NaN.
+            codes, categories = self.categoricals[column_name]
+
+            return categories[codes[position]]
+
+        value = self.arrays[column_name][position]
+
+        converter = self.converters.get(column_name)
+
+        return value if converter is None else converter(value)
+
+    def row(self, position):
+        """Returns a read-only mapping from column names to the entries of
+        the row at the position given."""
+
+        return RowView(self, position)
+
+
+class RowView(Mapping):
+    """A row of a ColumnArrays, read by column name. Entries are only looked
+    up when accessed."""
+
+    __slots__ = ('column_arrays', 'position')
+
+    def __init__(self, column_arrays, position):
+
+        self.column_arrays = column_arrays
+        self.position = position
+
+    def __getitem__(self, column_name):
+
+        return self.column_arrays.value(column_name, self.position)
+
+    def __contains__(self, column_name):
+
+        return column_name in self.column_arrays
+
+    def __iter__(self):
+
+        return iter(self.column_arrays.arrays)
+
+    def __len__(self):
+
+        return len(self.column_arrays.arrays)
@@ -0,0 +1,58 @@
+"""Helpers for reading only some columns of a dataset's source files.
+
+Each loader takes a columns argument, which is either the name of one of its
+column profiles or a list of column names:
+
+- 'core' reads the columns the dataset needs to build its matches and their
+  stats, and nothing else.
+- 'with_odds' reads the core columns and the betting odds.
+- 'all' reads every column, as the loaders did before.
+- A list reads the core columns and the columns listed.
+
+The columns read are passed to the csv reader as usecols, together with
+their dtypes, so that the other columns are never parsed.
+"""
+
+
+def resolve_columns(profiles, columns):
+    """Turns a loader's columns argument into the columns to read.
+
+    Args:
+        profiles (dict): Maps the names of the loader's profiles to their
+            columns, None meaning all columns. It must have a 'core' profile.
+        columns (Union[str, Sequence[str]]): A profile name, or the columns
+            to read on top of the core ones.
+
+    Returns:
+        Optional[List[str]]: The columns to read, or None to read them all.
+
+    Raises:
+        ValueError: If columns names an unknown profile.
+    """
+
+    if isinstance(columns, str):
+
+        if columns not in profiles:
+            raise ValueError('Unknown column profile {}. Expected one of '
+                             '{}.'.format(columns, sorted(profiles)))
+
+        selected = profiles[columns]
+
+        return None if selected is None else list(selected)
+
+    core = list(profiles['core'])
+
+    return core + [x for x in columns if x not in core]
+
+
+def column_selector(columns):
+    """Returns the usecols argument of pd.read_csv which reads the columns
+    given, skipping any the file does not have, or None to read all
+    columns."""
+
+    if columns is None:
+        return None
+
+    wanted = set(columns)
+
+    return lambda column_name: column_name in wanted
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+
+def is_string_column(column):
+    """Checks whether the column given holds only strings (or missing
+    values)."""
+
+    if column.dtype != object:
+        return False
+
+    present = column.dropna()
+
+    return len(present) > 0 and all(isinstance(x, str) for x in present)
+
+
+def is_integral(column):
+    """Checks whether all present values of the float column given are whole
+    numbers which float32 holds exactly."""
+
+    values = column.values
+    present = values[~np.isnan(values)]
+
+    return (np.all(np.mod(present, 1) == 0) and
+            np.all(np.abs(present) < 2 ** 24))
+
+
+def compact_column(column, max_category_fraction=0.5):
+    """Returns a version of the column given with a smaller dtype, or the
+    column itself if no smaller dtype applies.
+
+    * String columns become categoricals, if the number of distinct values
+      is at most max_category_fraction of the number of rows.
+    * Integer columns are downcast to the smallest integer type holding them.
+    * Float columns named *_pct, and float columns holding only whole
+      numbers (counts with missing values), become float32.
+    """
+
+    if is_string_column(column):
+
+        n_distinct = column.nunique(dropna=True)
+
+        if n_distinct <= max_category_fraction * len(column):
+            return column.astype('category')
+
+        return column
+
+    if pd.api.types.is_bool_dtype(column.dtype):
+        return column
+
+    if pd.api.types.is_integer_dtype(column.dtype):
+        return pd.to_numeric(column, downcast='integer')
+
+    if column.dtype == np.float64:
+
+        if column.name.endswith('_pct') or is_integral(column):
+            return column.astype(np.float32)
+
+    return column
+
+
+def compact_frame(df, max_category_fraction=0.5):
+    """Converts the columns of the DataFrame given to smaller dtypes (see
+    compact_column).
+
+    Args:
+        df (pd.DataFrame): The DataFrame to compact.
+        max_category_fraction (float): String columns with at most this
+            fraction of distinct values become categoricals.
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: The compacted DataFrame, and a
+        report with one row per column giving its old and new dtype, its old
+        and new size in bytes and the bytes saved.
+    """
+
+    compacted = dict()
+    rows = list()
+
+    for column_name in df.columns:
+
+        column = df[column_name]
+        new_column = compact_column(
+            column, max_category_fraction=max_category_fraction)
+
+        compacted[column_name] = new_column
+
+        old_bytes = column.memory_usage(index=False, deep=True)
+        new_bytes = new_column.memory_usage(index=False, deep=True)
+
+        rows.append({'column': column_name,
+                     'old_dtype': str(column.dtype),
+                     'new_dtype': str(new_column.dtype),
+                     'old_bytes': old_bytes,
+                     'new_bytes': new_bytes,
+                     'bytes_saved': old_bytes - new_bytes})
+
+    result = pd.DataFrame(compacted, index=df.index, columns=df.columns)
+
+    report = pd.DataFrame(rows).set_index('column').sort_values(
+        'bytes_saved', ascending=False)
+
+    return result, report
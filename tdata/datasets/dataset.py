@@ -1,131 +1,566 @@
+import numpy as np
 import pandas as pd
 
 from itertools import chain
 from abc import abstractmethod, ABCMeta
 from datetime import timedelta, date
-from tdata.datasets.match import CompletedMatch
-from tdata.datasets.score import Score, BadFormattingException
+from tdata.datasets.match import MatchView
+from tdata.datasets.match_stats import MatchStatsArray, divide_or_nan
+from tdata.datasets.score import BadFormattingException
+from tdata.datasets.player_index import PlayerIndex, DateIndex, \
+    HeadToHeadIndex
+from tdata.datasets.column_arrays import ColumnArrays
+from tdata.datasets.serve_averages import ServeAverageIndex
+from tdata.datasets.match_query import MatchQuery, ColumnIndex
+from tdata.datasets.score_parser import parse_scores
+from tdata.datasets.snapshot import load_or_build
+from tdata.datasets.cache import LRUCache, caches_report
+from tdata.datasets import instrumentation
+from tdata.datasets.instrumentation import instrumented
 
 
 class Dataset(object):
     """An abstract base class designed to handle match data from any source.
 
     Attributes:
-        tour_averages (dict): A dictionary storing the tour's average spw, if
-            calculated, for a particular year. This is to avoid costly
-            recomputation.
+        caches (dict): Maps the names of the caches ('tour_averages',
+            'tournament_averages' and 'player_matches') to their LRUCache,
+            which keeps the results of recent calls to avoid costly
+            recomputation. See cache_sizes, cache_stats and clear_caches.
+        player_index (PlayerIndex): The row positions of each player's
+            matches, sorted by date and round.
+        date_index (DateIndex): The row positions of all matches, sorted by
+            date and round.
+        head_to_head_index (HeadToHeadIndex): The row positions of the
+            matches between each pair of players, sorted by date and round.
+        serve_average_index (ServeAverageIndex): Cumulative sums of the match
+            serve averages, used to find tour, tournament and surface
+            averages over any date range.
+        column_arrays (ColumnArrays): The columns of the stats DataFrame as
+            arrays, used to read matches by row position.
+        column_indexes (dict): Maps column names to their ColumnIndex, built
+            the first time a query filters on the column.
+        tour_level_column (Optional[str]): The column holding the level of
+            each tournament, if the dataset has one.
+        parsed_scores (Optional[ParsedScores]): The set-by-set data of every
+            match's score, once get_parsed_scores has been called.
+        compact_report (Optional[pd.DataFrame]): If the dataset was loaded
+            with compact=True, the bytes saved on each column (see
+            compact_frame).
+        read_only (bool): Whether matches may not be appended, as for
+            datasets attached to shared memory (see attach_dataset).
+        optional_stat_columns (dict): Maps the optional MatchStatsArray
+            fields (winners, ues and odds) to the winner's and loser's
+            columns holding them, where the dataset has them.
+        match_stats (Optional[MatchStatsArray]): The stats of every match,
+            once get_match_stats has been called.
     """
 
     __metaclass__ = ABCMeta
 
+    df_index = ['winner', 'loser', 'round', 'tournament_name', 'year']
+
+    tour_level_column = None
+
+    compact_report = None
+
+    read_only = False
+
+    optional_stat_columns = dict()
+
+    # The largest number of entries kept in each cache.
+    cache_sizes = {'tour_averages': 256, 'tournament_averages': 4096,
+                   'player_matches': 1024}
+
     def __init__(self, start_date_is_exact):
 
         # TODO: Unclear how much of the code here is still used. May be ripe for
         # a clean-up.
 
-        self.tour_averages = dict()
-        self.tournament_averages = dict()
+        self.make_caches()
         self.start_date_is_exact = start_date_is_exact
 
         # Also add a lookup of tournament start dates:
         df = self.get_stats_df()
-        df['year'] = df['start_date'].dt.year
-        df = df.set_index(['tournament_name', 'year', 'start_date'])
-        unique = set(df.index.values)
-        self.start_dates = {x[0]: x[2] for x in unique}
+        self.add_year_column(df)
+
+        self.start_dates = dict()
+        self.update_start_dates(df)
+
+        with self.timed('index') as timer:
+            self.column_arrays = ColumnArrays(df)
+            self.player_index = self.build_player_index()
+            self.date_index = self.build_date_index()
+            self.head_to_head_index = self.build_head_to_head_index()
+            self.serve_average_index = self.build_serve_average_index()
+            timer.rows += df.shape[0]
+
+        self.column_indexes = dict()
+        self.player_codes = None
+        self.chronological_ranks = None
+        self.match_dates = None
+        self.parsed_scores = None
+        self.match_stats = None
+
+    @classmethod
+    def load_cached(cls, snapshot_dir=None, mmap=True, **arguments):
+        """Loads the dataset from a snapshot if possible, saving one
+        otherwise.
+
+        Snapshots are keyed by the dataset class, its constructor arguments
+        and a hash of its source files, so a snapshot is only used while the
+        source files are unchanged; otherwise, the dataset is constructed as
+        usual and a new snapshot is saved. Old snapshots are not deleted.
+
+        Example:
+            dataset = MatchStatDataset.load_cached(t_type='atp', min_year=2010)
 
-        self.df_index = ['winner', 'loser', 'round', 'tournament_name', 'year']
+        Args:
+            snapshot_dir (Optional[str]): The directory holding the snapshots.
+                Defaults to data/snapshots.
+            mmap (bool): Whether to memory-map the arrays of a restored
+                snapshot rather than reading them into memory.
+            **arguments: The constructor arguments.
 
-        # Add an indexed dict version:
-        self.dict_version = self.get_stats_df().set_index(
-            self.df_index, drop=False).to_dict('index')
+        Returns:
+            Dataset: The dataset.
+        """
 
-    def find_surface(self, tournament_name):
+        return load_or_build(cls, arguments, snapshot_dir=snapshot_dir,
+                             mmap=mmap)
+
+    @classmethod
+    def source_files(cls, arguments):
+        """Returns the files the dataset is loaded from, given its
+        constructor arguments (with defaults filled in). Snapshots are keyed
+        by their contents."""
+
+        raise NotImplementedError(
+            '{} does not support snapshots.'.format(cls.__name__))
+
+    @classmethod
+    def source_version(cls, arguments):
+        """Returns the version of the format of the source files, if they
+        have one, given the constructor arguments. It is part of the snapshot
+        key, so that snapshots are rebuilt when the format changes."""
+
+        return None
+
+    def make_caches(self):
+
+        self.caches = {name: LRUCache(max_size) for name, max_size in
+                       self.cache_sizes.items()}
+
+    def cached(self, cache_name, key, calculate):
+        """Returns the value the cache given holds for the key, calculating
+        and adding it on a miss. Hits and misses are also counted as
+        '{cache_name}.hit' and '{cache_name}.miss' if instrumentation is on.
+
+        Args:
+            cache_name (str): The name of the cache, a key of caches.
+            key (Hashable): The key.
+            calculate (Callable[[], object]): Calculates the value.
+
+        Returns:
+            object: The value.
+        """
+
+        cache = self.caches[cache_name]
+        found, value = cache.lookup(key)
+
+        if found:
+            self.count(cache_name + '.hit')
+            return value
+
+        self.count(cache_name + '.miss')
+
+        value = calculate()
+        cache.put(key, value)
+
+        return value
+
+    def cache_stats(self):
+        """Returns the size, hits, misses and evictions of each cache as a
+        DataFrame (see LRUCache.stats)."""
+
+        return caches_report(self.caches)
+
+    def clear_caches(self):
+        """Empties all caches, e.g. after changing the stats DataFrame
+        other than with append."""
+
+        for cache in self.caches.values():
+            cache.clear()
+
+    def timed(self, phase):
+        """Times a phase of loading or querying the dataset, if
+        instrumentation is on (see tdata.datasets.instrumentation)."""
+
+        return instrumentation.timed('{}.{}'.format(type(self).__name__,
+                                                    phase))
+
+    def count(self, counter):
+        """Increments a counter of the dataset, if instrumentation is on."""
+
+        instrumentation.count('{}.{}'.format(type(self).__name__, counter))
+
+    @staticmethod
+    def add_year_column(df):
+
+        # Keep the dtype of an existing year column, which may be compacted.
+        years = df['start_date'].dt.year
+        df['year'] = (years if 'year' not in df.columns else
+                      years.astype(df['year'].dtype))
+
+    def update_start_dates(self, df):
+
+        unique = df[['tournament_name', 'year', 'start_date']].drop_duplicates()
+
+        # Later editions replace earlier ones.
+        for tournament_name, start_date in zip(
+                unique['tournament_name'].values, unique['start_date']):
+
+            previous = self.start_dates.get(tournament_name)
+
+            if previous is None or start_date >= previous:
+                self.start_dates[tournament_name] = start_date
+
+    @instrumented
+    def append(self, new_rows):
+        """Adds new matches to the dataset, extending its indexes in place
+        instead of rebuilding them.
+
+        Args:
+            new_rows (pd.DataFrame): The matches to add, with the same
+                columns as the stats DataFrame. They need not be sorted or
+                later than the existing matches.
+
+        Raises:
+            ValueError: If the dataset is read-only, or new_rows does not have
+                exactly the columns of the stats DataFrame, or holds values
+                which cannot be converted to their column's dtype.
+        """
+
+        if self.read_only:
+            raise ValueError('Cannot append to a read-only dataset.')
 
         df = self.get_stats_df()
-        relevant_entries = df[df['tournament_name'] == tournament_name]
-        unique_surfaces = relevant_entries['surface'].unique()
-        assert(len(unique_surfaces) == 1)
-        return unique_surfaces[0]
+        new_rows, widened_dtypes = self.validate_new_rows(new_rows)
+
+        # Only change the stats DataFrame once the new rows are known to be
+        # valid.
+        for column_name, dtype in widened_dtypes.items():
+            df[column_name] = df[column_name].astype(dtype)
+
+        first_position = df.shape[0]
+
+        combined = pd.concat([df, new_rows])
+
+        self.set_stats_df(combined)
+        self.column_arrays = ColumnArrays(combined)
+
+        self.player_index.extend(
+            new_rows['winner'].values, new_rows['loser'].values,
+            new_rows['start_date'].values, new_rows['round_number'].values,
+            first_position)
+        self.date_index.extend(new_rows['start_date'].values,
+                               new_rows['round_number'].values,
+                               first_position)
+        self.head_to_head_index.extend(
+            self.player_index.player_names.get_indexer(
+                new_rows['winner'].values),
+            self.player_index.player_names.get_indexer(
+                new_rows['loser'].values),
+            new_rows['start_date'].values, new_rows['round_number'].values,
+            first_position)
+
+        surfaces = (new_rows['surface'].values if 'surface' in new_rows.columns
+                    else None)
+        self.serve_average_index.extend(
+            new_rows['start_date'].values,
+            self.calculate_serve_averages(new_rows),
+            new_rows['tournament_name'].values, surfaces=surfaces)
+
+        self.update_start_dates(new_rows)
+
+        # Forget the results the new matches may change.
+        new_years = set(new_rows['start_date'].dt.year)
+        new_tournaments = set(new_rows['tournament_name'])
+        new_players = set(new_rows['winner']) | set(new_rows['loser'])
+
+        self.caches['tour_averages'].discard(lambda year: year in new_years)
+        self.caches['tournament_averages'].discard(
+            lambda key: key[0] in new_tournaments)
+        self.caches['player_matches'].discard(
+            lambda key: key[0] in new_players)
+
+        if self.parsed_scores is not None:
+            self.parsed_scores = self.parsed_scores.concatenate(
+                parse_scores(new_rows['score'].values))
+
+        # These are rebuilt when next needed.
+        self.column_indexes = dict()
+        self.player_codes = None
+        self.chronological_ranks = None
+        self.match_dates = None
+        self.match_stats = None
+
+    def validate_new_rows(self, new_rows):
+        """Checks that new rows have the stats DataFrame's columns and
+        converts them to its dtypes. See append.
+
+        The stats DataFrame is left unchanged. Categorical columns are given
+        the union of both sets of categories, so that the concatenation stays
+        categorical; the caller must convert the DataFrame's columns to these
+        widened dtypes.
 
-    def estimate_date_using_round(self, df):
+        Returns:
+            Tuple[pd.DataFrame, dict]: The converted rows, and the widened
+            dtype of each categorical column which needs one.
+        """
 
-        assert(not self.start_date_is_exact)
+        df = self.get_stats_df()
 
-        adjusted_dates = df['start_date'].copy()
+        missing = df.columns.difference(new_rows.columns)
+        extra = new_rows.columns.difference(df.columns)
 
-        # Find all tournament & year combinations and convert
-        tournament_years = df[['tournament_name', 'year']].values.tolist()
-        tournament_years = set([tuple(x) for x in tournament_years])
+        if len(missing) > 0 or len(extra) > 0:
+            raise ValueError(
+                'New rows must have the columns of the dataset. Missing: {}. '
+                'Unexpected: {}.'.format(list(missing), list(extra)))
 
-        for cur_tournament, cur_year in tournament_years:
+        new_rows = new_rows[df.columns].copy()
+        new_rows['start_date'] = pd.to_datetime(new_rows['start_date'])
+        self.add_year_column(new_rows)
 
-            relevant = (df['tournament_name'] == cur_tournament) & (
-                df['year'] == cur_year)
+        widened_dtypes = dict()
 
-            min_round = df[relevant]['round_number'].min()
+        for column_name in df.columns:
 
-            adjusted_rounds = df[relevant]['round_number'] - min_round
+            dtype = df[column_name].dtype
 
-            adjusted_dates[relevant] += pd.to_timedelta(adjusted_rounds,
-                                                        unit='D')
+            if pd.api.types.is_categorical_dtype(dtype):
 
-        return adjusted_dates
+                # Give both the same categories so the concatenation stays
+                # categorical.
+                categories = dtype.categories.union(
+                    pd.Index(new_rows[column_name].dropna().unique()))
 
+                if len(categories) > len(dtype.categories):
+                    dtype = pd.CategoricalDtype(categories,
+                                                ordered=dtype.ordered)
+                    widened_dtypes[column_name] = dtype
 
-    def reduce_to_subset(self, df, min_date=None, max_date=None, surface=None,
-                         before_round=None):
+            try:
+                new_rows[column_name] = new_rows[column_name].astype(dtype)
+            except (ValueError, TypeError) as error:
+                raise ValueError('Column {} cannot be converted to {}: '
+                                 '{}'.format(column_name, dtype, error))
 
-        if min_date is not None or max_date is not None:
+        return (new_rows.set_index(self.df_index, drop=False),
+                widened_dtypes)
 
-            df = df.set_index('start_date', drop=False)
-            df = df.sort_index()
+    def build_player_index(self):
 
-        # Reduce to date range:
-        if min_date is not None:
+        df = self.get_stats_df()
+
+        return PlayerIndex(df['winner'].values, df['loser'].values,
+                           df['start_date'].values, df['round_number'].values)
+
+    def build_date_index(self):
+
+        df = self.get_stats_df()
+
+        return DateIndex(df['start_date'].values, df['round_number'].values)
+
+    def build_head_to_head_index(self):
+
+        df = self.get_stats_df()
+        player_names = self.player_index.player_names
+
+        return HeadToHeadIndex(player_names.get_indexer(df['winner'].values),
+                               player_names.get_indexer(df['loser'].values),
+                               df['start_date'].values,
+                               df['round_number'].values)
+
+    def get_column_index(self, column_name):
+        """Returns the ColumnIndex of the column given, building it if this
+        is the first time it is needed."""
+
+        if column_name not in self.column_indexes:
+            self.column_indexes[column_name] = ColumnIndex(
+                self.column_arrays[column_name])
+
+        return self.column_indexes[column_name]
+
+    def get_player_codes(self):
+        """Returns the player index codes of the winner and loser of each
+        match."""
+
+        if self.player_codes is None:
 
-            df = df[min_date:]
+            n_matches = len(self.column_arrays)
 
-        if max_date is not None:
+            codes = self.player_index.player_names.get_indexer(
+                np.concatenate([self.column_arrays['winner'],
+                                self.column_arrays['loser']]))
 
-            if before_round is None:
+            self.player_codes = (codes[:n_matches], codes[n_matches:])
 
-                # Pick only matches before the current date
-                df = df[:(max_date - timedelta(days=1))]
+        return self.player_codes
 
+    def get_chronological_ranks(self):
+        """Returns the rank of each match in the date index, i.e. its place
+        in chronological order."""
+
+        if self.chronological_ranks is None:
+
+            ranks = np.empty(len(self.date_index.positions), dtype=np.int64)
+            ranks[self.date_index.positions] = np.arange(len(ranks))
+
+            self.chronological_ranks = ranks
+
+        return self.chronological_ranks
+
+    def get_match_dates(self):
+        """Returns the date of each match, aligned with the stats DataFrame.
+        If start dates are only those of the tournaments, the dates are
+        estimated with estimate_date_using_round."""
+
+        if self.match_dates is None:
+
+            df = self.get_stats_df()
+
+            if self.start_date_is_exact:
+                self.match_dates = df['start_date']
             else:
+                self.match_dates = self.estimate_date_using_round(df)
 
-                # Add matches before current round
-                df = df[:max_date]
+        return self.match_dates
 
-                # Remove matches before
-                df = df[
-                    (df.index < pd.Timestamp(max_date)) |
-                    (df['round_number'] < before_round)]
+    def get_parsed_scores(self):
+        """Returns the set-by-set data of every match's score, aligned with
+        the stats DataFrame. The scores are parsed on the first call only."""
 
-        if len(df.shape) == 1:
+        if self.parsed_scores is None:
+            self.parsed_scores = parse_scores(self.column_arrays['score'])
 
-            # Turn single match into DataFrame
-            df = pd.DataFrame([df])
+        return self.parsed_scores
 
-        if surface is not None:
+    def calculate_match_stats(self, df):
+        """Calculates the stats of each match of the DataFrame given from its
+        point counts (see calculate_point_counts) and the
+        optional_stat_columns it has.
 
-            df = df.set_index('surface', drop=False)
+        Returns:
+            MatchStatsArray: The stats, aligned with df.
+        """
 
-            try:
+        counts = self.calculate_point_counts(df)
+
+        arrays = {name: counts[name].values for name in counts.columns}
+
+        for field, columns in self.optional_stat_columns.items():
+            for role, column_name in zip(['winner', 'loser'], columns):
+                if column_name in df.columns:
+                    arrays['{}_{}'.format(role, field)] = pd.to_numeric(
+                        df[column_name], errors='coerce').values
 
-                df = df.loc[[surface]]
+        return MatchStatsArray(df['winner'].values, df['loser'].values,
+                               **arrays)
 
-            except KeyError:
+    def get_match_stats(self):
+        """Returns the stats of every match as a MatchStatsArray aligned with
+        the stats DataFrame, which is much faster than calling
+        calculate_stats for each row when working with all matches. The
+        stats are calculated on the first call only."""
 
-                # No matching matches. Return empty DataFrame.
+        if self.match_stats is None:
+            self.match_stats = self.calculate_match_stats(self.get_stats_df())
 
-                return pd.DataFrame()
+        return self.match_stats
 
-        return df.set_index(self.df_index, drop=False)
+    def query(self):
+        """Returns a MatchQuery over all matches, to be narrowed down with
+        its filter methods."""
 
+        return MatchQuery(self)
+
+    def build_serve_average_index(self):
+
+        df = self.get_stats_df()
+
+        surfaces = df['surface'].values if 'surface' in df.columns else None
+
+        return ServeAverageIndex(df['start_date'].values,
+                                 self.calculate_serve_averages(df),
+                                 df['tournament_name'].values,
+                                 surfaces=surfaces)
+
+    def calculate_serve_averages(self, df):
+        """Calculates the mean of the winner's and loser's proportion of
+        serve points won for each match of the DataFrame given. The
+        *_serve_points_won_pct columns are used where the dataset has them;
+        otherwise, the proportions are found from the point counts."""
+
+        if 'winner_serve_points_won_pct' in df.columns:
+
+            averages = (df['winner_serve_points_won_pct'] +
+                        df['loser_serve_points_won_pct']) / 2
+
+        else:
+
+            counts = self.calculate_point_counts(df)
+
+            averages = (
+                counts['winner_serve_points_won'] /
+                counts['winner_serve_points_played'] +
+                counts['loser_serve_points_won'] /
+                counts['loser_serve_points_played']) / 2
+
+        return averages.values.astype(float)
+
+    def find_surface(self, tournament_name):
+
+        df = self.get_stats_df()
+        relevant_entries = df[df['tournament_name'] == tournament_name]
+        unique_surfaces = relevant_entries['surface'].unique()
+        assert(len(unique_surfaces) == 1)
+        return unique_surfaces[0]
+
+    def estimate_date_using_round(self, df):
+        """Estimates the date of each match from its tournament's start date
+        by assuming that one round is played per day.
+
+        Args:
+            df (pd.DataFrame): The matches to estimate dates for, with columns
+                start_date, tournament_name, year and round_number.
+
+        Returns:
+            pd.Series: The estimated dates, aligned with df. Matches whose
+            round number is missing or not numeric keep their start date.
+        """
+
+        assert(not self.start_date_is_exact)
+
+        rounds = pd.to_numeric(df['round_number'], errors='coerce')
+
+        # The first round of each tournament & year is played on its start
+        # date.
+        first_rounds = rounds.groupby(
+            [df['tournament_name'], df['year']], observed=True).transform(
+                'min')
+
+        adjusted_rounds = (rounds - first_rounds).fillna(0)
+
+        estimated = df['start_date'] + pd.to_timedelta(adjusted_rounds,
+                                                        unit='D')
+
+        return estimated.rename('start_date')
+
+    @instrumented
     def get_player_matches(self, player_name, min_date=None, max_date=None,
-                           surface=None, before_round=None):
+                           surface=None, before_round=None, lazy=False):
         """
         Fetches a player's matches, filtered by date and surface.
 
@@ -138,42 +573,40 @@ class Dataset(object):
                 not included. This is to ensure that the match to predict is
                 not included when making predictions.
             surface (str): The surface to filter matches for.
+            before_round (Optional[int]): If given together with max_date,
+                matches starting on max_date are included if their round
+                number is lower than this.
+            lazy (bool): If True, returns MatchViews which read their fields
+                only when accessed, rather than CompletedMatches.
 
         Returns:
             List[CompletedMatch]: The list of matches the player played
-            in the given period on a given surface.
+            in the given period on a given surface, in chronological order.
         """
 
-        by_players = self.get_stats_df()
-
-        all_matches = list()
+        def find_positions():
 
-        for level in ['winner', 'loser']:
-
-            try:
+            query = self.query().player(player_name).dates(
+                min_date=min_date, max_date=max_date,
+                before_round=before_round)
 
-                cur_matches = by_players.xs(player_name, level=level)
-
-            except KeyError:
-
-                continue
+            if surface is not None:
+                query = query.surface(surface)
 
-            subset = self.reduce_to_subset(
-                cur_matches, min_date=min_date, max_date=max_date,
-                before_round=before_round, surface=surface)
+            # Copy, so that the cache does not hold on to the index.
+            return np.array(query.positions())
 
-            all_matches.append(subset)
+        positions = self.cached(
+            'player_matches',
+            (player_name, min_date, max_date, surface, before_round),
+            find_positions)
 
-        # TODO: Not a fan of the pd.concat here. Maybe there is a faster way?
-        all_matches = pd.concat(all_matches)
-        all_matches = all_matches.sort_values(['start_date', 'round_number'])
-        all_matches = all_matches.set_index(self.df_index, drop=False)
-
-        return self.turn_into_matches(all_matches)
+        return self.matches_at(positions, lazy=lazy)
 
+    @instrumented
     def get_player_matches_before_event(self, player_name, min_date=None,
                                         before_tournament=None,
-                                        before_round=None):
+                                        before_round=None, lazy=False):
         # TODO: test this.
 
         max_date = None
@@ -184,100 +617,272 @@ class Dataset(object):
 
         return self.get_player_matches(player_name, min_date=min_date,
                                        max_date=max_date,
-                                       before_round=before_round)
+                                       before_round=before_round, lazy=lazy)
+
+    @instrumented
+    def get_player_histories(self, player_names, max_dates=None,
+                             before_rounds=None, min_dates=None,
+                             surfaces=None):
+        """Fetches the matches of many players, each up to their own cutoff,
+        in a single vectorised pass.
+
+        Query i finds the same matches as get_player_matches(player_names[i],
+        min_date=min_dates[i], max_date=max_dates[i], surface=surfaces[i],
+        before_round=before_rounds[i]).
+
+        Args:
+            player_names (Sequence[str]): The player for each query.
+            max_dates (Optional[Sequence[datetime.date]]): Exclusive upper
+                date bound for each query. None entries are unbounded.
+            before_rounds (Optional[Sequence[int]]): For each query, matches
+                starting on max_date are included if their round number is
+                lower than this. None entries include no such matches.
+            min_dates (Optional[Sequence[datetime.date]]): Inclusive lower
+                date bound for each query. None entries are unbounded.
+            surfaces (Optional[Sequence[str]]): The surface to filter each
+                query's matches for. None entries keep all surfaces.
+
+        Returns:
+            MatchHistories: The row positions into the stats DataFrame of each
+            query's matches, in chronological order. Use matches_at to turn
+            them into matches.
+        """
+
+        histories = self.player_index.lookup_many(
+            player_names, min_dates=min_dates, max_dates=max_dates,
+            before_rounds=before_rounds)
+
+        if surfaces is not None:
+
+            query_surfaces = np.repeat(np.asarray(surfaces, dtype=object),
+                                       histories.lengths)
+
+            histories = histories.filter(
+                (self.column_arrays['surface'][histories.positions] ==
+                 query_surfaces) | pd.isnull(query_surfaces))
+
+        instrumentation.add_rows(len(histories.positions))
+
+        return histories
+
+    @instrumented
+    def get_head_to_head(self, player_name, opponent_name, min_date=None,
+                         max_date=None, surface=None, before_round=None,
+                         lazy=False):
+        """Fetches the matches between two players, filtered by date and
+        surface. See get_player_matches for the arguments.
+
+        Returns:
+            List[CompletedMatch]: The matches between the two players in the
+            given period on a given surface, in chronological order.
+        """
+
+        query = self.query().player(player_name).opponent(
+            opponent_name).dates(min_date=min_date, max_date=max_date,
+                                 before_round=before_round)
+
+        if surface is not None:
+            query = query.surface(surface)
+
+        return query.matches(lazy=lazy)
+
+    @instrumented
+    def get_head_to_head_histories(self, player_names, opponent_names,
+                                   max_dates=None, before_rounds=None,
+                                   min_dates=None, surfaces=None):
+        """Fetches the matches between many pairs of players, each up to their
+        own cutoff, in a single vectorised pass.
+
+        Query i finds the same matches as get_head_to_head(player_names[i],
+        opponent_names[i], ...). See get_player_histories for the other
+        arguments.
+
+        Returns:
+            MatchHistories: The row positions into the stats DataFrame of each
+            query's matches, in chronological order.
+        """
+
+        player_names_index = self.player_index.player_names
+
+        histories = self.head_to_head_index.lookup_many(
+            player_names_index.get_indexer(
+                pd.Index(list(player_names), dtype=object)),
+            player_names_index.get_indexer(
+                pd.Index(list(opponent_names), dtype=object)),
+            min_dates=min_dates, max_dates=max_dates,
+            before_rounds=before_rounds)
+
+        if surfaces is not None:
+
+            query_surfaces = np.repeat(np.asarray(surfaces, dtype=object),
+                                       histories.lengths)
+
+            histories = histories.filter(
+                (self.column_arrays['surface'][histories.positions] ==
+                 query_surfaces) | pd.isnull(query_surfaces))
+
+        instrumentation.add_rows(len(histories.positions))
+
+        return histories
+
+    @instrumented
+    def get_head_to_head_totals(self, player_names, opponent_names,
+                                max_dates=None, before_rounds=None,
+                                min_dates=None, surfaces=None):
+        """Adds up the matches between many pairs of players from the first
+        player's point of view. See get_head_to_head_histories for the
+        arguments.
+
+        Returns:
+            pd.DataFrame: One row per query, with the player, the opponent,
+            the number of matches and of wins, the serve and return points
+            played and won (missing counts add nothing) and the proportions
+            of serve and return points won (NaN without points).
+        """
+
+        histories = self.get_head_to_head_histories(
+            player_names, opponent_names, max_dates=max_dates,
+            before_rounds=before_rounds, min_dates=min_dates,
+            surfaces=surfaces)
+
+        n_queries = len(histories)
+        positions = histories.positions
+        query_numbers = histories.query_numbers()
+
+        player_codes = self.player_index.player_names.get_indexer(
+            pd.Index(list(player_names), dtype=object))
+        winner_codes, _ = self.get_player_codes()
+
+        won = winner_codes[positions] == player_codes[query_numbers]
 
+        stats = self.get_match_stats()
+
+        totals = pd.DataFrame({
+            'player': list(player_names),
+            'opponent': list(opponent_names),
+            'matches': histories.lengths,
+            'wins': np.bincount(query_numbers, weights=won,
+                                minlength=n_queries).astype(np.int64)})
+
+        for field in ['serve_points_played', 'serve_points_won',
+                      'return_points_played', 'return_points_won']:
+
+            values = np.where(won, stats['winner_' + field][positions],
+                              stats['loser_' + field][positions])
+
+            totals[field] = np.bincount(
+                query_numbers, weights=np.nan_to_num(values),
+                minlength=n_queries)
+
+        totals['pct_won_serve'] = divide_or_nan(
+            totals['serve_points_won'], totals['serve_points_played'])
+        totals['pct_won_return'] = divide_or_nan(
+            totals['return_points_won'], totals['return_points_played'])
+
+        return totals
+
+    def matches_at(self, positions, lazy=False):
+        """Turns row positions of the stats DataFrame into matches.
+
+        Args:
+            positions (Iterable[int]): The row positions.
+            lazy (bool): If True, returns MatchViews rather than
+                CompletedMatches.
+
+        Returns:
+            Iterator[CompletedMatch]: The matches at the positions given.
+        """
+
+        return self.positions_into_matches(self.column_arrays, positions,
+                                           lazy=lazy)
+
+    @instrumented
     def get_tournament_serve_average(self, tournament_name, min_date=None,
                                      max_date=None):
         """Returns the average probability of winning a point on serve for
         the tournament given.
 
-        Note:
-            TODO: Could accelerate this with an index.
-
         Args:
             tournament_name (str): The name of the tournament to find the
                 serve average for.
             min_date (Optional[datetime.date]): The minimum date to use
-                for the average.
+                for the average. This date is exclusive.
             max_date (Optional[datetime.date]): The maximum date to use
-                for the average.
+                for the average. This date is exclusive.
 
         Returns:
             double: The average probability of winning a point on serve
             in the tournament given in the date range given.
         """
 
-        key = (tournament_name, min_date, max_date)
+        return self.cached(
+            'tournament_averages', (tournament_name, min_date, max_date),
+            lambda: self.serve_average_index.mean(
+                key=('tournament', tournament_name), min_date=min_date,
+                max_date=max_date, include_min=False, include_max=False))
 
-        if key in self.tournament_averages:
-            return self.tournament_averages[key]
+    @instrumented
+    def get_surface_serve_average(self, surface, min_date=None,
+                                  max_date=None):
+        """Returns the average probability of winning a point on serve on
+        the surface given.
 
-        full_df = self.get_stats_df()
-        tournament_df = full_df.set_index('tournament_name')
-        relevant_matches = tournament_df.loc[tournament_name]
-
-        if min_date is not None:
-
-            relevant_matches = relevant_matches[
-                relevant_matches['start_date'] > min_date]
+        Args:
+            surface (str): The surface to find the serve average for.
+            min_date (Optional[datetime.date]): The minimum date to use for
+                the average. This date is inclusive.
+            max_date (Optional[datetime.date]): The maximum date to use for
+                the average. This date is exclusive.
 
-        if max_date is not None:
+        Returns:
+            double: The average probability of winning a point on serve on
+            the surface given in the date range given.
+        """
 
-            relevant_matches = relevant_matches[
-                relevant_matches['start_date'] < max_date]
+        return self.serve_average_index.mean(
+            key=('surface', surface), min_date=min_date, max_date=max_date,
+            include_min=True, include_max=False)
 
-        averages = (relevant_matches['winner_serve_points_won_pct'] +
-                    relevant_matches['loser_serve_points_won_pct']) / 2
+    def turn_into_matches(self, df):
 
-        self.tournament_averages[key] = averages.mean()
+        """Converts the DataFrame given into a list of CompletedMatches."""
 
-        return averages.mean()
+        return self.positions_into_matches(ColumnArrays(df), range(len(df)))
 
-    def turn_into_matches(self, df):
+    def positions_into_matches(self, column_arrays, positions, lazy=False):
+        """Converts the rows at the positions given into CompletedMatches.
 
-        """Converts the DataFrame given into a list of CompletedMatches."""
+        Args:
+            column_arrays (ColumnArrays): The columns to read the rows from.
+            positions (Iterable[int]): The row positions to convert.
+            lazy (bool): If True, yields a MatchView for every row instead.
 
-        # Find records from index:
-        records = (self.dict_version[x] for x in df.index)
+        Returns:
+            Iterator[CompletedMatch]: The matches, skipping any with a badly
+            formatted score.
+        """
 
-        matches = list()
+        for position in positions:
 
-        for row in records:
+            view = MatchView(column_arrays.row(position),
+                             self.calculate_stats)
 
-            stats = self.calculate_stats(
-                row['winner'], row['loser'], row)
+            if lazy:
+                yield view
+                continue
 
             try:
-                score = Score(row['score'], row['winner'], row['loser'])
+                match = view.to_completed_match()
             except BadFormattingException:
-                print("{} is bad formatting. Skipping.".format(row['score']))
+                print("{} is bad formatting. Skipping.".format(
+                    view.row['score']))
                 continue
 
-            # Must have at least two sets
-            # Dropping this requirement for now
-            # if len(score.sets) < 2:
-            #     continue
-
-            if 'surface' not in row:
-                cur_surface = None
-            else:
-                cur_surface = row['surface']
-
-            if 'odds_winner' in row:
-                odds = {row['winner']: row['winner_odds'],
-                        row['loser']: row['loser_odds']}
-            else:
-                odds = None
-
-            match = CompletedMatch(
-                p1=row['winner'], p2=row['loser'], date=row['start_date'],
-                winner=row['winner'], stats=stats,
-                tournament_name=row['tournament_name'], surface=cur_surface,
-                tournament_round=row['round_number'], odds=odds, score=score)
-
             yield match
 
-    def get_matches_between(self, min_date=None, max_date=None, surface=None):
+    @instrumented
+    def get_matches_between(self, min_date=None, max_date=None, surface=None,
+                            lazy=False):
         """Fetches matches in the dataset, optionally filtered by date and
         surface.
 
@@ -289,24 +894,22 @@ class Dataset(object):
                 not included. This is to ensure that the match to predict is
                 not included when making predictions.
             surface (Optional[str]): The surface to filter matches for.
+            lazy (bool): If True, returns MatchViews which read their fields
+                only when accessed, rather than CompletedMatches.
 
         Returns:
             List[CompletedMatch]: The list of matches satisfying the criteria
-            given.
+            given, in chronological order.
         """
 
-        subset = self.get_stats_df()
-
-        subset = self.reduce_to_subset(subset, min_date=min_date,
-                                       max_date=max_date, surface=surface)
-
-        if len(subset) == 0:
-            return []
+        query = self.query().dates(min_date=min_date, max_date=max_date)
 
-        matches = self.turn_into_matches(subset)
+        if surface is not None:
+            query = query.surface(surface)
 
-        return matches
+        return query.matches(lazy=lazy)
 
+    @instrumented
     def calculate_tour_average(self, year):
         """Calculate the tour's average probability of winning a point on serve
         for a given year.
@@ -319,35 +922,45 @@ class Dataset(object):
             for the year given.
         """
 
-        if year in self.tour_averages:
-
-            return self.tour_averages[year]
-
-        else:
-
-            subset = self.get_stats_df()
-
-            subset = subset.set_index('start_date')
+        def calculate():
 
             date_version = date(year, 1, 1)
 
             end_date = date_version + timedelta(days=364)
 
-            relevant = subset[str(date_version):str(end_date)]
-
-            averages = (relevant['winner_serve_points_won_pct'] +
-                        relevant['loser_serve_points_won_pct']) / 2
+            return self.serve_average_index.mean(
+                min_date=date_version, max_date=end_date, include_min=True,
+                include_max=True)
 
-            result = averages.mean()
-
-            self.tour_averages[year] = result
-
-            return result
+        return self.cached('tour_averages', year, calculate)
 
     @abstractmethod
     def get_stats_df(self):
         pass
 
+    @abstractmethod
+    def set_stats_df(self, df):
+        """Replaces the stats DataFrame, e.g. after appending matches."""
+        pass
+
     @abstractmethod
     def calculate_stats(self, winner, loser, row):
         pass
+
+    @abstractmethod
+    def calculate_point_counts(self, df):
+        """Calculates the serve and return points played and won by the winner
+        and loser of each match in the DataFrame given.
+
+        Returns:
+            pd.DataFrame: A DataFrame aligned with df, with the columns
+            {winner,loser}_{serve,return}_points_{won,played}.
+        """
+        pass
+
+    def get_point_counts(self):
+        """Returns the serve and return points played and won in every
+        match, aligned with the stats DataFrame. See calculate_point_counts.
+        """
+
+        return self.calculate_point_counts(self.get_stats_df())
@@ -0,0 +1,291 @@
+"""Optional timing and counter instrumentation for datasets.
+
+Instrumentation is off by default, and costs a single check per call while
+off. Turn it on with enable() or by setting the TDATA_INSTRUMENTATION
+environment variable to 1, then read the results with report(), counters()
+or dump():
+
+    from tdata.datasets import instrumentation
+
+    instrumentation.enable()
+
+    dataset = MatchStatDataset()
+    dataset.get_player_matches('Roger Federer')
+
+    print(instrumentation.report())
+    instrumentation.dump('timings.json')
+
+Timings are kept per name, e.g. "MatchStatDataset.read" for a construction
+phase or "MatchStatDataset.get_player_matches" for a query method, and
+record the number of calls, their total time and the rows they touched.
+Phases may nest: "filter" includes "stats", and
+get_player_matches_before_event includes get_player_matches.
+"""
+
+import os
+import json
+import time
+import inspect
+import threading
+import pandas as pd
+
+from functools import wraps
+from contextlib import contextmanager
+from collections import OrderedDict
+
+
+class Timer(object):
+    """A timed call in progress, to which the rows it touches are added."""
+
+    def __init__(self):
+
+        self.rows = 0
+
+
+class Recorder(object):
+    """Collects timings and counters.
+
+    Attributes:
+        enabled (bool): Whether anything is recorded.
+        timings (dict): Maps names to [calls, total seconds, rows].
+        counts (dict): Maps counter names to their counts.
+    """
+
+    def __init__(self, enabled=False):
+
+        self.enabled = enabled
+        self.timings = dict()
+        self.counts = dict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def active_timers(self):
+
+        if not hasattr(self.local, 'timers'):
+            self.local.timers = list()
+
+        return self.local.timers
+
+    def record(self, name, seconds, rows=0, calls=1):
+
+        with self.lock:
+            entry = self.timings.setdefault(name, [0, 0., 0])
+            entry[0] += calls
+            entry[1] += seconds
+            entry[2] += rows
+
+    def count(self, name, increment=1):
+
+        if not self.enabled:
+            return
+
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + increment
+
+    def add_rows(self, rows):
+        """Adds rows to every call being timed on this thread."""
+
+        if not self.enabled:
+            return
+
+        for timer in self.active_timers():
+            timer.rows += int(rows)
+
+    def start(self):
+
+        timer = Timer()
+        self.active_timers().append(timer)
+
+        return timer, time.perf_counter()
+
+    def resume(self, timer):
+
+        self.active_timers().append(timer)
+
+        return time.perf_counter()
+
+    def pause(self, timer, start):
+        """Stops adding rows to the timer, returning the seconds since
+        start."""
+
+        elapsed = time.perf_counter() - start
+        self.active_timers().remove(timer)
+
+        return elapsed
+
+    def stop(self, name, timer, start):
+
+        self.record(name, self.pause(timer, start), timer.rows)
+
+    def reset(self):
+
+        with self.lock:
+            self.timings = dict()
+            self.counts = dict()
+
+
+RECORDER = Recorder(enabled=os.environ.get('TDATA_INSTRUMENTATION') == '1')
+
+
+@contextmanager
+def timed(name):
+    """Times the block it wraps under the name given, if instrumentation is
+    on. Rows can be added with add_rows, or to the timer it gives:
+
+        with timed('MatchStatDataset.read') as timer:
+            df = read()
+            timer.rows += df.shape[0]
+    """
+
+    if not RECORDER.enabled:
+        yield Timer()
+        return
+
+    timer, start = RECORDER.start()
+
+    try:
+        yield timer
+    finally:
+        RECORDER.stop(name, timer, start)
+
+
+def instrumented(method):
+    """Decorates a Dataset method so that its calls are timed under the
+    dataset's class name and the method's name.
+
+    Methods such as get_player_matches return generators, which do most of
+    their work as they are iterated. For those, the time spent and rows
+    touched while the generator runs are added to the call's timing as it is
+    iterated, so that the timing covers turning rows into matches. Time the
+    caller spends between matches is not included.
+    """
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+
+        if not RECORDER.enabled:
+            return method(self, *args, **kwargs)
+
+        name = '{}.{}'.format(type(self).__name__, method.__name__)
+
+        with timed(name) as timer:
+            result = method(self, *args, **kwargs)
+
+        if not inspect.isgenerator(result):
+            return result
+
+        return timed_iteration(name, result, Timer())
+
+    return wrapper
+
+
+def timed_iteration(name, generator, timer):
+    """Yields from the generator given, adding the time spent and rows
+    touched inside it to the timing of the call which returned it."""
+
+    elapsed = 0.
+
+    try:
+        while True:
+            start = RECORDER.resume(timer)
+
+            try:
+                item = next(generator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += RECORDER.pause(timer, start)
+
+            yield item
+    finally:
+        RECORDER.record(name, elapsed, timer.rows, calls=0)
+
+
+def enable():
+    """Turns instrumentation on."""
+
+    RECORDER.enabled = True
+
+
+def disable():
+    """Turns instrumentation off, keeping what was recorded."""
+
+    RECORDER.enabled = False
+
+
+def is_enabled():
+
+    return RECORDER.enabled
+
+
+def reset():
+    """Forgets everything recorded so far."""
+
+    RECORDER.reset()
+
+
+def add_rows(rows):
+    """Adds rows touched to the calls being timed."""
+
+    RECORDER.add_rows(rows)
+
+
+def count(name, increment=1):
+    """Increments a counter, if instrumentation is on."""
+
+    RECORDER.count(name, increment)
+
+
+def timings():
+    """Returns the timings recorded so far.
+
+    Returns:
+        OrderedDict: Maps each name, in sorted order, to a dict of its number
+        of calls, total seconds and rows touched.
+    """
+
+    with RECORDER.lock:
+        return OrderedDict(
+            (name, {'calls': calls, 'seconds': seconds, 'rows': rows})
+            for name, (calls, seconds, rows) in sorted(
+                RECORDER.timings.items()))
+
+
+def counters():
+    """Returns the counters recorded so far, such as cache hits and misses,
+    as a dict from name to count."""
+
+    with RECORDER.lock:
+        return OrderedDict(sorted(RECORDER.counts.items()))
+
+
+def report():
+    """Returns the timings as a DataFrame with one row per name, giving its
+    calls, total seconds, mean milliseconds per call and rows touched,
+    sorted by total time."""
+
+    df = pd.DataFrame.from_dict(timings(), orient='index',
+                                columns=['calls', 'seconds', 'rows'])
+    df['mean_ms'] = 1000 * df['seconds'] / df['calls']
+
+    return df.sort_values('seconds', ascending=False)
+
+
+def dump(path=None):
+    """Dumps the timings and counters as JSON.
+
+    Args:
+        path (Optional[str]): The file to write to.
+
+    Returns:
+        str: The JSON.
+    """
+
+    dumped = json.dumps({'timings': timings(), 'counters': counters()},
+                        indent=2)
+
+    if path is not None:
+        with open(path, 'w') as f:
+            f.write(dumped)
+
+    return dumped
@@ -0,0 +1,388 @@
+import re
+import unicodedata
+import numpy as np
+import pandas as pd
+
+from datetime import datetime
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+
+# Tokens shorter than this (e.g. initials) are not used for blocking.
+MIN_BLOCKING_TOKEN_LENGTH = 3
+
+# How much the score of a candidate pair drops per max_days of difference
+# between the two dates, so that closer dates win ties.
+DATE_PENALTY = 0.05
+
+# How much the score drops if both records give a round and they differ.
+ROUND_PENALTY = 0.1
+
+# The columns of the mapping table.
+LINK_COLUMNS = ['left_id', 'right_id', 'score', 'day_difference', 'swapped',
+                'method']
+
+# Round codes of the different sources, mapped to a common name.
+ROUND_ALIASES = {
+    'R128': 'R128', 'last_128': 'R128',
+    'R64': 'R64', 'last_64': 'R64',
+    'R32': 'R32', 'last_32': 'R32',
+    'R16': 'R16', 'last_16': 'R16',
+    'QF': 'QF', 'SF': 'SF', 'F': 'F',
+    'RR': 'RR', 'RR A': 'RR', 'RR B': 'RR'}
+
+
+@lru_cache(maxsize=2 ** 16)
+def normalize_name(name):
+    """Normalises a player name for comparison: accents are removed,
+    letters are lower-cased and anything else becomes a single space, so
+    that e.g. "Alex DE Minaur" and "Alex de-Minaur" agree."""
+
+    if not isinstance(name, str):
+        return ''
+
+    ascii_name = unicodedata.normalize('NFKD', name).encode(
+        'ascii', 'ignore').decode('ascii')
+
+    return ' '.join(re.sub('[^a-z]', ' ', ascii_name.lower()).split())
+
+
+def normalize_round(round_name):
+    """Maps a round code of any source to a common name, or None if it is
+    not known."""
+
+    if not isinstance(round_name, str):
+        return None
+
+    return ROUND_ALIASES.get(round_name.strip())
+
+
+def blocking_tokens(normalized_name):
+    """Returns the tokens of a normalised name used for blocking: those of
+    at least MIN_BLOCKING_TOKEN_LENGTH letters, or the first if there are
+    none."""
+
+    tokens = normalized_name.split()
+    long_tokens = [x for x in tokens if len(x) >= MIN_BLOCKING_TOKEN_LENGTH]
+
+    return long_tokens if len(long_tokens) > 0 else tokens[:1]
+
+
+@lru_cache(maxsize=2 ** 16)
+def token_similarity(first, second):
+    """Compares two name tokens. An initial matches any token it starts."""
+
+    if first == second:
+        return 1.
+
+    if len(first) == 1 or len(second) == 1:
+        return 0.9 if first[0] == second[0] else 0.
+
+    return SequenceMatcher(None, first, second).ratio()
+
+
+@lru_cache(maxsize=2 ** 16)
+def name_similarity(first, second):
+    """Compares two normalised names, between 0 and 1.
+
+    Each token of the name with fewer tokens is matched to its most similar
+    token of the other, in any order, so that "federer roger", "r federer"
+    and "roger federer" all agree, and a missing middle name is not held
+    against a match.
+    """
+
+    first_tokens, second_tokens = first.split(), second.split()
+
+    if len(first_tokens) == 0 or len(second_tokens) == 0:
+        return 0.
+
+    if len(first_tokens) > len(second_tokens):
+        first_tokens, second_tokens = second_tokens, first_tokens
+
+    return sum(max(token_similarity(x, y) for y in second_tokens)
+               for x in first_tokens) / len(first_tokens)
+
+
+def week_numbers(dates):
+    """Returns the number of the week (starting on Monday) of each date."""
+
+    days = np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+
+    # The epoch was a Thursday.
+    return (days + 3) // 7
+
+
+def blocking_keys(records, spread_days=0):
+    """Builds the hashed blocking keys of records.
+
+    Each record gets a key for every combination of a blocking token of
+    each player (in either order) and a week. The week is that of the
+    record's date or, with spread_days, every week within spread_days of
+    it, so that records whose dates follow different conventions (such as a
+    tournament's start date and the match date) still share a key.
+
+    Args:
+        records (pd.DataFrame): Records as described in link_records.
+        spread_days (int): How far dates may be apart.
+
+    Returns:
+        pd.DataFrame: The row position and uint64 key of each entry.
+    """
+
+    first_weeks = week_numbers(
+        records['date'].values - np.timedelta64(spread_days, 'D'))
+    last_weeks = week_numbers(
+        records['date'].values + np.timedelta64(spread_days, 'D'))
+
+    positions, keys = list(), list()
+
+    for position, (first, second, first_week, last_week) in enumerate(zip(
+            records['player_1'].values, records['player_2'].values,
+            first_weeks, last_weeks)):
+
+        token_pairs = {tuple(sorted((x, y)))
+                       for x in blocking_tokens(normalize_name(first))
+                       for y in blocking_tokens(normalize_name(second))}
+
+        for week in range(first_week, last_week + 1):
+            for x, y in token_pairs:
+                positions.append(position)
+                keys.append('{}|{}|{}'.format(week, x, y))
+
+    return pd.DataFrame({
+        'position': np.array(positions, dtype=np.int64),
+        'key': pd.util.hash_array(np.array(keys, dtype=object))})
+
+
+def score_candidates(left, right, left_positions, right_positions, max_days):
+    """Scores candidate pairs of records (see link_records).
+
+    Returns:
+        pd.DataFrame: The score, day difference and whether the players are
+        in swapped order, for each pair.
+    """
+
+    names = dict()
+
+    for side, records in [('left', left), ('right', right)]:
+        for column in ['player_1', 'player_2']:
+            names[side, column] = [normalize_name(x) for x in
+                                   records[column].values]
+
+    scores, swapped = list(), list()
+
+    for left_position, right_position in zip(left_positions,
+                                             right_positions):
+
+        left_1 = names['left', 'player_1'][left_position]
+        left_2 = names['left', 'player_2'][left_position]
+        right_1 = names['right', 'player_1'][right_position]
+        right_2 = names['right', 'player_2'][right_position]
+
+        same_order = (name_similarity(left_1, right_1) +
+                      name_similarity(left_2, right_2)) / 2
+        other_order = (name_similarity(left_1, right_2) +
+                       name_similarity(left_2, right_1)) / 2
+
+        scores.append(max(same_order, other_order))
+        swapped.append(other_order > same_order)
+
+    day_differences = np.abs(
+        (left['date'].values[left_positions] -
+         right['date'].values[right_positions]).astype('timedelta64[D]')
+        .astype(np.int64))
+
+    scores = np.array(scores) - DATE_PENALTY * day_differences / max(
+        max_days, 1)
+
+    if 'round' in left.columns and 'round' in right.columns:
+
+        left_rounds = left['round'].map(normalize_round).values
+        right_rounds = right['round'].map(normalize_round).values
+
+        first, second = (left_rounds[left_positions],
+                         right_rounds[right_positions])
+        differ = pd.notnull(first) & pd.notnull(second) & (first != second)
+
+        scores = scores - ROUND_PENALTY * differ
+
+    return pd.DataFrame({'score': scores, 'day_difference': day_differences,
+                         'swapped': np.array(swapped, dtype=bool)})
+
+
+def resolve_one_to_one(left_positions, right_positions, scores):
+    """Picks pairs greedily by decreasing score, skipping those whose left
+    or right record is already taken.
+
+    Returns:
+        np.ndarray: The indices of the pairs picked.
+    """
+
+    order = np.lexsort((right_positions, left_positions, -scores))
+
+    taken_left, taken_right = set(), set()
+    picked = list()
+
+    for index in order:
+
+        left_position = left_positions[index]
+        right_position = right_positions[index]
+
+        if left_position in taken_left or right_position in taken_right:
+            continue
+
+        taken_left.add(left_position)
+        taken_right.add(right_position)
+        picked.append(index)
+
+    return np.array(picked, dtype=np.int64)
+
+
+def link_records(left, right, max_days=14, min_score=0.85, existing=None):
+    """Links the records of two sources which describe the same match.
+
+    Records are DataFrames with the columns id (unique within the source),
+    player_1, player_2 and date, and optionally round. The order of the
+    players does not matter. Use dataset_records, sackmann_pbp_records and
+    flashscore_records to make them.
+
+    Candidate pairs are those sharing a hashed blocking key (see
+    blocking_keys), found with a hash join, so the work grows with the
+    number of records rather than the number of pairs. They are scored by
+    how similar the players' names are (see name_similarity), less
+    penalties for their date difference and for differing rounds, and
+    resolved one-to-one.
+
+    Args:
+        left (pd.DataFrame): The records of the first source.
+        right (pd.DataFrame): The records of the second source.
+        max_days (int): How many days apart the dates of linked records may
+            be.
+        min_score (float): The lowest score of a link.
+        existing (Optional[pd.DataFrame]): Links found earlier (e.g. with
+            load_links), including manual ones. Records they cover are not
+            linked again, and they are kept in the result.
+
+    Returns:
+        pd.DataFrame: The mapping table, with the LINK_COLUMNS. Ids are
+        strings, as load_links reads them, so that new and existing links
+        sort and compare alike.
+    """
+
+    if existing is not None:
+        left = left[~left['id'].astype(str).isin(
+            existing['left_id'].astype(str))]
+        right = right[~right['id'].astype(str).isin(
+            existing['right_id'].astype(str))]
+
+    left = left.reset_index(drop=True)
+    right = right.reset_index(drop=True)
+
+    left_keys = blocking_keys(left, spread_days=max_days)
+    right_keys = blocking_keys(right)
+
+    candidates = left_keys.merge(right_keys, on='key',
+                                 suffixes=('_left', '_right'))
+    candidates = candidates[['position_left', 'position_right']]
+    candidates = candidates.drop_duplicates()
+
+    left_positions = candidates['position_left'].values
+    right_positions = candidates['position_right'].values
+
+    scored = score_candidates(left, right, left_positions, right_positions,
+                              max_days)
+
+    acceptable = ((scored['score'].values >= min_score) &
+                  (scored['day_difference'].values <= max_days))
+
+    left_positions = left_positions[acceptable]
+    right_positions = right_positions[acceptable]
+    scored = scored[acceptable]
+
+    picked = resolve_one_to_one(left_positions, right_positions,
+                                scored['score'].values)
+
+    links = pd.DataFrame({
+        'left_id': left['id'].values[left_positions[picked]],
+        'right_id': right['id'].values[right_positions[picked]],
+        'score': scored['score'].values[picked],
+        'day_difference': scored['day_difference'].values[picked],
+        'swapped': scored['swapped'].values[picked],
+        'method': 'auto'}, columns=LINK_COLUMNS)
+
+    if existing is not None:
+        links = pd.concat([existing[LINK_COLUMNS], links], ignore_index=True)
+
+    links['left_id'] = links['left_id'].astype(str)
+    links['right_id'] = links['right_id'].astype(str)
+
+    return links.sort_values(['left_id', 'right_id']).reset_index(drop=True)
+
+
+def dataset_records(dataset):
+    """Returns the records (see link_records) of a dataset's matches. Their
+    ids join the dataset's df_index columns with "|", and their dates are
+    the match dates (see Dataset.get_match_dates), which are estimated if
+    the dataset only knows the tournaments' start dates."""
+
+    df = dataset.get_stats_df()
+
+    ids = df[dataset.df_index[0]].astype(str)
+
+    for column in dataset.df_index[1:]:
+        ids = ids + '|' + df[column].astype(str)
+
+    return pd.DataFrame({'id': ids.values,
+                         'player_1': df['winner'].values,
+                         'player_2': df['loser'].values,
+                         'date': dataset.get_match_dates().values,
+                         'round': df['round'].astype(object).values})
+
+
+def sackmann_pbp_records(df):
+    """Returns the records (see link_records) of Jeff Sackmann's point by
+    point data, such as SackmannImporter.df. Their ids are the pbp_id
+    column, or the row labels if there is none."""
+
+    ids = df['pbp_id'].values if 'pbp_id' in df.columns else df.index.values
+
+    return pd.DataFrame({'id': ids,
+                         'player_1': df['server1'].values,
+                         'player_2': df['server2'].values,
+                         'date': pd.to_datetime(df['date']).values})
+
+
+def flashscore_records(match_dicts):
+    """Returns the records (see link_records) of scraped FlashScore
+    matches, such as FlashScorePointImporter.all_loaded. Their ids are the
+    match_id of each match, or its position if it has none."""
+
+    rows = list()
+
+    for position, match_dict in enumerate(match_dicts):
+
+        player_scores = match_dict['player_scores']
+
+        rows.append({
+            'id': match_dict.get('match_id', position),
+            'player_1': player_scores['full_name_odd_server'],
+            'player_2': player_scores['full_name_even_server'],
+            'date': datetime.strptime(match_dict['match_date'],
+                                      '%d.%m.%Y %H:%M')})
+
+    return pd.DataFrame(rows, columns=['id', 'player_1', 'player_2', 'date'])
+
+
+def save_links(links, path):
+    """Saves a mapping table as csv. Manual links can be added to the file
+    as rows with method "manual"; link_records keeps them when given the
+    table as existing."""
+
+    links[LINK_COLUMNS].to_csv(path, index=False)
+
+
+def load_links(path):
+    """Loads a mapping table saved with save_links. Ids are read as
+    strings."""
+
+    return pd.read_csv(path, dtype={'left_id': str, 'right_id': str})
@@ -1,5 +1,6 @@
 import pandas as pd
 from tdata.utils.utils import flatten_nested_dict
+from tdata.datasets.score import Score
 
 
 class Match(object):
@@ -188,3 +189,135 @@ class CompletedMatch(Match):
                 string += ' '
 
         return string.strip()
+
+
+class MatchView(object):
+    """A completed match read lazily from a row of a dataset.
+
+    Offers the interface of CompletedMatch, but fields are only read from the
+    row when accessed, the stats are only computed when first used and the
+    score is only parsed when first used. Use to_completed_match to
+    materialise the match.
+
+    Note: Unlike the datasets' eager conversion, views are also created for
+        rows with badly formatted scores; accessing their score (or bo5)
+        raises a BadFormattingException.
+
+    Attributes:
+        row (Mapping): The row of the dataset, mapping column names to values.
+    """
+
+    __slots__ = ('row', 'stats_function', '_stats', '_score')
+
+    points = None
+    final_point_level_info = None
+    additional_info = None
+    was_retirement = None
+
+    def __init__(self, row, stats_function):
+        """Creates the view.
+
+        Args:
+            row (Mapping): The dataset row holding the match.
+            stats_function (Callable): Called as stats_function(winner,
+                loser, row) to find the dictionary of MatchStats for the
+                match; this is the dataset's calculate_stats.
+        """
+
+        self.row = row
+        self.stats_function = stats_function
+        self._stats = None
+        self._score = None
+
+    @property
+    def winner(self):
+
+        return self.row['winner']
+
+    @property
+    def loser(self):
+
+        return self.row['loser']
+
+    @property
+    def p1(self):
+
+        return self.row['winner']
+
+    @property
+    def p2(self):
+
+        return self.row['loser']
+
+    @property
+    def date(self):
+
+        return self.row['start_date']
+
+    @property
+    def surface(self):
+
+        return self.row['surface'] if 'surface' in self.row else None
+
+    @property
+    def tournament_name(self):
+
+        return self.row['tournament_name']
+
+    @property
+    def tournament_round(self):
+
+        return self.row['round_number']
+
+    @property
+    def odds(self):
+
+        if 'odds_winner' not in self.row:
+            return None
+
+        return {self.winner: self.row['winner_odds'],
+                self.loser: self.row['loser_odds']}
+
+    @property
+    def stats(self):
+
+        if self._stats is None:
+            self._stats = self.stats_function(self.winner, self.loser,
+                                              self.row)
+
+        return self._stats
+
+    @property
+    def score(self):
+
+        if self._score is None:
+            self._score = Score(self.row['score'], self.winner, self.loser)
+
+        return self._score
+
+    @property
+    def bo5(self):
+
+        return self.score.bo5
+
+    def get_opponent(self, player):
+        """Returns the player faced by the player given."""
+
+        return {self.winner: self.loser, self.loser: self.winner}[player]
+
+    def to_completed_match(self):
+        """Materialises the view as a CompletedMatch."""
+
+        return CompletedMatch(
+            p1=self.p1, p2=self.p2, date=self.date, winner=self.winner,
+            stats=self.stats, tournament_name=self.tournament_name,
+            surface=self.surface, tournament_round=self.tournament_round,
+            odds=self.odds, score=self.score)
+
+    def to_dict(self):
+
+        return self.to_completed_match().to_dict()
+
+    def __str__(self):
+
+        return str(self.to_completed_match())
@@ -0,0 +1,316 @@
+import numpy as np
+import pandas as pd
+
+from tdata.datasets import instrumentation
+from tdata.datasets.player_index import (to_day_number, to_day_numbers,
+                                         to_round_slots, to_before_round_slot)
+
+
+class ColumnIndex(object):
+    """The row positions of each value of a categorical column.
+
+    Attributes:
+        codes (np.ndarray): The code of each row's value, or -1 where the
+            value is missing.
+        value_codes (dict): Maps each value to its code.
+        offsets (np.ndarray): The rows with code i are
+            positions[offsets[i]:offsets[i + 1]].
+        positions (np.ndarray): The row positions, grouped by code and sorted
+            within each group.
+    """
+
+    def __init__(self, values):
+
+        self.codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        self.value_codes = {value: code for code, value in enumerate(uniques)}
+
+        order = np.argsort(self.codes, kind='stable')
+
+        self.offsets = np.searchsorted(self.codes[order],
+                                       np.arange(len(uniques) + 1))
+        self.positions = order
+
+    def code(self, value):
+        """Returns the code of the value given, or -1 if it does not occur."""
+
+        return self.value_codes.get(value, -1)
+
+    def lookup(self, value):
+        """Returns the sorted row positions holding the value given."""
+
+        code = self.code(value)
+
+        if code < 0:
+            return self.positions[:0]
+
+        return self.positions[self.offsets[code]:self.offsets[code + 1]]
+
+    def count(self, value):
+        """Returns the number of rows holding the value given."""
+
+        code = self.code(value)
+
+        if code < 0:
+            return 0
+
+        return int(self.offsets[code + 1] - self.offsets[code])
+
+
+class MatchQuery(object):
+    """A composable filter over a dataset's matches.
+
+    Each filter method returns a new query, so that queries can be built up
+    and reused:
+
+        query = dataset.query().player('Roger Federer').surface('Grass')
+        wimbledon = query.tournament('Wimbledon').matches()
+        recent = query.dates(min_date=date(2015, 1, 1)).positions()
+
+    When run, the query starts from the most selective of its indexed filters
+    (the head-to-head index, the player index, the date index or a column
+    index) and checks the remaining filters against the column arrays of the
+    candidates only.
+    Matches are returned in chronological order.
+    """
+
+    def __init__(self, dataset, filters=None):
+
+        self.dataset = dataset
+        self.filters = dict() if filters is None else filters
+
+    def with_filter(self, name, value):
+
+        filters = dict(self.filters)
+        filters[name] = value
+
+        return MatchQuery(self.dataset, filters)
+
+    def player(self, player_name):
+        """Keeps the matches the player given played in."""
+
+        return self.with_filter('player', player_name)
+
+    def opponent(self, player_name):
+        """Keeps the matches the player given played in. Together with player,
+        keeps the matches between the two."""
+
+        return self.with_filter('opponent', player_name)
+
+    def surface(self, surface):
+        """Keeps the matches played on the surface given."""
+
+        return self.with_filter('surface', surface)
+
+    def dates(self, min_date=None, max_date=None, before_round=None):
+        """Keeps the matches in a date range.
+
+        Args:
+            min_date (Optional[datetime.date]): Inclusive lower date bound.
+            max_date (Optional[datetime.date]): Exclusive upper date bound.
+            before_round (Optional[int]): If given together with max_date,
+                matches starting on max_date are kept if their round number
+                is lower than this.
+        """
+
+        return self.with_filter('dates', (min_date, max_date, before_round))
+
+    def rounds(self, min_round=None, max_round=None):
+        """Keeps the matches whose round number lies between min_round and
+        max_round, both inclusive."""
+
+        return self.with_filter('rounds', (min_round, max_round))
+
+    def tournament(self, tournament_name):
+        """Keeps the matches of the tournament given."""
+
+        return self.with_filter('tournament', tournament_name)
+
+    def tour_level(self, level):
+        """Keeps the matches of tournaments of the level given, as stored in
+        the dataset's tour_level_column.
+
+        Raises:
+            ValueError: If the dataset has no tour level column.
+        """
+
+        if self.dataset.tour_level_column is None:
+            raise ValueError('{} has no tour level column.'.format(
+                type(self.dataset).__name__))
+
+        return self.with_filter('tour_level', level)
+
+    def category_filters(self):
+        """Returns the (column, value) pairs of the filters answered by column
+        indexes."""
+
+        columns = [('surface', 'surface'), ('tournament', 'tournament_name'),
+                   ('tour_level', self.dataset.tour_level_column)]
+
+        return [(column, self.filters[name]) for name, column in columns
+                if name in self.filters]
+
+    def candidates(self):
+        """Returns the positions matching the most selective indexed filters,
+        whether they are in chronological order, and the names of the
+        filters they answer."""
+
+        dataset = self.dataset
+        min_date, max_date, before_round = self.filters.get(
+            'dates', (None, None, None))
+
+        players = [x for x in ['player', 'opponent'] if x in self.filters]
+
+        if (len(players) == 2 and
+                self.filters['player'] != self.filters['opponent']):
+
+            codes = [dataset.player_index.player_codes.get(
+                self.filters[x], -1) for x in players]
+
+            positions = dataset.head_to_head_index.lookup(
+                codes[0], codes[1], min_date=min_date, max_date=max_date,
+                before_round=before_round)
+
+            return positions, True, {'player', 'opponent', 'dates'}
+
+        if len(players) > 0:
+
+            # A player's matches are few, so start from the smaller set.
+            bounds = [dataset.player_index.bounds(self.filters[x])
+                      for x in players]
+            sizes = [end - start for start, end in bounds]
+            name = players[int(np.argmin(sizes))]
+
+            positions = dataset.player_index.lookup(
+                self.filters[name], min_date=min_date, max_date=max_date,
+                before_round=before_round)
+
+            return positions, True, {name, 'dates'}
+
+        date_positions = dataset.date_index.lookup(
+            min_date=min_date, max_date=max_date, before_round=before_round)
+
+        category_filters = self.category_filters()
+
+        if len(category_filters) > 0:
+
+            indexes = [dataset.get_column_index(column)
+                       for column, _ in category_filters]
+            sizes = [index.count(value) for index, (_, value) in
+                     zip(indexes, category_filters)]
+            best = int(np.argmin(sizes))
+
+            # Use the date index instead if the date range is narrower.
+            if sizes[best] < len(date_positions):
+                column, value = category_filters[best]
+                return indexes[best].lookup(value), False, {column}
+
+        return date_positions, True, {'dates'}
+
+    def positions(self):
+        """Runs the query.
+
+        Returns:
+            np.ndarray: The row positions of the matching matches in the stats
+            DataFrame, in chronological order.
+        """
+
+        dataset = self.dataset
+        arrays = dataset.column_arrays
+
+        positions, chronological, answered = self.candidates()
+
+        for name in ['player', 'opponent']:
+
+            if name in self.filters and name not in answered:
+
+                code = dataset.player_index.player_codes.get(
+                    self.filters[name], -1)
+                winner_codes, loser_codes = dataset.get_player_codes()
+
+                positions = positions[(winner_codes[positions] == code) |
+                                      (loser_codes[positions] == code)]
+
+        for column, value in self.category_filters():
+
+            if column not in answered:
+
+                index = dataset.get_column_index(column)
+
+                positions = positions[
+                    index.codes[positions] == index.code(value)]
+
+        if 'dates' in self.filters and 'dates' not in answered:
+
+            min_date, max_date, before_round = self.filters['dates']
+            days = to_day_numbers(arrays['start_date'][positions])
+            keep = np.ones(len(positions), dtype=bool)
+
+            if min_date is not None:
+                keep &= days >= to_day_number(min_date)
+
+            if max_date is not None:
+
+                max_day = to_day_number(max_date)
+                before = days < max_day
+
+                if before_round is not None:
+                    # Compare round slots, as the indexes do, so that rounds
+                    # which are not numeric count as the earliest.
+                    round_slots = to_round_slots(
+                        arrays['round_number'][positions])
+                    before |= (days == max_day) & (
+                        round_slots < to_before_round_slot(before_round))
+
+                keep &= before
+
+            positions = positions[keep]
+
+        if 'rounds' in self.filters:
+
+            min_round, max_round = self.filters['rounds']
+            round_numbers = self.round_numbers(positions)
+            keep = ~np.isnan(round_numbers)
+
+            if min_round is not None:
+                keep &= round_numbers >= min_round
+
+            if max_round is not None:
+                keep &= round_numbers <= max_round
+
+            positions = positions[keep]
+
+        if not chronological:
+            positions = positions[np.argsort(
+                dataset.get_chronological_ranks()[positions], kind='stable')]
+
+        instrumentation.add_rows(len(positions))
+
+        return positions
+
+    def round_numbers(self, positions):
+
+        return pd.to_numeric(
+            pd.Series(self.dataset.column_arrays['round_number'][positions]),
+            errors='coerce').values.astype(float)
+
+    def matches(self, lazy=False):
+        """Runs the query.
+
+        Args:
+            lazy (bool): If True, returns MatchViews rather than
+                CompletedMatches.
+
+        Returns:
+            Iterator[CompletedMatch]: The matching matches, in chronological
+            order.
+        """
+
+        return self.dataset.matches_at(self.positions(), lazy=lazy)
+
+    def __iter__(self):
+
+        return self.matches()
+
+    def __len__(self):
+
+        return len(self.positions())
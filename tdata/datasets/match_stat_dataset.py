@@ -4,30 +4,326 @@ import numpy as np
 import pandas as pd
 
 from pathlib import Path
+from functools import partial
 from tdata.datasets.dataset import Dataset
+from tdata.datasets.compact import compact_frame
+from tdata.datasets.streaming import iter_chronological
+from tdata.datasets.column_arrays import ColumnArrays
 from tdata.datasets.match_stats import MatchStats
+from tdata.datasets.column_profiles import resolve_columns, column_selector
+from tdata.datasets.parallel import read_files
+
+
+# The point counts read from the year csvs, for the winner and the loser.
+POINT_COLUMNS = ['{}_{}'.format(role, x) for role in ['winner', 'loser']
+                 for x in ['serve_1st_attempts', 'serve_1st_total',
+                           'serve_1st_won', 'serve_2nd_total',
+                           'serve_2nd_won', 'double_faults',
+                           'return_points_won', 'return_points_total']]
+
+MATCH_COLUMNS = ['winner', 'loser', 'round', 'score', 'start_date', 'surface',
+                 'tournament_name']
+
+ODDS_COLUMNS = ['winner_odds', 'loser_odds']
+
+# The columns each profile reads (see column_profiles).
+COLUMN_PROFILES = {'core': MATCH_COLUMNS + POINT_COLUMNS,
+                   'with_odds': MATCH_COLUMNS + POINT_COLUMNS + ODDS_COLUMNS,
+                   'all': None}
+
+# The dtypes of the columns we use. Stats are floats as they may be missing.
+COLUMN_DTYPES = dict(
+    [(x, object) for x in MATCH_COLUMNS if x != 'start_date'] +
+    [(x, np.float64) for x in POINT_COLUMNS + ODDS_COLUMNS])
+
+# Increase this whenever read_year_csv changes the columns or dtypes it
+# returns. Feather files written with another version (or none, as before
+# COLUMN_DTYPES) are then ignored, and rewritten by convert_year_csvs.
+FEATHER_VERSION = 2
+
+# The key of the version in the Feather files' schema metadata.
+FEATHER_VERSION_KEY = b'tdata_feather_version'
+
+
+def feather_path_for_csv(csv_path):
+    """Returns the path of the Feather file converted from the year csv
+    given. Converted files live in data/year_feather, next to year_csvs."""
+
+    csv_dir, csv_name = os.path.split(csv_path)
+    feather_dir = os.path.join(os.path.dirname(csv_dir), 'year_feather')
+
+    return os.path.join(feather_dir,
+                        os.path.splitext(csv_name)[0] + '.feather')
+
+
+def read_feather_schema(feather_path):
+    """Returns the Arrow schema of a Feather file, which is read from its
+    footer without reading the data."""
+
+    import pyarrow as pa
+
+    with pa.memory_map(feather_path) as source:
+        return pa.ipc.open_file(source).schema
+
+
+def current_feather_schema(csv_path):
+    """Returns the schema of the Feather file converted from the year csv
+    given if it is up to date, i.e. at least as recent as the csv and written
+    with the current FEATHER_VERSION, and None otherwise."""
+
+    feather_path = feather_path_for_csv(csv_path)
+
+    if (not os.path.isfile(feather_path) or
+            os.path.getmtime(feather_path) < os.path.getmtime(csv_path)):
+        return None
+
+    schema = read_feather_schema(feather_path)
+    metadata = schema.metadata or dict()
+
+    if (metadata.get(FEATHER_VERSION_KEY) !=
+            str(FEATHER_VERSION).encode('utf-8')):
+        return None
+
+    return schema
+
+
+def write_year_feather(df, feather_path):
+    """Writes a year's matches read with read_year_csv as Feather, marked
+    with the current FEATHER_VERSION."""
+
+    import pyarrow as pa
+    from pyarrow import feather
+
+    table = pa.Table.from_pandas(df.reset_index(drop=True),
+                                 preserve_index=False)
+
+    metadata = dict(table.schema.metadata or dict())
+    metadata[FEATHER_VERSION_KEY] = str(FEATHER_VERSION).encode('utf-8')
+
+    feather.write_feather(table.replace_schema_metadata(metadata),
+                          feather_path)
+
+
+def year_file_path(csv_path, use_feather=True):
+    """Returns the file read_year_file reads for the year csv given: its
+    Feather version if that is up to date, and the csv otherwise."""
+
+    if use_feather and current_feather_schema(csv_path) is not None:
+        return feather_path_for_csv(csv_path)
+
+    return csv_path
+
+
+def year_file_columns(csv_path, use_feather=True):
+    """Returns the columns of a year csv, from the schema of its Feather
+    version if that is up to date (see read_year_file)."""
+
+    schema = current_feather_schema(csv_path) if use_feather else None
+
+    if schema is not None:
+        return pd.Index(schema.names)
+
+    return pd.read_csv(csv_path, index_col=0, nrows=0).columns
+
+
+def read_year_csv(csv_path, columns=None):
+    """Reads a single MatchStat year csv, parsing the start dates. If columns
+    are given, only those the file has are read."""
+
+    if columns is None:
+        df = pd.read_csv(csv_path, index_col=0, dtype=COLUMN_DTYPES)
+    else:
+        df = pd.read_csv(csv_path, usecols=column_selector(columns),
+                         dtype=COLUMN_DTYPES)
+
+    df['start_date'] = pd.to_datetime(df['start_date'])
+
+    return df
+
+
+def read_year_file(csv_path, use_feather=True, columns=None):
+    """Reads a MatchStat year csv, using its converted Feather version if it
+    is up to date: at least as recent as the csv, and written with the
+    current FEATHER_VERSION.
+
+    Args:
+        csv_path (str): The path to the year csv.
+        use_feather (bool): If False, the csv is always parsed.
+        columns (Optional[Sequence[str]]): The columns to read, skipping any
+            the file does not have. Defaults to all.
+
+    Returns:
+        pd.DataFrame: The matches in the year file.
+    """
+
+    schema = current_feather_schema(csv_path) if use_feather else None
+
+    if schema is not None:
+
+        if columns is not None:
+            wanted = set(columns)
+            columns = [x for x in schema.names if x in wanted]
+
+        df = pd.read_feather(feather_path_for_csv(csv_path), columns=columns)
+
+        # Arrow gives missing strings as None, whereas the csv reader gives
+        # NaN. Keep the two consistent.
+        object_columns = df.select_dtypes(object).columns
+        df[object_columns] = df[object_columns].fillna(np.nan)
+
+        return df
+
+    return read_year_csv(csv_path, columns=columns)
+
+
+def convert_year_csvs(csv_dir=None, overwrite=False):
+    """Converts the MatchStat year csvs into typed Feather files, one per
+    tour and year. This only needs to be run once (and again whenever the
+    csvs are updated); MatchStatDataset picks the converted files up
+    automatically.
+
+    Args:
+        csv_dir (Optional[str]): The directory containing the year csvs.
+            Defaults to data/year_csvs.
+        overwrite (bool): Whether to rewrite Feather files which are already
+            up to date. Files which are older than their csv, or were written
+            with another FEATHER_VERSION, are always rewritten.
+
+    Returns:
+        List[str]: The paths of the Feather files written.
+    """
+
+    if csv_dir is None:
+        csv_dir = os.path.join(str(Path(__file__).parents[2]), 'data',
+                               'year_csvs')
+
+    written = list()
+
+    for csv_path in sorted(glob.glob(os.path.join(csv_dir, '*.csv'))):
+
+        feather_path = feather_path_for_csv(csv_path)
+
+        if not overwrite and current_feather_schema(csv_path) is not None:
+            continue
+
+        if not os.path.isdir(os.path.dirname(feather_path)):
+            os.makedirs(os.path.dirname(feather_path))
+
+        write_year_feather(read_year_csv(csv_path), feather_path)
+
+        written.append(feather_path)
+
+    return written
+
+
+def find_year_csvs(t_type='atp', min_year=None):
+    """Returns the MatchStat year csvs of the tour given, from min_year on
+    if given, in order of year."""
+
+    # Find the correct directory:
+    exec_dir = Path(__file__).parents[2]
+
+    # Get all csv filenames:
+    all_csvs = glob.glob(
+        '{}/data/year_csvs/*{}*.csv'.format(exec_dir, t_type))
+
+    if min_year is not None:
+
+        all_csvs = [x for x in all_csvs if
+                    int(os.path.split(x)[1][:4]) >= min_year]
+
+    return sorted(all_csvs, key=lambda x: os.path.split(x)[1])
 
 
 class MatchStatDataset(Dataset):
+    """The matches in the MatchStat year csvs.
+
+    With streaming=True, nothing is loaded up front: iter_batches and
+    iter_matches then read one year at a time, in chronological order, with
+    the same filters and derived columns. The query methods are only
+    available when streaming is False.
+
+    By default, every column of the year csvs is read. Pass a column profile
+    (see column_profiles) as columns to read fewer: 'core' reads the
+    columns needed for the matches and their stats, 'with_odds' adds the
+    odds, and a list reads the core columns and those listed.
+
+    The year files are read by a pool of workers (see parallel.read_files):
+    threads by default, or processes with executor='process'. workers=1
+    reads them one after another.
+    """
+
+    optional_stat_columns = {
+        'winners': ('winner_winners', 'loser_winners'),
+        'ues': ('winner_unforced_errors', 'loser_unforced_errors'),
+        'odds': ('winner_odds', 'loser_odds')}
 
     def __init__(self, t_type='atp', stat_matches_only=True,
-                 min_year=None, drop_qual=True, drop_ret_and_wo=True):
+                 min_year=None, drop_qual=True, drop_ret_and_wo=True,
+                 use_feather=True, compact=False, streaming=False,
+                 columns='all', workers=None, executor='thread'):
+
+        self.t_type = t_type
+        self.stat_matches_only = stat_matches_only
+        self.min_year = min_year
+        self.drop_qual = drop_qual
+        self.drop_ret_and_wo = drop_ret_and_wo
+        self.use_feather = use_feather
+        self.columns = resolve_columns(COLUMN_PROFILES, columns)
+
+        if streaming:
+            return
+
+        # Use the converted Feather files where available (see
+        # convert_year_csvs); these are much faster to read.
+        with self.timed('read') as timer:
+            all_read = read_files(
+                partial(read_year_file, use_feather=use_feather,
+                        columns=self.columns),
+                self.find_year_files(), workers=workers, executor=executor)
+            timer.rows += sum(x.shape[0] for x in all_read)
+
+        with self.timed('filter') as timer:
+            concatenated = self.prepare_frame(
+                pd.concat(all_read, ignore_index=True))
+
+            concatenated = concatenated.sort_values(
+                ['start_date', 'round_number'])
+            timer.rows += concatenated.shape[0]
+
+        if compact:
+            with self.timed('compact'):
+                concatenated, self.compact_report = compact_frame(
+                    concatenated)
+
+        self.full_df = concatenated.set_index(self.df_index, drop=False)
+
+        super(MatchStatDataset, self).__init__(start_date_is_exact=False)
+
+    @classmethod
+    def source_files(cls, arguments):
+
+        # The Feather files are hashed rather than their csvs if they are
+        # read, so that converting the csvs again rebuilds the snapshot.
+        return [year_file_path(x, use_feather=arguments['use_feather'])
+                for x in find_year_csvs(arguments['t_type'],
+                                        arguments['min_year'])]
+
+    @classmethod
+    def source_version(cls, arguments):
 
-        # Import all data:
-        # Find the correct directory:
-        exec_dir = Path(__file__).parents[2]
+        return FEATHER_VERSION if arguments['use_feather'] else None
 
-        # Get all csv filenames:
-        all_csvs = glob.glob(
-            '{}/data/year_csvs/*{}*.csv'.format(exec_dir, t_type))
+    def find_year_files(self):
+        """Returns the year csvs to load, in order of year."""
 
-        if min_year is not None:
+        return find_year_csvs(self.t_type, self.min_year)
 
-            all_csvs = [x for x in all_csvs if
-                        int(os.path.split(x)[1][:4]) >= min_year]
+    def prepare_frame(self, concatenated):
+        """Applies the filters and adds the derived columns to matches read
+        from the year files. Rows are treated independently, so this works
+        on any subset of the files."""
 
-        all_read = [pd.read_csv(x, index_col=0) for x in all_csvs]
-        concatenated = pd.concat(all_read, ignore_index=True)
         concatenated['start_date'] = pd.to_datetime(concatenated['start_date'])
         concatenated['year'] = concatenated['start_date'].dt.year
 
@@ -35,7 +331,7 @@ class MatchStatDataset(Dataset):
         concatenated = concatenated.dropna(subset=['round'])
 
         # Drop those without stats
-        if stat_matches_only:
+        if self.stat_matches_only:
 
             concatenated = concatenated.dropna(
                 subset=['winner_serve_1st_won'])
@@ -43,7 +339,7 @@ class MatchStatDataset(Dataset):
             concatenated = concatenated[
                 concatenated['winner_serve_1st_attempts'] > 0]
 
-        if drop_ret_and_wo:
+        if self.drop_ret_and_wo:
 
             # Drop retirements
             concatenated = concatenated[
@@ -54,7 +350,7 @@ class MatchStatDataset(Dataset):
                 ~concatenated['score'].str.contains('WO|,|Default')]
 
         # Drop qualifying (for now)
-        if drop_qual:
+        if self.drop_qual:
             concatenated = concatenated[
                 ~(concatenated['round'].str.contains('FQ'))]
 
@@ -83,24 +379,60 @@ class MatchStatDataset(Dataset):
         # Adjust names
         concatenated = self.adjust_names(concatenated)
 
-        stats = self.calculate_stats_df(concatenated)
+        with self.timed('stats') as timer:
+            stats = self.calculate_stats_df(concatenated)
+            timer.rows += concatenated.shape[0]
 
         concatenated = pd.concat([concatenated, stats], axis=1)
 
-        if stat_matches_only:
+        if self.stat_matches_only:
 
             concatenated = concatenated.dropna(
                 subset=['winner_serve_points_won_pct'])
 
-        concatenated = concatenated.sort_values(['start_date', 'round_number'])
+        return concatenated
 
-        concatenated['start_date'] = pd.to_datetime(concatenated['start_date'])
+    def iter_batches(self, batch_size=None):
+        """Reads the matches one year file at a time.
 
-        self.full_df = concatenated
+        Args:
+            batch_size (Optional[int]): The largest number of matches to
+                yield at once. By default, matches are yielded as soon as
+                they are known to be in order, i.e. roughly a year at a time.
 
-        super(MatchStatDataset, self).__init__(start_date_is_exact=False)
+        Returns:
+            Iterator[pd.DataFrame]: The prepared matches, in chronological
+            order.
+        """
 
-        self.full_df = concatenated.set_index(self.df_index, drop=False)
+        year_files = self.find_year_files()
+
+        # Older files lack the stats columns. Give every year all columns, as
+        # concatenating them would.
+        columns = pd.Index([])
+
+        for csv_path in year_files:
+            columns = columns.append(year_file_columns(
+                csv_path, use_feather=self.use_feather)).unique()
+
+        if self.columns is not None:
+            columns = columns[columns.isin(self.columns)]
+
+        frames = (self.prepare_frame(
+            read_year_file(x, use_feather=self.use_feather,
+                           columns=self.columns).reset_index(
+                drop=True).reindex(columns=columns)) for x in year_files)
+
+        return iter_chronological(frames, batch_size=batch_size)
+
+    def iter_matches(self, lazy=False):
+        """Reads the matches one year file at a time, as CompletedMatches
+        (or MatchViews if lazy is True), in chronological order."""
+
+        for batch in self.iter_batches():
+            for match in self.positions_into_matches(
+                    ColumnArrays(batch), range(batch.shape[0]), lazy=lazy):
+                yield match
 
     def adjust_names(self, df):
 
@@ -130,6 +462,10 @@ class MatchStatDataset(Dataset):
 
         return self.full_df
 
+    def set_stats_df(self, df):
+
+        self.full_df = df
+
     def calculate_percentages(self, df, add_dfs=True):
 
         results = dict()
@@ -214,6 +550,29 @@ class MatchStatDataset(Dataset):
 
         return results
 
+    def calculate_point_counts(self, df):
+
+        results = dict()
+
+        for role in ['winner', 'loser']:
+
+            other_role = 'winner' if role == 'loser' else 'loser'
+
+            # Serve points are found from the opponent's return points, as in
+            # calculate_stats.
+            other_rp_won = df['{}_return_points_won'.format(other_role)]
+            other_rp_out_of = df['{}_return_points_total'.format(other_role)]
+
+            results['{}_serve_points_won'.format(role)] = (
+                other_rp_out_of - other_rp_won)
+            results['{}_serve_points_played'.format(role)] = other_rp_out_of
+            results['{}_return_points_won'.format(role)] = (
+                df['{}_return_points_won'.format(role)])
+            results['{}_return_points_played'.format(role)] = (
+                df['{}_return_points_total'.format(role)])
+
+        return pd.DataFrame(results, index=df.index)
+
     def calculate_stats(self, winner, loser, row):
 
         winners, ues, odds = None, None, None
@@ -1,3 +1,7 @@
+import numpy as np
+import pandas as pd
+
+
 class MatchStats(object):
     """Container class storing all information about a player's performance in
     a match. Add more optional stats as required."""
@@ -43,3 +47,207 @@ class MatchStats(object):
             None else None)
 
         return output
+
+
+def divide_or_nan(numerators, denominators):
+    """Divides elementwise, giving NaN where the denominator is zero."""
+
+    numerators = np.asarray(numerators, dtype=float)
+    denominators = np.asarray(denominators, dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominators == 0, np.nan, numerators / denominators)
+
+
+class MatchStatsArray(object):
+    """The stats of many matches, held as one array per field and role rather
+    than as MatchStats objects.
+
+    The arrays are aligned, so that entry i of each describes match i. For
+    a dataset's matches (see Dataset.get_match_stats), they are aligned with
+    the stats DataFrame.
+
+    Attributes:
+        winner_names (np.ndarray): The name of each match's winner.
+        loser_names (np.ndarray): The name of each match's loser.
+        arrays (dict): Maps '{role}_{field}' to its float array, for role in
+            ROLES and field in FIELDS. Optional fields (winners, ues and
+            odds) are NaN where unknown.
+    """
+
+    ROLES = ['winner', 'loser']
+
+    FIELDS = ['serve_points_played', 'serve_points_won',
+              'return_points_played', 'return_points_won', 'winners', 'ues',
+              'odds']
+
+    OPTIONAL_FIELDS = ['winners', 'ues', 'odds']
+
+    def __init__(self, winner_names, loser_names, **arrays):
+        """
+        Args:
+            winner_names (Sequence[str]): The winner of each match.
+            loser_names (Sequence[str]): The loser of each match.
+            **arrays: The array of each '{role}_{field}'. Optional fields may
+                be left out.
+
+        Raises:
+            ValueError: If a required array is missing, or an array is given
+                for an unknown field.
+        """
+
+        self.winner_names = np.asarray(winner_names, dtype=object)
+        self.loser_names = np.asarray(loser_names, dtype=object)
+
+        n_matches = len(self.winner_names)
+
+        names = ['{}_{}'.format(role, field) for role in self.ROLES
+                 for field in self.FIELDS]
+
+        unknown = set(arrays) - set(names)
+
+        if len(unknown) > 0:
+            raise ValueError('Unknown fields: {}.'.format(sorted(unknown)))
+
+        self.arrays = dict()
+
+        for name in names:
+
+            if name in arrays:
+                self.arrays[name] = np.asarray(arrays[name], dtype=float)
+            elif name.split('_', 1)[1] in self.OPTIONAL_FIELDS:
+                self.arrays[name] = np.full(n_matches, np.nan)
+            else:
+                raise ValueError('Missing field {}.'.format(name))
+
+    def __len__(self):
+
+        return len(self.winner_names)
+
+    def __getitem__(self, name):
+
+        return self.arrays[name]
+
+    def pct_won_serve(self, role='winner'):
+        """Returns the proportion of serve points the winner (or loser) won in
+        each match, NaN where they served no points."""
+
+        return divide_or_nan(self.arrays[role + '_serve_points_won'],
+                             self.arrays[role + '_serve_points_played'])
+
+    def pct_won_return(self, role='winner'):
+        """Returns the proportion of return points the winner (or loser) won
+        in each match, NaN where they returned no points."""
+
+        return divide_or_nan(self.arrays[role + '_return_points_won'],
+                             self.arrays[role + '_return_points_played'])
+
+    def take(self, positions):
+        """Returns the stats of the matches at the positions given."""
+
+        return MatchStatsArray(
+            self.winner_names[positions], self.loser_names[positions],
+            **{name: values[positions] for name, values in
+               self.arrays.items()})
+
+    def to_frame(self, index=None):
+        """Returns the arrays, with the proportions of serve and return points
+        won, as a DataFrame."""
+
+        columns = {'winner': self.winner_names, 'loser': self.loser_names}
+        columns.update(self.arrays)
+
+        for role in self.ROLES:
+            columns[role + '_pct_won_serve'] = self.pct_won_serve(role)
+            columns[role + '_pct_won_return'] = self.pct_won_return(role)
+
+        return pd.DataFrame(columns, index=index)
+
+    def row(self, position):
+        """Returns the stats of a single match in the form calculate_stats
+        gives them: a dictionary mapping the winner's and loser's names to
+        their MatchStats (as MatchStatsViews of this array)."""
+
+        return {self.winner_names[position]:
+                MatchStatsView(self, 'winner', position),
+                self.loser_names[position]:
+                MatchStatsView(self, 'loser', position)}
+
+
+class MatchStatsView(MatchStats):
+    """The MatchStats of one player in one match of a MatchStatsArray, read
+    from the arrays when accessed. Unknown optional fields are None."""
+
+    def __init__(self, stats_array, role, position):
+
+        self.stats_array = stats_array
+        self.role = role
+        self.position = position
+
+    def field(self, name):
+
+        return self.stats_array.arrays[
+            '{}_{}'.format(self.role, name)][self.position]
+
+    def optional_field(self, name):
+
+        value = self.field(name)
+
+        return None if np.isnan(value) else value
+
+    @property
+    def player_name(self):
+
+        names = (self.stats_array.winner_names if self.role == 'winner' else
+                 self.stats_array.loser_names)
+
+        return names[self.position]
+
+    @property
+    def serve_points_played(self):
+
+        return self.field('serve_points_played')
+
+    @property
+    def serve_points_won(self):
+
+        return self.field('serve_points_won')
+
+    @property
+    def return_points_played(self):
+
+        return self.field('return_points_played')
+
+    @property
+    def return_points_won(self):
+
+        return self.field('return_points_won')
+
+    @property
+    def pct_won_serve(self):
+
+        played = self.serve_points_played
+
+        return None if played == 0 else self.serve_points_won / played
+
+    @property
+    def pct_won_return(self):
+
+        played = self.return_points_played
+
+        return None if played == 0 else self.return_points_won / played
+
+    @property
+    def winners(self):
+
+        return self.optional_field('winners')
+
+    @property
+    def ues(self):
+
+        return self.optional_field('ues')
+
+    @property
+    def odds(self):
+
+        return self.optional_field('odds')
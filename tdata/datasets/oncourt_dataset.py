@@ -2,16 +2,118 @@ import os
 import numpy as np
 import pandas as pd
 from pathlib import Path
+from functools import partial
 
 from collections import defaultdict
 from tdata.datasets.match_stats import MatchStats
 from tdata.datasets.dataset import Dataset
+from tdata.datasets.compact import compact_frame
+from tdata.datasets.column_profiles import resolve_columns, column_selector
+from tdata.datasets.parallel import read_files
 from tdata.enums.t_type import Tours
 from tdata.enums.surface import Surfaces
 from tqdm import tqdm
 
 
+# The OnCourt tables, all but courts stored once per tour.
+TABLE_NAMES = ["players", "tours", "games", "stat", "ratings", "odds", "seed"]
+
+
+def find_table_csvs(t_type=Tours.atp):
+    """Returns a dictionary mapping the name of each OnCourt table to the path
+    of its csv for the tour given."""
+
+    exec_dir = Path(os.path.abspath(__file__)).parents[2]
+    csv_dir = os.path.join(str(exec_dir), "data", "oncourt")
+
+    paths = {
+        name: os.path.join(csv_dir, "{}_{}.csv".format(name, t_type.name))
+        for name in TABLE_NAMES
+    }
+    paths["courts"] = os.path.join(csv_dir, "courts.csv")
+
+    return paths
+
+
+# The columns of the tables the dataset needs. Column names are unique across
+# tables, so each table reads those of the list it has. The courts table is
+# small and always read in full.
+# fmt: off
+CORE_COLUMNS = [
+    "ID_P", "NAME_P", "DATE_P", "COUNTRY_P",
+    "ID_T", "NAME_T", "COUNTRY_T", "RANK_T", "ID_C_T",
+    "ID1_G", "ID2_G", "ID_T_G", "ID_R_G", "RESULT_G", "DATE_G",
+    "ID1", "ID2", "ID_T", "ID_R",
+    "RPW_1", "RPWOF_1", "RPW_2", "RPWOF_2", "UE_1", "UE_2", "WIS_1", "WIS_2",
+    "ID_P_R", "DATE_R", "POS_R",
+    "ID_P_S", "ID_T_S", "SEEDING",
+]
+# fmt: on
+
+# The columns of the odds table, which is only read if they are wanted.
+ODDS_COLUMNS = ["ID1_O", "ID2_O", "ID_T_O", "ID_R_O", "ID_B_O", "K1", "K2"]
+
+# The columns each profile reads (see column_profiles).
+COLUMN_PROFILES = {
+    "core": CORE_COLUMNS,
+    "with_odds": CORE_COLUMNS + ODDS_COLUMNS,
+    "all": None,
+}
+
+# The dtypes of the columns we use which are not ids or dates. Stats are floats
+# as they may be missing.
+COLUMN_DTYPES = {
+    "NAME_P": object,
+    "COUNTRY_P": object,
+    "NAME_T": object,
+    "COUNTRY_T": object,
+    "RESULT_G": object,
+    "K1": np.float64,
+    "K2": np.float64,
+}
+COLUMN_DTYPES.update(
+    {x: np.float64 for x in ["RPW_1", "RPWOF_1", "RPW_2", "RPWOF_2"]}
+)
+COLUMN_DTYPES.update({x: np.float64 for x in ["UE_1", "UE_2", "WIS_1", "WIS_2"]})
+
+
+def read_table_csv(path, columns=None):
+    """Reads an OnCourt table. If columns are given, only those the table has
+    are read."""
+
+    return pd.read_csv(path, usecols=column_selector(columns), dtype=COLUMN_DTYPES)
+
+
+def read_table(name_and_path, columns=None):
+    """Reads the table given as a (name, path) pair with read_table_csv. The
+    courts table is always read in full."""
+
+    name, path = name_and_path
+
+    return read_table_csv(path, columns=None if name == "courts" else columns)
+
+
 class OnCourtDataset(Dataset):
+    """The matches in the OnCourt tables.
+
+    By default, every column of the tables is read. Pass a column profile (see
+    column_profiles) as columns to read fewer: 'core' reads the columns needed
+    for the matches and their stats and skips the odds table, 'with_odds' adds
+    it, and a list reads the core columns and those listed (the odds table is
+    read if they include K1).
+
+    The tables are read by a pool of workers (see parallel.read_files): threads
+    by default, or processes with executor="process". workers=1 reads them one
+    after another.
+    """
+
+    tour_level_column = "tournament_rank"
+
+    optional_stat_columns = {
+        "winners": ("WIS_1", "WIS_2"),
+        "ues": ("UE_1", "UE_2"),
+        "odds": ("winner_odds", "loser_odds"),
+    }
 
     # TODO: Maybe switch over to SQL.
 
@@ -21,63 +123,78 @@ class OnCourtDataset(Dataset):
         drop_challengers=True,
         drop_qualifying=True,
         drop_doubles=True,
+        compact=False,
+        columns="all",
+        workers=None,
+        executor="thread",
     ):
 
-        exec_dir = Path(os.path.abspath(__file__)).parents[2]
-
         self.t_type = t_type
         self.drop_challengers = drop_challengers
         self.drop_qualifying = drop_qualifying
         self.drop_doubles = drop_doubles
-
-        csv_dir = os.path.join(str(exec_dir), "data", "oncourt")
-
-        def read_with_suffix(table_name, suffix=t_type.name):
-            return pd.read_csv(
-                os.path.join(csv_dir, "{}_{}.csv".format(table_name, suffix))
+        self.columns = resolve_columns(COLUMN_PROFILES, columns)
+
+        table_paths = find_table_csvs(t_type)
+
+        if self.columns is not None and "K1" not in self.columns:
+            del table_paths["odds"]
+
+        with self.timed("read") as timer:
+            tables = dict(
+                zip(
+                    table_paths,
+                    read_files(
+                        partial(read_table, columns=self.columns),
+                        table_paths.items(),
+                        workers=workers,
+                        executor=executor,
+                    ),
+                )
             )
+            timer.rows += tables["games"].shape[0]
+
+        with self.timed("merge") as timer:
+            merged = self.merge_tables(
+                tables["players"],
+                tables["tours"],
+                tables["games"],
+                tables["stat"],
+                tables["courts"],
+                tables["ratings"],
+                tables.get("odds"),
+                tables["seed"],
+            )
+            timer.rows += merged.shape[0]
 
-        player_table = read_with_suffix("players")
-        tour_table = read_with_suffix("tours")
-        games_table = read_with_suffix("games")
-        stats_table = read_with_suffix("stat")
-        court_table = pd.read_csv(os.path.join(csv_dir, "courts.csv"))
-        rankings_table = read_with_suffix("ratings")
-        odds_table = read_with_suffix("odds")
-        seed_table = read_with_suffix("seed")
-
-        merged = self.merge_tables(
-            player_table,
-            tour_table,
-            games_table,
-            stats_table,
-            court_table,
-            rankings_table,
-            odds_table,
-            seed_table,
-        )
-        merged["DATE_G"] = pd.to_datetime(merged["DATE_G"])
-        merged = merged.rename(columns={"DATE_G": "start_date", "RESULT_G": "score"})
-        merged["round_number"] = merged["round"]
+        with self.timed("filter") as timer:
+            merged["DATE_G"] = pd.to_datetime(merged["DATE_G"])
+            merged = merged.rename(
+                columns={"DATE_G": "start_date", "RESULT_G": "score"}
+            )
+            merged["round_number"] = merged["round"]
 
-        # TODO: Replace the round numbers with the enum values
-        self.df = merged.sort_values("start_date")
+            # TODO: Replace the round numbers with the enum values
+            self.df = merged.sort_values("start_date")
 
-        old_size = self.df.shape[0]
+            old_size = self.df.shape[0]
 
-        # We don't want exhibitions
-        self.df = self.df[
-            ~self.df["tournament_name"].str.contains("Hopman|Mubadala World Tennis")
-        ]
+            # We don't want exhibitions
+            self.df = self.df[
+                ~self.df["tournament_name"].str.contains(
+                    "Hopman|Mubadala World Tennis"
+                )
+            ]
 
-        self.df["year"] = self.df["start_date"].dt.year
+            self.df["year"] = self.df["start_date"].dt.year
 
-        # Drop duplicates
-        self.df = self.df.drop_duplicates(
-            subset=["winner", "loser", "round", "tournament_name", "year"]
-        )
+            # Drop duplicates
+            self.df = self.df.drop_duplicates(
+                subset=["winner", "loser", "round", "tournament_name", "year"]
+            )
 
-        new_size = self.df.shape[0]
+            new_size = self.df.shape[0]
+            timer.rows += new_size
 
         if old_size - new_size > 10:
             print(
@@ -85,10 +202,19 @@ class OnCourtDataset(Dataset):
                 f" to {new_size}."
             )
 
-        super(OnCourtDataset, self).__init__(start_date_is_exact=True)
+        if compact:
+            with self.timed("compact"):
+                self.df, self.compact_report = compact_frame(self.df)
 
         self.df = self.df.set_index(self.df_index, drop=False)
 
+        super(OnCourtDataset, self).__init__(start_date_is_exact=True)
+
+    @classmethod
+    def source_files(cls, arguments):
+
+        return list(find_table_csvs(arguments["t_type"]).values())
+
     def calculate_stats(self, winner, loser, row):
 
         # TODO: Add the odds!
@@ -122,10 +248,35 @@ class OnCourtDataset(Dataset):
 
         return player_stats
 
+    def calculate_point_counts(self, df):
+
+        results = dict()
+
+        for suffix, role in zip([1, 2], ["winner", "loser"]):
+
+            opp_suffix = 1 if suffix == 2 else 2
+
+            results["{}_serve_points_won".format(role)] = (
+                df["RPWOF_{}".format(opp_suffix)] - df["RPW_{}".format(opp_suffix)]
+            )
+            results["{}_serve_points_played".format(role)] = df[
+                "RPWOF_{}".format(opp_suffix)
+            ]
+            results["{}_return_points_won".format(role)] = df["RPW_{}".format(suffix)]
+            results["{}_return_points_played".format(role)] = df[
+                "RPWOF_{}".format(suffix)
+            ]
+
+        return pd.DataFrame(results, index=df.index)
+
     def get_stats_df(self):
 
         return self.df
 
+    def set_stats_df(self, df):
+
+        self.df = df
+
     @staticmethod
     def merge_odds_and_games(odds_table, games_table):
 
@@ -219,7 +370,11 @@ class OnCourtDataset(Dataset):
 
         with_date = games_table.dropna()
 
-        with_date = self.merge_odds_and_games(odds_table, games_table)
+        if odds_table is None:
+            # The odds table was not read (see COLUMN_PROFILES).
+            with_date = games_table.assign(winner_odds=np.nan, loser_odds=np.nan)
+        else:
+            with_date = self.merge_odds_and_games(odds_table, games_table)
 
         with_date["winner_seed"] = [
             seed_lookup.get((row.ID1_G, row.ID_T_G), None)
@@ -0,0 +1,75 @@
+"""Reads a dataset's source files concurrently.
+
+The loaders read one file per year (or per table) and concatenate the
+results. read_files runs the reads in a thread or process pool and returns
+them in the order of the paths, so the concatenated frame is the same
+whatever the number of workers.
+"""
+import os
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+# The environment variable giving the number of workers used when a loader
+# is not given one.
+WORKERS_VARIABLE = 'TDATA_WORKERS'
+
+EXECUTORS = {'thread': ThreadPoolExecutor, 'process': ProcessPoolExecutor}
+
+
+def default_workers():
+    """Returns the number of workers given by the TDATA_WORKERS environment
+    variable, or the number of CPUs if it is not set."""
+
+    from_environment = os.environ.get(WORKERS_VARIABLE)
+
+    if from_environment:
+        return int(from_environment)
+
+    return os.cpu_count() or 1
+
+
+def read_files(read, paths, workers=None, executor='thread'):
+    """Calls read on each path, concurrently.
+
+    pandas' csv and feather readers spend most of their time outside the
+    GIL, so threads (the default) are usually enough. Processes help when
+    read does a lot of work in Python, but read and its results must then
+    be picklable, so read has to be a module-level function or a
+    functools.partial of one.
+
+    Args:
+        read (Callable): Reads (and optionally pre-filters) one file.
+        paths (Sequence): The files to read.
+        workers (Optional[int]): The largest number of files read at once.
+            One reads them one after another without a pool. If None, the
+            default_workers are used.
+        executor (str): 'thread' or 'process'.
+
+    Returns:
+        List: The result of read for each path, in the order of paths.
+
+    Raises:
+        ValueError: If the executor is unknown or workers is less than one.
+    """
+
+    if executor not in EXECUTORS:
+        raise ValueError('Unknown executor {}. Expected one of {}.'.format(
+            executor, sorted(EXECUTORS)))
+
+    paths = list(paths)
+
+    if workers is None:
+        workers = default_workers()
+
+    if workers < 1:
+        raise ValueError('workers must be at least one, not {}.'.format(
+            workers))
+
+    workers = min(workers, len(paths))
+
+    if workers <= 1:
+        return [read(x) for x in paths]
+
+    with EXECUTORS[executor](max_workers=workers) as pool:
+        return list(pool.map(read, paths))
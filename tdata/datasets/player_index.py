@@ -0,0 +1,580 @@
+import numpy as np
+import pandas as pd
+
+
+# Layout of the sort keys: the player code occupies the high 32 bits, the day
+# (offset so that it is non-negative) the next 24 and the round the lowest 8.
+DAY_OFFSET = 2 ** 23
+MAX_ROUND_SLOT = 255
+
+
+def to_day_numbers(dates):
+    """Converts an array of dates into integer days since the epoch."""
+
+    return np.asarray(dates, dtype='datetime64[ns]').astype(
+        'datetime64[D]').astype(np.int64)
+
+
+def to_day_number(single_date):
+    """Converts a single date (or datetime) into days since the epoch."""
+
+    return np.datetime64(pd.Timestamp(single_date), 'D').astype(np.int64)
+
+
+def to_round_slots(round_numbers):
+    """Maps round numbers to the slot used in the sort keys. Rounds which are
+    not numeric (e.g. unmapped qualifying rounds) are put first."""
+
+    numeric = pd.to_numeric(pd.Series(round_numbers), errors='coerce').values
+
+    slots = np.where(np.isnan(numeric), 0, numeric + 1)
+
+    return np.clip(slots, 0, MAX_ROUND_SLOT).astype(np.int64)
+
+
+def to_before_round_slot(before_round):
+    """Returns the round slot (see to_round_slots) below which a match on
+    the last day of a period is included, given the before_round bound of
+    the period, or None."""
+
+    if before_round is None:
+        return 0
+
+    return min(max(before_round + 1, 0), MAX_ROUND_SLOT)
+
+
+def make_keys(codes, days, round_slots):
+    """Combines player codes, day numbers and round slots into int64 keys
+    which sort by player, then date, then round."""
+
+    return ((np.asarray(codes, dtype=np.int64) << 32) |
+            ((np.asarray(days, dtype=np.int64) + DAY_OFFSET) << 8) |
+            np.asarray(round_slots, dtype=np.int64))
+
+
+def search_key_range(keys, code, min_date=None, max_date=None,
+                     before_round=None):
+    """Finds the slice of the sorted keys given which belongs to the code
+    given and lies in the period given.
+
+    Args:
+        keys (np.ndarray): Sorted keys made with make_keys.
+        code (int): The code to find the entries for.
+        min_date (Optional[datetime.date]): Inclusive lower date bound.
+        max_date (Optional[datetime.date]): Exclusive upper date bound.
+        before_round (Optional[int]): If given together with max_date,
+            entries on max_date are included if their round number is lower
+            than this.
+
+    Returns:
+        Tuple[int, int]: The start and end of the slice.
+    """
+
+    if min_date is None:
+        lower = code << 32
+    else:
+        lower = int(make_keys(code, to_day_number(min_date), 0))
+
+    if max_date is None:
+        upper = (code + 1) << 32
+    else:
+        upper = int(make_keys(code, to_day_number(max_date),
+                              to_before_round_slot(before_round)))
+
+    start, end = np.searchsorted(keys, [lower, upper])
+
+    return int(start), int(end)
+
+
+def insert_sorted(keys, positions, new_keys, new_positions):
+    """Merges new entries into sorted keys and their positions. The new
+    positions must be larger than all existing ones, so that entries with
+    equal keys stay ordered by position.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The merged keys and positions.
+    """
+
+    order = np.lexsort((new_positions, new_keys))
+    new_keys, new_positions = new_keys[order], new_positions[order]
+
+    insert_at = np.searchsorted(keys, new_keys, side='right')
+
+    return (np.insert(keys, insert_at, new_keys),
+            np.insert(positions, insert_at, new_positions))
+
+
+def to_optional_day_numbers(dates, n_queries):
+    """Converts the dates given (or None) into day numbers and a mask of
+    which of them are given. Missing entries (None or NaT) are unbounded."""
+
+    if dates is None:
+        return np.zeros(n_queries, dtype=np.int64), np.zeros(n_queries, bool)
+
+    converted = pd.to_datetime(pd.Series(list(dates), dtype=object))
+    present = converted.notnull().values
+
+    days = np.zeros(n_queries, dtype=np.int64)
+    days[present] = to_day_numbers(converted.values[present])
+
+    return days, present
+
+
+def expand_ranges(starts, ends):
+    """Concatenates the integer ranges [starts[i], ends[i]) into one array.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The offsets of each range in the
+        result (of length len(starts) + 1) and the concatenated ranges.
+    """
+
+    lengths = ends - starts
+
+    offsets = np.zeros(len(starts) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    within = np.arange(offsets[-1], dtype=np.int64) - np.repeat(
+        offsets[:-1], lengths)
+
+    return offsets, np.repeat(starts, lengths) + within
+
+
+class MatchHistories(object):
+    """The match histories found by a batch query, in compressed sparse row
+    layout.
+
+    The row positions (into the stats DataFrame) of the matches found for
+    query i are positions[offsets[i]:offsets[i + 1]], in chronological order.
+
+    Attributes:
+        offsets (np.ndarray): The start of each query's matches in
+            positions, followed by the total number of matches.
+        positions (np.ndarray): The concatenated row positions.
+    """
+
+    def __init__(self, offsets, positions):
+
+        self.offsets = offsets
+        self.positions = positions
+
+    def __len__(self):
+
+        return len(self.offsets) - 1
+
+    def __getitem__(self, query_number):
+
+        return self.positions[
+            self.offsets[query_number]:self.offsets[query_number + 1]]
+
+    @property
+    def lengths(self):
+        """The number of matches found for each query."""
+
+        return np.diff(self.offsets)
+
+    def query_numbers(self):
+        """Returns the number of the query each position belongs to."""
+
+        return np.repeat(np.arange(len(self)), self.lengths)
+
+    def filter(self, mask):
+        """Returns the histories keeping only the positions where the mask
+        (aligned with positions) is True."""
+
+        counts = np.bincount(self.query_numbers()[mask], minlength=len(self))
+
+        offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        return MatchHistories(offsets, self.positions[mask])
+
+
+class DateIndex(object):
+    """The row positions of all matches, sorted by date and round.
+
+    Attributes:
+        keys (np.ndarray): The int64 sort keys of the matches (see make_keys,
+            with all codes set to zero).
+        positions (np.ndarray): The row positions in the stats DataFrame,
+            aligned with keys.
+    """
+
+    def __init__(self, start_dates, round_numbers):
+
+        keys = make_keys(0, to_day_numbers(start_dates),
+                         to_round_slots(round_numbers))
+
+        self.positions = np.argsort(keys, kind='stable')
+        self.keys = keys[self.positions]
+
+    @classmethod
+    def from_arrays(cls, keys, positions):
+        """Rebuilds an index from its keys and positions, e.g. as saved in
+        a snapshot."""
+
+        index = cls.__new__(cls)
+        index.keys = keys
+        index.positions = positions
+
+        return index
+
+    def extend(self, start_dates, round_numbers, first_position):
+        """Adds matches at the row positions starting from first_position."""
+
+        new_keys = make_keys(0, to_day_numbers(start_dates),
+                             to_round_slots(round_numbers))
+        new_positions = first_position + np.arange(len(new_keys))
+
+        self.keys, self.positions = insert_sorted(
+            self.keys, self.positions, new_keys, new_positions)
+
+    def lookup(self, min_date=None, max_date=None, before_round=None):
+        """Returns the row positions of the matches in the period given, in
+        chronological order. See search_key_range for the arguments."""
+
+        start, end = search_key_range(self.keys, 0, min_date=min_date,
+                                      max_date=max_date,
+                                      before_round=before_round)
+
+        return self.positions[start:end]
+
+
+class PlayerIndex(object):
+    """An index of the row positions of every player's matches.
+
+    Each match appears twice, once for the winner and once for the loser. The
+    entries are sorted by player, date and round, so that all matches of a
+    player within a date range (and before a given round) form a contiguous
+    slice which is found with two binary searches.
+
+    Attributes:
+        player_codes (dict): Maps player names to their integer code.
+        player_names (pd.Index): The player names, in order of their codes.
+        keys (np.ndarray): The int64 sort keys of the entries (see make_keys).
+        positions (np.ndarray): The row positions in the stats DataFrame,
+            aligned with keys.
+    """
+
+    def __init__(self, winners, losers, start_dates, round_numbers):
+
+        n_matches = len(winners)
+
+        codes, uniques = pd.factorize(
+            np.concatenate([np.asarray(winners, dtype=object),
+                            np.asarray(losers, dtype=object)]))
+
+        self.player_codes = {name: code for code, name in enumerate(uniques)}
+        self.player_names = pd.Index(uniques)
+
+        days = np.tile(to_day_numbers(start_dates), 2)
+        round_slots = np.tile(to_round_slots(round_numbers), 2)
+        positions = np.tile(np.arange(n_matches, dtype=np.int64), 2)
+
+        keys = make_keys(codes, days, round_slots)
+
+        order = np.lexsort((positions, keys))
+
+        self.keys = keys[order]
+        self.positions = positions[order]
+
+    @classmethod
+    def from_arrays(cls, player_names, keys, positions):
+        """Rebuilds an index from its player names (in order of their
+        codes), keys and positions, e.g. as saved in a snapshot."""
+
+        index = cls.__new__(cls)
+        index.player_names = pd.Index(player_names, dtype=object)
+        index.player_codes = {name: code for code, name in
+                              enumerate(index.player_names)}
+        index.keys = keys
+        index.positions = positions
+
+        return index
+
+    def __contains__(self, player_name):
+
+        return player_name in self.player_codes
+
+    def extend(self, winners, losers, start_dates, round_numbers,
+               first_position):
+        """Adds matches at the row positions starting from first_position,
+        giving codes to players not seen before."""
+
+        n_matches = len(winners)
+
+        names = np.concatenate([np.asarray(winners, dtype=object),
+                                np.asarray(losers, dtype=object)])
+
+        new_names = [x for x in pd.unique(names) if x not in self.player_codes]
+
+        for name in new_names:
+            self.player_codes[name] = len(self.player_codes)
+
+        if len(new_names) > 0:
+            self.player_names = self.player_names.append(
+                pd.Index(new_names, dtype=object))
+
+        codes = np.array([self.player_codes[x] for x in names],
+                         dtype=np.int64)
+
+        days = np.tile(to_day_numbers(start_dates), 2)
+        round_slots = np.tile(to_round_slots(round_numbers), 2)
+        positions = np.tile(
+            first_position + np.arange(n_matches, dtype=np.int64), 2)
+
+        self.keys, self.positions = insert_sorted(
+            self.keys, self.positions, make_keys(codes, days, round_slots),
+            positions)
+
+    def bounds(self, player_name, min_date=None, max_date=None,
+               before_round=None):
+        """Finds the slice of the index holding the player's matches in the
+        period given.
+
+        Args:
+            player_name (str): The player to look up.
+            min_date (Optional[datetime.date]): Inclusive lower date bound.
+            max_date (Optional[datetime.date]): Exclusive upper date bound.
+            before_round (Optional[int]): If given together with max_date,
+                matches on max_date are included if their round number is
+                lower than this.
+
+        Returns:
+            Tuple[int, int]: The start and end of the slice into keys and
+            positions. Both are zero if the player is not in the index.
+        """
+
+        code = self.player_codes.get(player_name)
+
+        if code is None:
+            return 0, 0
+
+        return search_key_range(self.keys, code, min_date=min_date,
+                                max_date=max_date, before_round=before_round)
+
+    def lookup(self, player_name, min_date=None, max_date=None,
+               before_round=None):
+        """Returns the row positions of the player's matches in the period
+        given, in chronological order. See bounds for the arguments."""
+
+        start, end = self.bounds(player_name, min_date=min_date,
+                                 max_date=max_date, before_round=before_round)
+
+        return self.positions[start:end]
+
+    def lookup_many(self, player_names, min_dates=None, max_dates=None,
+                    before_rounds=None):
+        """Finds the matches of many players, each in their own period, in one
+        vectorised pass.
+
+        Args:
+            player_names (Sequence[str]): The player for each query.
+            min_dates (Optional[Sequence[datetime.date]]): Inclusive lower
+                date bound for each query. None entries are unbounded.
+            max_dates (Optional[Sequence[datetime.date]]): Exclusive upper
+                date bound for each query. None entries are unbounded.
+            before_rounds (Optional[Sequence[int]]): For each query, matches
+                on max_date are included if their round number is lower than
+                this. None (or NaN) entries include no matches on max_date.
+
+        Returns:
+            MatchHistories: The row positions of each query's matches.
+        """
+
+        codes = self.player_names.get_indexer(
+            pd.Index(list(player_names), dtype=object)).astype(np.int64)
+
+        return search_many_key_ranges(self.keys, self.positions, codes,
+                                      min_dates=min_dates,
+                                      max_dates=max_dates,
+                                      before_rounds=before_rounds)
+
+
+def make_pair_codes(first_codes, second_codes):
+    """Combines two arrays of player codes into int64 codes of the
+    unordered pairs, so that (a, b) and (b, a) get the same code."""
+
+    first_codes = np.asarray(first_codes, dtype=np.int64)
+    second_codes = np.asarray(second_codes, dtype=np.int64)
+
+    return ((np.minimum(first_codes, second_codes) << 32) |
+            np.maximum(first_codes, second_codes))
+
+
+class HeadToHeadIndex(object):
+    """An index of the row positions of the matches between each pair of
+    players.
+
+    Each pair of players who met gets a rank, in order of their first
+    match. The entries are sorted by rank, date and round (see make_keys,
+    with the rank in place of the player code), so that the meetings of a
+    pair within a date range (and before a given round) form a contiguous
+    slice which is found with two binary searches. The ranks are found from
+    the pair codes (see make_pair_codes) by binary search too, which keeps
+    the table at a few bytes per pair.
+
+    Attributes:
+        pair_codes (np.ndarray): The code of each pair, in order of rank.
+        sorted_pair_codes (np.ndarray): The pair codes, sorted.
+        sorted_ranks (np.ndarray): The rank of each of sorted_pair_codes.
+        keys (np.ndarray): The int64 sort keys of the entries.
+        positions (np.ndarray): The row positions in the stats DataFrame,
+            aligned with keys.
+    """
+
+    def __init__(self, winner_codes, loser_codes, start_dates, round_numbers):
+
+        ranks, uniques = pd.factorize(make_pair_codes(winner_codes,
+                                                      loser_codes))
+
+        self.pair_codes = np.asarray(uniques, dtype=np.int64)
+        self.update_pair_lookup()
+
+        positions = np.arange(len(ranks), dtype=np.int64)
+        keys = make_keys(ranks, to_day_numbers(start_dates),
+                         to_round_slots(round_numbers))
+
+        order = np.lexsort((positions, keys))
+
+        self.keys = keys[order]
+        self.positions = positions[order]
+
+    @classmethod
+    def from_arrays(cls, pair_codes, keys, positions):
+        """Rebuilds an index from its pair codes (in order of rank), keys and
+        positions, e.g. as saved in a snapshot."""
+
+        index = cls.__new__(cls)
+        index.pair_codes = pair_codes
+        index.keys = keys
+        index.positions = positions
+        index.update_pair_lookup()
+
+        return index
+
+    def update_pair_lookup(self):
+
+        self.sorted_ranks = np.argsort(self.pair_codes, kind='stable')
+        self.sorted_pair_codes = self.pair_codes[self.sorted_ranks]
+
+    def __len__(self):
+
+        return len(self.pair_codes)
+
+    def ranks(self, first_codes, second_codes):
+        """Returns the rank of each pair of player codes given, or -1 for
+        pairs which never met (or unknown players, with code -1)."""
+
+        first_codes = np.asarray(first_codes, dtype=np.int64)
+        second_codes = np.asarray(second_codes, dtype=np.int64)
+
+        pair_codes = make_pair_codes(first_codes, second_codes)
+
+        if len(self.sorted_pair_codes) == 0:
+            return np.full(len(pair_codes), -1, dtype=np.int64)
+
+        found = np.minimum(np.searchsorted(self.sorted_pair_codes, pair_codes),
+                           len(self.sorted_pair_codes) - 1)
+
+        known = ((self.sorted_pair_codes[found] == pair_codes) &
+                 (first_codes >= 0) & (second_codes >= 0))
+
+        return np.where(known, self.sorted_ranks[found], -1)
+
+    def extend(self, winner_codes, loser_codes, start_dates, round_numbers,
+               first_position):
+        """Adds matches at the row positions starting from first_position,
+        giving ranks to pairs which had not met before."""
+
+        pair_codes = make_pair_codes(winner_codes, loser_codes)
+        ranks = self.ranks(winner_codes, loser_codes)
+
+        new_pairs = pd.unique(pair_codes[ranks < 0])
+
+        if len(new_pairs) > 0:
+
+            self.pair_codes = np.concatenate([self.pair_codes, new_pairs])
+            self.update_pair_lookup()
+
+            ranks = self.ranks(winner_codes, loser_codes)
+
+        positions = first_position + np.arange(len(ranks), dtype=np.int64)
+
+        self.keys, self.positions = insert_sorted(
+            self.keys, self.positions,
+            make_keys(ranks, to_day_numbers(start_dates),
+                      to_round_slots(round_numbers)),
+            positions)
+
+    def lookup(self, first_code, second_code, min_date=None, max_date=None,
+               before_round=None):
+        """Returns the row positions of the matches between the players with
+        the codes given in the period given, in chronological order. See
+        search_key_range for the date arguments."""
+
+        rank = int(self.ranks([first_code], [second_code])[0])
+
+        if rank < 0:
+            return self.positions[:0]
+
+        start, end = search_key_range(self.keys, rank, min_date=min_date,
+                                      max_date=max_date,
+                                      before_round=before_round)
+
+        return self.positions[start:end]
+
+    def lookup_many(self, first_codes, second_codes, min_dates=None,
+                    max_dates=None, before_rounds=None):
+        """Finds the matches between many pairs of players, each in their
+        own period, in one vectorised pass. See PlayerIndex.lookup_many for
+        the date arguments.
+
+        Returns:
+            MatchHistories: The row positions of each query's matches.
+        """
+
+        return search_many_key_ranges(
+            self.keys, self.positions, self.ranks(first_codes, second_codes),
+            min_dates=min_dates, max_dates=max_dates,
+            before_rounds=before_rounds)
+
+
+def search_many_key_ranges(keys, positions, codes, min_dates=None,
+                           max_dates=None, before_rounds=None):
+    """Finds the positions of many codes, each in their own period, in
+    sorted keys made with make_keys. Codes of -1 find nothing. See
+    PlayerIndex.lookup_many for the date arguments.
+
+    Returns:
+        MatchHistories: The positions found for each code.
+    """
+
+    n_queries = len(codes)
+
+    known = codes >= 0
+    codes = np.where(known, codes, 0)
+
+    min_days, has_min = to_optional_day_numbers(min_dates, n_queries)
+    max_days, has_max = to_optional_day_numbers(max_dates, n_queries)
+
+    if before_rounds is None:
+        round_slots = np.zeros(n_queries, dtype=np.int64)
+    else:
+        rounds = pd.to_numeric(pd.Series(list(before_rounds),
+                                         dtype=object)).values
+        round_slots = np.clip(np.nan_to_num(rounds + 1, nan=0), 0,
+                              MAX_ROUND_SLOT).astype(np.int64)
+
+    lower = np.where(has_min, make_keys(codes, min_days, 0), codes << 32)
+    upper = np.where(has_max, make_keys(codes, max_days, round_slots),
+                     (codes + 1) << 32)
+
+    starts = np.searchsorted(keys, lower)
+    ends = np.maximum(np.searchsorted(keys, upper), starts)
+
+    # Unknown codes have no matches:
+    ends = np.where(known, ends, starts)
+
+    offsets, entries = expand_ranges(starts, ends)
+
+    return MatchHistories(offsets, positions[entries])
@@ -0,0 +1,404 @@
+import numpy as np
+import pandas as pd
+
+from tdata.datasets.player_index import (to_day_numbers, to_round_slots,
+                                         make_keys)
+
+
+# The rating of a player (or of a player on a surface) before their first
+# match.
+INITIAL_RATING = 1500.
+
+# The proportion of serve points won by the server assumed before any points
+# have been seen.
+INITIAL_SERVE_AVERAGE = 0.62
+
+# How many points the running serve average starts with, so that the first
+# few matches do not move it much.
+SERVE_AVERAGE_PRIOR_POINTS = 1000.
+
+# The factor turning a difference in ratings into a difference in log-odds.
+LOG_ODDS_PER_POINT = np.log(10.) / 400.
+
+
+def win_probability(rating, opponent_rating):
+    """Returns the probability that a player beats an opponent under Elo's
+    model."""
+
+    return 1. / (1. + 10. ** ((opponent_rating - rating) / 400.))
+
+
+def serve_probability(serve_rating, return_rating, serve_average):
+    """Returns the probability that the server wins a point, given the
+    server's serve rating, the returner's return rating and the average
+    proportion of serve points won. Equal ratings give the average."""
+
+    log_odds = (np.log(serve_average / (1. - serve_average)) +
+                LOG_ODDS_PER_POINT * (serve_rating - return_rating))
+
+    return 1. / (1. + np.exp(-log_odds))
+
+
+class RatingState(object):
+    """A rating and the number of matches it is based on."""
+
+    __slots__ = ['rating', 'matches']
+
+    def __init__(self, rating=INITIAL_RATING):
+
+        self.rating = rating
+        self.matches = 0
+
+
+class EloEngine(object):
+    """Computes Elo ratings before every match, in a single chronological
+    pass over a dataset.
+
+    Three kinds of rating are kept for each player:
+
+    * an overall Elo rating, updated after every match;
+    * if by_surface is True, an Elo rating for each surface, updated after
+      the player's matches on that surface only. The blended rating of a
+      match is surface_weight times the surface rating plus the rest times
+      the overall rating;
+    * if serve_return is True, a serve and a return rating, updated from the
+      proportion of serve points won: the server's chance of winning a point
+      is that implied by the difference between the server's serve rating
+      and the returner's return rating, around the running average of all
+      matches so far (see serve_probability). Matches without point counts
+      leave them unchanged.
+
+    The Elo ratings move by k_factor / (matches + k_offset) ** k_shape times
+    the difference between the result and its expected value, so that the
+    ratings of new players move faster. The serve and return ratings move by
+    point_k_factor times the difference between the proportion of serve
+    points won and its expected value.
+
+    After compute, update continues from where it left off, so that new
+    matches can be rated without another pass over the history.
+
+    Columns are named {role}_{rating}, e.g. winner_elo, loser_surface_elo,
+    winner_blended_elo, loser_serve_elo or winner_return_elo, together with
+    the winner's pre-match chance of winning under the overall and blended
+    ratings (winner_elo_prob, winner_blended_elo_prob) and each player's
+    expected proportion of serve points won ({role}_expected_spw).
+    """
+
+    def __init__(self, k_factor=250., k_offset=5., k_shape=0.4,
+                 by_surface=True, surface_weight=0.5, serve_return=True,
+                 point_k_factor=30.):
+
+        self.k_factor = k_factor
+        self.k_offset = k_offset
+        self.k_shape = k_shape
+        self.by_surface = by_surface
+        self.surface_weight = surface_weight
+        self.serve_return = serve_return
+        self.point_k_factor = point_k_factor
+
+        self.reset()
+
+    def reset(self):
+        """Forgets every match seen."""
+
+        self.dataset = None
+        self.ratings = dict()
+        self.surface_ratings = dict()
+        self.serve_ratings = dict()
+        self.return_ratings = dict()
+        self.serve_points_won = 0.
+        self.serve_points_played = 0.
+        self.last_key = None
+
+    def k(self, state):
+        """Returns the K-factor of a rating."""
+
+        return self.k_factor / (state.matches + self.k_offset) ** self.k_shape
+
+    def serve_average(self):
+        """Returns the proportion of serve points won in the matches seen so
+        far, shrunk towards INITIAL_SERVE_AVERAGE."""
+
+        return ((self.serve_points_won +
+                 INITIAL_SERVE_AVERAGE * SERVE_AVERAGE_PRIOR_POINTS) /
+                (self.serve_points_played + SERVE_AVERAGE_PRIOR_POINTS))
+
+    def output_names(self):
+
+        names = ['winner_elo', 'loser_elo', 'winner_elo_prob']
+
+        if self.by_surface:
+            names += ['winner_surface_elo', 'loser_surface_elo',
+                      'winner_blended_elo', 'loser_blended_elo',
+                      'winner_blended_elo_prob']
+
+        if self.serve_return:
+            names += ['winner_serve_elo', 'winner_return_elo',
+                      'loser_serve_elo', 'loser_return_elo',
+                      'winner_expected_spw', 'loser_expected_spw']
+
+        return names
+
+    def state(self, states, key):
+
+        found = states.get(key)
+
+        if found is None:
+            found = RatingState()
+            states[key] = found
+
+        return found
+
+    def update_elo(self, winner_state, loser_state):
+
+        expected = win_probability(winner_state.rating, loser_state.rating)
+
+        winner_change = self.k(winner_state) * (1. - expected)
+        loser_change = self.k(loser_state) * (1. - expected)
+
+        winner_state.rating += winner_change
+        loser_state.rating -= loser_change
+
+        winner_state.matches += 1
+        loser_state.matches += 1
+
+    def rate(self, df, counts, positions):
+        """Rates the matches of df at the positions given, in that order,
+        updating the ratings after each.
+
+        Returns:
+            pd.DataFrame: The pre-match ratings, aligned with df.
+        """
+
+        n_matches = df.shape[0]
+
+        winners = np.asarray(df['winner'].values, dtype=object).tolist()
+        losers = np.asarray(df['loser'].values, dtype=object).tolist()
+
+        if self.by_surface and 'surface' in df.columns:
+            surfaces = np.asarray(df['surface'].values, dtype=object)
+            surfaces = [None if pd.isnull(x) else x for x in surfaces]
+        else:
+            surfaces = [None] * n_matches
+
+        if self.serve_return:
+            # Winner and loser serve points won and played, as rows.
+            point_counts = counts[
+                ['winner_serve_points_won', 'winner_serve_points_played',
+                 'loser_serve_points_won', 'loser_serve_points_played']
+            ].values.astype(float).tolist()
+
+        outputs = {name: np.full(n_matches, np.nan)
+                   for name in self.output_names()}
+
+        for position in positions:
+
+            winner, loser = winners[position], losers[position]
+
+            winner_state = self.state(self.ratings, winner)
+            loser_state = self.state(self.ratings, loser)
+
+            outputs['winner_elo'][position] = winner_state.rating
+            outputs['loser_elo'][position] = loser_state.rating
+            outputs['winner_elo_prob'][position] = win_probability(
+                winner_state.rating, loser_state.rating)
+
+            if self.by_surface:
+
+                surface = surfaces[position]
+
+                if surface is None:
+                    winner_surface, loser_surface = None, None
+                    winner_blended = winner_state.rating
+                    loser_blended = loser_state.rating
+                else:
+                    winner_surface = self.state(self.surface_ratings,
+                                                (winner, surface))
+                    loser_surface = self.state(self.surface_ratings,
+                                               (loser, surface))
+
+                    outputs['winner_surface_elo'][position] = \
+                        winner_surface.rating
+                    outputs['loser_surface_elo'][position] = \
+                        loser_surface.rating
+
+                    winner_blended = (
+                        self.surface_weight * winner_surface.rating +
+                        (1. - self.surface_weight) * winner_state.rating)
+                    loser_blended = (
+                        self.surface_weight * loser_surface.rating +
+                        (1. - self.surface_weight) * loser_state.rating)
+
+                outputs['winner_blended_elo'][position] = winner_blended
+                outputs['loser_blended_elo'][position] = loser_blended
+                outputs['winner_blended_elo_prob'][position] = \
+                    win_probability(winner_blended, loser_blended)
+
+                if winner_surface is not None:
+                    self.update_elo(winner_surface, loser_surface)
+
+            self.update_elo(winner_state, loser_state)
+
+            if self.serve_return:
+                self.rate_points(winner, loser, point_counts[position],
+                                 position, outputs)
+
+        return pd.DataFrame(outputs, index=df.index,
+                            columns=self.output_names())
+
+    def rate_points(self, winner, loser, point_counts, position, outputs):
+        """Records the serve and return ratings of a match's players and
+        updates them from its point counts (see rate)."""
+
+        average = self.serve_average()
+
+        winner_serve = self.serve_ratings.get(winner, INITIAL_RATING)
+        winner_return = self.return_ratings.get(winner, INITIAL_RATING)
+        loser_serve = self.serve_ratings.get(loser, INITIAL_RATING)
+        loser_return = self.return_ratings.get(loser, INITIAL_RATING)
+
+        winner_expected = serve_probability(winner_serve, loser_return,
+                                            average)
+        loser_expected = serve_probability(loser_serve, winner_return,
+                                           average)
+
+        outputs['winner_serve_elo'][position] = winner_serve
+        outputs['winner_return_elo'][position] = winner_return
+        outputs['loser_serve_elo'][position] = loser_serve
+        outputs['loser_return_elo'][position] = loser_return
+        outputs['winner_expected_spw'][position] = winner_expected
+        outputs['loser_expected_spw'][position] = loser_expected
+
+        winner_won, winner_played, loser_won, loser_played = point_counts
+
+        for server, returner, won, played, expected in [
+                (winner, loser, winner_won, winner_played, winner_expected),
+                (loser, winner, loser_won, loser_played, loser_expected)]:
+
+            if not played > 0:
+                # Also skips missing counts, which are NaN.
+                continue
+
+            change = self.point_k_factor * (won / played - expected)
+
+            self.serve_ratings[server] = self.serve_ratings.get(
+                server, INITIAL_RATING) + change
+            self.return_ratings[returner] = self.return_ratings.get(
+                returner, INITIAL_RATING) - change
+
+            self.serve_points_won += won
+            self.serve_points_played += played
+
+    @staticmethod
+    def chronological_keys(df):
+        """Returns the keys which sort matches by date, then round, as the
+        date index does. Rounds which are not numeric come first."""
+
+        return make_keys(0, to_day_numbers(df['start_date'].values),
+                         to_round_slots(df['round_number'].values))
+
+    def compute(self, dataset):
+        """Computes the pre-match ratings for every match of the dataset,
+        starting from scratch.
+
+        Args:
+            dataset (Dataset): The dataset to compute ratings for.
+
+        Returns:
+            pd.DataFrame: The ratings, with the same index (and row order)
+            as the dataset's stats DataFrame.
+        """
+
+        self.reset()
+        self.dataset = dataset
+
+        df = dataset.get_stats_df()
+        counts = dataset.get_point_counts() if self.serve_return else None
+        positions = dataset.date_index.positions.tolist()
+
+        ratings = self.rate(df, counts, positions)
+
+        if len(positions) > 0:
+            self.last_key = self.chronological_keys(df)[positions[-1]]
+
+        return ratings
+
+    def update(self, new_matches):
+        """Computes the pre-match ratings of new matches, continuing from the
+        ratings after the matches seen so far, and updates them.
+
+        Args:
+            new_matches (pd.DataFrame): The matches, with the columns of the
+                stats DataFrame of the dataset given to compute (e.g. the new
+                rows passed to Dataset.append). They need not be sorted, but
+                none may come before the last match seen.
+
+        Returns:
+            pd.DataFrame: The ratings, with the same index (and row order)
+            as new_matches.
+
+        Raises:
+            ValueError: If compute has not been called, or a new match comes
+                before the last match seen.
+        """
+
+        if self.dataset is None:
+            raise ValueError('Call compute before update.')
+
+        keys = self.chronological_keys(new_matches)
+
+        # Sort by date, then round, keeping the given order within these.
+        positions = np.argsort(keys, kind='stable').tolist()
+
+        if len(positions) > 0 and self.last_key is not None:
+
+            if keys[positions[0]] < self.last_key:
+                raise ValueError(
+                    'New matches must not come before the last match seen. '
+                    'Call compute to rate the whole dataset again.')
+
+        counts = (self.dataset.calculate_point_counts(new_matches)
+                  if self.serve_return else None)
+
+        ratings = self.rate(new_matches, counts, positions)
+
+        if len(positions) > 0:
+            self.last_key = keys[positions[-1]]
+
+        return ratings
+
+    def current_ratings(self):
+        """Returns every player's ratings after the matches seen so far.
+
+        Returns:
+            pd.DataFrame: The overall Elo rating and number of matches of
+            each player, indexed by name, with a {surface}_elo column for
+            each surface if by_surface is True and serve_elo and return_elo
+            columns if serve_return is True. Ratings a player does not have
+            yet are NaN.
+        """
+
+        players = sorted(self.ratings)
+
+        current = pd.DataFrame({
+            'elo': [self.ratings[x].rating for x in players],
+            'matches': [self.ratings[x].matches for x in players]},
+            index=pd.Index(players, name='player'))
+
+        if self.by_surface:
+
+            surfaces = sorted({surface for _, surface in self.surface_ratings})
+
+            for surface in surfaces:
+                current['{}_elo'.format(surface)] = [
+                    self.surface_ratings[x, surface].rating
+                    if (x, surface) in self.surface_ratings else np.nan
+                    for x in players]
+
+        if self.serve_return:
+            current['serve_elo'] = [self.serve_ratings.get(x, np.nan)
+                                    for x in players]
+            current['return_elo'] = [self.return_ratings.get(x, np.nan)
+                                     for x in players]
+
+        return current
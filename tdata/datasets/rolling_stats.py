@@ -0,0 +1,262 @@
+import numpy as np
+import pandas as pd
+
+from collections import deque
+
+
+# The totals kept for each player. The first four are point counts, then the
+# number of matches, then the sum and count of the per-match serve
+# percentages (which may be missing).
+COUNT_NAMES = ['serve_points_won', 'serve_points_played',
+               'return_points_won', 'return_points_played']
+N_TOTALS = len(COUNT_NAMES) + 3
+
+OUTPUT_NAMES = COUNT_NAMES + ['matches', 'spw', 'rpw', 'mean_spw_pct']
+
+
+class DayWindow(object):
+    """Totals over the matches played in the last length_days days."""
+
+    def __init__(self, length_days):
+
+        self.length_days = length_days
+        self.entries = deque()
+        self.sums = [0.] * N_TOTALS
+
+    def totals(self, day):
+
+        while self.entries and self.entries[0][0] <= day - self.length_days:
+            _, old = self.entries.popleft()
+            self.sums = [x - y for x, y in zip(self.sums, old)]
+
+        return self.sums
+
+    def add(self, day, values):
+
+        self.entries.append((day, values))
+        self.sums = [x + y for x, y in zip(self.sums, values)]
+
+
+class MatchWindow(object):
+    """Totals over the last n_matches matches."""
+
+    def __init__(self, n_matches):
+
+        self.n_matches = n_matches
+        self.entries = deque()
+        self.sums = [0.] * N_TOTALS
+
+    def totals(self, day):
+
+        return self.sums
+
+    def add(self, day, values):
+
+        if len(self.entries) == self.n_matches:
+            old = self.entries.popleft()
+            self.sums = [x - y for x, y in zip(self.sums, old)]
+
+        self.entries.append(values)
+        self.sums = [x + y for x, y in zip(self.sums, values)]
+
+
+class DecayWindow(object):
+    """Totals over all previous matches, each weighted by
+    0.5 ** (days since the match / half_life_days)."""
+
+    def __init__(self, half_life_days):
+
+        self.half_life_days = half_life_days
+        self.last_day = None
+        self.sums = [0.] * N_TOTALS
+
+    def totals(self, day):
+
+        if self.last_day is None:
+            return self.sums
+
+        weight = 0.5 ** ((day - self.last_day) / float(self.half_life_days))
+
+        return [x * weight for x in self.sums]
+
+    def add(self, day, values):
+
+        self.sums = [x + y for x, y in zip(self.totals(day), values)]
+        self.last_day = day
+
+
+class RollingStatsEngine(object):
+    """Computes each player's serve and return aggregates before every match,
+    in a single chronological pass over a dataset.
+
+    For each match and both players, the engine reports the points won and
+    played on serve and return, the number of matches, the resulting serve
+    and return points won proportions and the mean per-match serve
+    percentage, over:
+
+    * the last n days (windows_days),
+    * the last n matches (windows_matches),
+    * all previous matches, exponentially decayed (half_lives_days),
+
+    and, if by_surface is True, the same restricted to the match's surface.
+    Matches on the same date in earlier rounds count as previous matches.
+
+    Columns are named {role}_{scope}{window}_{stat}, e.g.
+    winner_365d_spw, loser_surface_10m_matches or winner_hl180d_rpw, where
+    scope is empty or 'surface_'.
+    """
+
+    def __init__(self, windows_days=(365,), windows_matches=(10,),
+                 half_lives_days=(180,), by_surface=True):
+
+        self.window_specs = (
+            [('{}d'.format(x), DayWindow, x) for x in windows_days] +
+            [('{}m'.format(x), MatchWindow, x) for x in windows_matches] +
+            [('hl{}d'.format(x), DecayWindow, x) for x in half_lives_days])
+
+        self.scopes = ['', 'surface_'] if by_surface else ['']
+
+    def make_windows(self):
+
+        return [window_class(parameter) for _, window_class, parameter in
+                self.window_specs]
+
+    @staticmethod
+    def match_values(counts, spw_pct):
+        """Returns the values each match adds to the totals, one row per
+        match. Missing counts add nothing; missing percentages are not
+        counted towards the mean."""
+
+        has_pct = ~np.isnan(spw_pct)
+
+        return np.column_stack([
+            np.nan_to_num(counts, nan=0.), np.ones(len(spw_pct)),
+            np.where(has_pct, spw_pct, 0.), has_pct.astype(float)])
+
+    @staticmethod
+    def summarise(totals):
+        """Turns totals of shape (..., N_TOTALS) into the outputs, of shape
+        (..., len(OUTPUT_NAMES))."""
+
+        serve_won, serve_played, return_won, return_played, matches, \
+            pct_sum, pct_count = np.moveaxis(totals, -1, 0)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+
+            outputs = [serve_won, serve_played, return_won, return_played,
+                       matches,
+                       np.where(serve_played > 0, serve_won / serve_played,
+                                np.nan),
+                       np.where(return_played > 0,
+                                return_won / return_played, np.nan),
+                       np.where(pct_count > 0, pct_sum / pct_count, np.nan)]
+
+        return np.stack(outputs, axis=-1)
+
+    def compute(self, dataset):
+        """Computes the pre-match aggregates for every match of the dataset.
+
+        Args:
+            dataset (Dataset): The dataset to compute aggregates for.
+
+        Returns:
+            pd.DataFrame: The aggregates, with the same index (and row order)
+            as the dataset's stats DataFrame.
+        """
+
+        df = dataset.get_stats_df()
+        counts = dataset.get_point_counts()
+
+        n_matches = df.shape[0]
+        n_windows = len(self.window_specs)
+
+        days = (df['start_date'].values.astype('datetime64[D]')
+                .astype(np.int64)).tolist()
+        surfaces = (np.asarray(df['surface'].values, dtype=object)
+                    if 'surface' in df.columns else
+                    np.full(n_matches, None, dtype=object))
+        has_surface = (~pd.isnull(surfaces)).tolist()
+        players = {role: np.asarray(df[role].values, dtype=object)
+                   for role in ['winner', 'loser']}
+
+        values = dict()
+
+        for role in ['winner', 'loser']:
+
+            role_counts = counts[
+                ['{}_{}'.format(role, x) for x in COUNT_NAMES]].values.astype(
+                    float)
+
+            pct_column = '{}_serve_points_won_pct'.format(role)
+
+            if pct_column in df.columns:
+                role_pct = df[pct_column].values.astype(float)
+            else:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    role_pct = role_counts[:, 0] / role_counts[:, 1]
+
+            values[role] = self.match_values(role_counts, role_pct).tolist()
+
+        # For each role and scope, the positions reported and their totals.
+        reported = {(role, scope): ([], []) for role in players
+                    for scope in self.scopes}
+
+        states = dict()
+
+        for position in dataset.date_index.positions.tolist():
+
+            day = days[position]
+            surface = surfaces[position]
+
+            updates = list()
+
+            for role in ['winner', 'loser']:
+
+                player = players[role][position]
+
+                for scope in self.scopes:
+
+                    if scope == '':
+                        key = (player,)
+                    elif has_surface[position]:
+                        key = (player, surface)
+                    else:
+                        continue
+
+                    windows = states.get(key)
+
+                    if windows is None:
+                        windows = self.make_windows()
+                        states[key] = windows
+
+                    positions, totals = reported[(role, scope)]
+                    positions.append(position)
+                    totals.append([x.totals(day) for x in windows])
+
+                    updates.append((windows, values[role][position]))
+
+            # Only add the match once both players' pre-match values are in.
+            for windows, match_values in updates:
+                for window in windows:
+                    window.add(day, match_values)
+
+        columns = dict()
+
+        for (role, scope), (positions, totals) in reported.items():
+
+            outputs = np.full((n_matches, n_windows, len(OUTPUT_NAMES)),
+                              np.nan)
+
+            if len(positions) > 0:
+                outputs[positions] = self.summarise(
+                    np.array(totals, dtype=float))
+
+            for window_number, (label, _, _) in enumerate(self.window_specs):
+                for output_number, name in enumerate(OUTPUT_NAMES):
+
+                    column_name = '{}_{}{}_{}'.format(role, scope, label,
+                                                      name)
+                    columns[column_name] = outputs[:, window_number,
+                                                   output_number]
+
+        return pd.DataFrame(columns, index=df.index)
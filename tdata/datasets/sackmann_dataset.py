@@ -3,30 +3,141 @@ import numpy as np
 import pandas as pd
 
 from pathlib import Path
+from functools import partial
 from tdata.datasets.dataset import Dataset
+from tdata.datasets.compact import compact_frame
+from tdata.datasets.streaming import (iter_chronological, year_partitions,
+                                      year_from_path)
+from tdata.datasets.column_arrays import ColumnArrays
 from tdata.datasets.match_stats import MatchStats
+from tdata.datasets.column_profiles import resolve_columns, column_selector
+from tdata.datasets.parallel import read_files
+
+
+# The point counts read from the csvs, for the winner (w_) and loser (l_).
+POINT_COLUMNS = [role + x for role in ['w_', 'l_']
+                 for x in ['svpt', '1stIn', '1stWon', '2ndWon', 'df']]
+
+MATCH_COLUMNS = ['tourney_name', 'surface', 'tourney_level', 'tourney_date',
+                 'winner_name', 'loser_name', 'score', 'round']
+
+# The columns each profile reads (see column_profiles). The csvs have no
+# odds, so with_odds reads the core columns.
+COLUMN_PROFILES = {'core': MATCH_COLUMNS + POINT_COLUMNS,
+                   'with_odds': MATCH_COLUMNS + POINT_COLUMNS,
+                   'all': None}
+
+# The dtypes of the columns we use. Stats are floats as they may be missing.
+COLUMN_DTYPES = dict(
+    [(x, object) for x in MATCH_COLUMNS if x != 'tourney_date'] +
+    [(x, np.float64) for x in POINT_COLUMNS])
+
+
+def read_year_csv(csv_path, columns=None):
+    """Reads a Sackmann match csv. If columns are given, only those the file
+    has are read."""
+
+    return pd.read_csv(csv_path, usecols=column_selector(columns),
+                       dtype=COLUMN_DTYPES)
+
+
+def find_year_csvs(keep_challengers=False, keep_futures=False):
+    """Returns the Sackmann match csvs, in order of year."""
+
+    # Find the correct directory:
+    exec_dir = Path(__file__).parents[2]
+
+    # Get all csv filenames:
+    all_csvs = glob.glob(
+        '{}/data/sackmann/tennis_atp/atp_matches_*.csv'.format(exec_dir))
+
+    # Remove futures and challengers (and possibly corrupt 2016):
+    all_csvs = [x for x in all_csvs if '2016' not in x
+                and (keep_futures or 'futures' not in x)
+                and (keep_challengers or 'chall' not in x)]
+
+    return sorted(all_csvs, key=year_from_path)
 
 
 class SackmannDataset(Dataset):
+    """The matches in Jeff Sackmann's tennis_atp repository.
 
-    def __init__(self, stat_matches_only=True):
+    With streaming=True, nothing is loaded up front: iter_batches and
+    iter_matches then read one year at a time, in chronological order, with
+    the same filters and derived columns. The query methods are only
+    available when streaming is False.
 
-        # Find the correct directory:
-        exec_dir = Path(__file__).parents[2]
+    By default, every column of the csvs is read. Pass a column profile (see
+    column_profiles) as columns to read fewer: 'core' reads the columns
+    needed for the matches and their stats, and a list reads the core
+    columns and those listed.
 
-        # Get all csv filenames:
-        all_csvs = glob.glob(
-            '{}/data/sackmann/tennis_atp/atp_matches_*.csv'.format(exec_dir))
+    The csvs are read by a pool of workers (see parallel.read_files):
+    threads by default, or processes with executor='process'. workers=1
+    reads them one after another.
+    """
 
-        # Remove futures and challengers (and possibly corrupt 2016):
-        all_csvs = [x for x in all_csvs if 'futures' not in x
-                    and '2016' not in x and 'chall' not in x]
+    tour_level_column = 'tourney_level'
+
+    optional_stat_columns = {
+        'winners': ('winner_winners', 'loser_winners'),
+        'ues': ('winner_ues', 'loser_ues'),
+        'odds': ('winner_odds', 'loser_odds')}
+
+    def __init__(self, stat_matches_only=True, compact=False,
+                 streaming=False, keep_challengers=False, keep_futures=False,
+                 columns='all', workers=None, executor='thread'):
+
+        self.stat_matches_only = stat_matches_only
+        self.keep_challengers = keep_challengers
+        self.keep_futures = keep_futures
+        self.columns = resolve_columns(COLUMN_PROFILES, columns)
+
+        if streaming:
+            return
 
         # Read them and concatenate them
-        big_df = pd.concat([pd.read_csv(x) for x in all_csvs],
-                           ignore_index=True)
+        with self.timed('read') as timer:
+            big_df = pd.concat(
+                read_files(partial(read_year_csv, columns=self.columns),
+                           self.find_year_files(), workers=workers,
+                           executor=executor),
+                ignore_index=True)
+            timer.rows += big_df.shape[0]
+
+        with self.timed('filter') as timer:
+            big_df = self.prepare_frame(big_df)
+
+            # Sort by date
+            big_df = big_df.sort_values(['start_date', 'round_number'])
+            timer.rows += big_df.shape[0]
+
+        if compact:
+            with self.timed('compact'):
+                big_df, self.compact_report = compact_frame(big_df)
+
+        self.full_df = big_df.set_index(self.df_index, drop=False)
+
+        super(SackmannDataset, self).__init__(start_date_is_exact=False)
+
+    @classmethod
+    def source_files(cls, arguments):
+
+        return find_year_csvs(keep_challengers=arguments['keep_challengers'],
+                              keep_futures=arguments['keep_futures'])
 
-        if stat_matches_only:
+    def find_year_files(self):
+        """Returns the match csvs to load, in order of year."""
+
+        return find_year_csvs(keep_challengers=self.keep_challengers,
+                              keep_futures=self.keep_futures)
+
+    def prepare_frame(self, big_df):
+        """Applies the filters and adds the derived columns to matches read
+        from the csvs. Rows are treated independently, so this works on any
+        subset of the files."""
+
+        if self.stat_matches_only:
             # Keep only those with stats and score:
             big_df = big_df.dropna(subset=['w_1stWon', 'score'])
 
@@ -42,7 +153,9 @@ class SackmannDataset(Dataset):
         big_df = big_df[~big_df['score'].str.contains('RET')]
 
         # Find stats
-        stats_df = self.calculate_stats_df(big_df)
+        with self.timed('stats') as timer:
+            stats_df = self.calculate_stats_df(big_df)
+            timer.rows += big_df.shape[0]
 
         # Concatenate
         big_df = pd.concat([big_df, stats_df], axis=1)
@@ -50,14 +163,41 @@ class SackmannDataset(Dataset):
         # Add round number:
         big_df['round_number'] = self.make_round_number(big_df)
 
-        # Sort by date
-        big_df = big_df.sort_values(['start_date', 'round_number'])
-
         big_df['year'] = big_df['start_date'].dt.year
 
-        super(SackmannDataset, self).__init__(start_date_is_exact=False)
+        return big_df
 
-        self.full_df = big_df.set_index(self.df_index, drop=False)
+    def iter_batches(self, batch_size=None):
+        """Reads the matches one year at a time (main tour, challenger and
+        futures files of the same year together).
+
+        Args:
+            batch_size (Optional[int]): The largest number of matches to
+                yield at once. By default, matches are yielded as soon as
+                they are known to be in order, i.e. roughly a year at a time.
+
+        Returns:
+            Iterator[pd.DataFrame]: The prepared matches, in chronological
+            order.
+        """
+
+        partitions = year_partitions(self.find_year_files())
+
+        frames = (self.prepare_frame(pd.concat(
+            [read_year_csv(x, columns=self.columns) for x in paths],
+            ignore_index=True))
+            for paths in partitions.values())
+
+        return iter_chronological(frames, batch_size=batch_size)
+
+    def iter_matches(self, lazy=False):
+        """Reads the matches one year at a time, as CompletedMatches (or
+        MatchViews if lazy is True), in chronological order."""
+
+        for batch in self.iter_batches():
+            for match in self.positions_into_matches(
+                    ColumnArrays(batch), range(batch.shape[0]), lazy=lazy):
+                yield match
 
     def make_round_number(self, df):
 
@@ -72,6 +212,10 @@ class SackmannDataset(Dataset):
 
         return self.full_df
 
+    def set_stats_df(self, df):
+
+        self.full_df = df
+
     def rename_cols(self, df):
 
         # Rename for consistency:
@@ -136,20 +280,46 @@ class SackmannDataset(Dataset):
 
         return results
 
+    def calculate_point_counts(self, df):
+
+        results = dict()
+
+        for role in ['winner', 'loser']:
+
+            results['{}_serve_points_won'.format(role)] = (
+                df['{}_serve_1st_won'.format(role)] +
+                df['{}_serve_2nd_won'.format(role)])
+            results['{}_serve_points_played'.format(role)] = (
+                df['{}_serve_1st_attempts'.format(role)])
+
+        for role, other_role in [('winner', 'loser'), ('loser', 'winner')]:
+
+            results['{}_return_points_won'.format(role)] = (
+                results['{}_serve_points_played'.format(other_role)] -
+                results['{}_serve_points_won'.format(other_role)])
+            results['{}_return_points_played'.format(role)] = (
+                results['{}_serve_points_played'.format(other_role)])
+
+        return pd.DataFrame(results, index=df.index)
+
     def calculate_stats(self, winner, loser, row):
 
         winners, ues, odds = None, None, None
 
         stats = dict()
 
-        for role, name in zip(['winner', 'loser'], [winner, loser]):
+        # MatchStats takes point counts, so find them as
+        # calculate_point_counts does.
+        serve_played, serve_won = dict(), dict()
+
+        for role in ['winner', 'loser']:
 
-            first_serve_pct = row['{}_first_serve_pct'.format(role)]
-            first_won_pct = row['{}_first_serve_won_pct'.format(role)]
-            second_won_pct = row['{}_second_serve_won_pct'.format(role)]
+            serve_played[role] = row['{}_serve_1st_attempts'.format(role)]
+            serve_won[role] = (row['{}_serve_1st_won'.format(role)] +
+                               row['{}_serve_2nd_won'.format(role)])
 
-            serve_won_pct = (first_serve_pct * first_won_pct +
-                             (1 - first_serve_pct) * second_won_pct)
+        for role, other_role, name in [('winner', 'loser', winner),
+                                       ('loser', 'winner', loser)]:
 
             if ('{}_winners'.format(role) in row and
                     not np.isnan(row['{}_winners'.format(role)])):
@@ -164,14 +334,12 @@ class SackmannDataset(Dataset):
 
             # Construct the object
             stats[name] = MatchStats(
-                player_name=name, pct_won_serve=serve_won_pct,
-                pct_won_return=None, odds=odds,
-                pct_first_serve=first_serve_pct,
-                pct_won_first_serve=first_won_pct,
-                pct_won_second_serve=second_won_pct, winners=winners, ues=ues)
-
-        stats[winner].pct_won_return = 1 - stats[loser].pct_won_serve
-        stats[loser].pct_won_return = 1 - stats[winner].pct_won_serve
+                player_name=name, serve_points_played=serve_played[role],
+                serve_points_won=serve_won[role],
+                return_points_played=serve_played[other_role],
+                return_points_won=(serve_played[other_role] -
+                                   serve_won[other_role]),
+                odds=odds, winners=winners, ues=ues)
 
         return stats
 
@@ -1,23 +1,50 @@
+from collections import namedtuple
+from functools import lru_cache
+
+
+# The most distinct score strings whose parsed sets are kept.
+PARSE_CACHE_SIZE = 2 ** 16
+
+
 class BadFormattingException(Exception):
     pass
 
 
+class SetScore(namedtuple('SetScore', ['winner_games', 'loser_games',
+                                       'tiebreak_score'])):
+    """The games won by the match winner and loser in a set, and the
+    tiebreak score (None if there was no tiebreak, -1 if it is unknown)."""
+
+    __slots__ = ()
+
+    @property
+    def score(self):
+
+        return (self.winner_games, self.loser_games)
+
+    @property
+    def match_winner_won(self):
+
+        return self.winner_games > self.loser_games
+
+
 class Score(object):
 
     # Provides information about whether the match was best of five, whether
     # the final set went to a long advantage (i.e. longer than a tiebreak), and
     # how many games were won by each player in each set.
 
-    def __init__(self, string_score, winner, loser):
+    __slots__ = ('is_retirement', 'winner', 'loser', 'string_score', 'sets',
+                 'bo5')
 
-        # This will be set if required
-        self.is_retirement = False
+    def __init__(self, string_score, winner, loser):
 
         self.winner = winner
         self.loser = loser
         self.string_score = string_score
 
-        self.sets = self.parse_string_score(string_score)
+        # Identical strings share their (immutable) parsed sets:
+        self.sets, self.is_retirement = parse_sets(string_score)
 
         # TODO: This may come back to bite. Maybe find another way; e.g. just
         # pass best of five rather than trying to infer it.
@@ -47,8 +74,7 @@ class Score(object):
             # We are left with the three-set case. Either the match's winner
             # won all three sets, in which case it is best of five; or he/she
             # played best of three.
-            set_winners = [cur_set['match_winner_won']
-                           for cur_set in sets]
+            set_winners = [cur_set.match_winner_won for cur_set in sets]
 
             if all(set_winners):
                 return True
@@ -60,80 +86,87 @@ class Score(object):
         assert(len(self.sets) > 0)
         final_set = self.sets[-1]
 
-        if final_set['score'][0] > 7:
+        if final_set.winner_games > 7:
             return True
 
     def parse_string_score(self, string_score):
 
-        result = list()
+        sets, self.is_retirement = parse_sets(string_score)
+
+        return sets
+
+    def __str__(self):
+
+        return self.string_score
 
-        # Break by spaces to find sets:
-        sets = string_score.split(' ')
 
-        for cur_set in sets:
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_sets(string_score):
+    """Parses a string score into a tuple of SetScores, and whether it marks
+    a retirement. Results are cached by string."""
 
-            if cur_set in ['ret.', 'ret', 'Ret', 'Ret.', 'w/o']:
-                # This was a retirement.
-                self.is_retirement = True
-                continue
+    result = list()
+    is_retirement = False
 
-            # Split on hyphen to find games:
-            games = cur_set.split('-')
+    # Break by spaces to find sets:
+    sets = string_score.split(' ')
 
-            # There should be exactly two matches:
-            if len(games) != 2:
-                print('Bad formatting: ' + str(cur_set))
-                raise BadFormattingException()
+    for cur_set in sets:
 
-            # The first is definitely the number of games won by player 1:
-            try:
-                p1_games = int(games[0])
-            except ValueError:
-                raise BadFormattingException(string_score)
+        if cur_set in ['ret.', 'ret', 'Ret', 'Ret.', 'w/o']:
+            # This was a retirement.
+            is_retirement = True
+            continue
 
-            # For p2, we need to check whether it went to a tiebreak:
-            tb_score = None
-            was_tb = (p1_games == 7 and games[1][0] == '6') or \
-                (p1_games == 6 and games[1][0] == '7')
+        # Split on hyphen to find games:
+        games = cur_set.split('-')
 
-            try:
+        # There should be exactly two matches:
+        if len(games) != 2:
+            print('Bad formatting: ' + str(cur_set))
+            raise BadFormattingException()
 
-                if was_tb:
+        # The first is definitely the number of games won by player 1:
+        try:
+            p1_games = int(games[0])
+        except ValueError:
+            raise BadFormattingException(string_score)
 
-                    p2_games = 6 if p1_games == 7 else 7
+        # For p2, we need to check whether it went to a tiebreak:
+        tb_score = None
+        was_tb = (p1_games == 7 and games[1][0] == '6') or \
+            (p1_games == 6 and games[1][0] == '7')
 
-                    # Find the tiebreak score (and allow it to be missing):
-                    bracket_beg = cur_set.find('(')
+        try:
 
-                    if bracket_beg == -1:
+            if was_tb:
 
-                        tb_score = -1
-                    else:
+                p2_games = 6 if p1_games == 7 else 7
 
-                        bracket_end = cur_set.find(')')
-                        tb_result = cur_set[bracket_beg + 1:bracket_end]
+                # Find the tiebreak score (and allow it to be missing):
+                bracket_beg = cur_set.find('(')
 
-                        tb_score = int(tb_result)
+                if bracket_beg == -1:
 
+                    tb_score = -1
                 else:
 
-                    # The number of games for p2 is just the second part of the
-                    # split:
-                    p2_games = int(games[1])
+                    bracket_end = cur_set.find(')')
+                    tb_result = cur_set[bracket_beg + 1:bracket_end]
 
-            except ValueError:
+                    tb_score = int(tb_result)
 
-                raise BadFormattingException(string_score)
+            else:
 
-            # Put things together and record:
-            cur_set = {'score': (p1_games, p2_games),
-                       'match_winner_won': p1_games > p2_games,
-                       'tiebreak_score': tb_score}
+                # The number of games for p2 is just the second part of the
+                # split:
+                p2_games = int(games[1])
 
-            result.append(cur_set)
+        except ValueError:
 
-        return result
+            raise BadFormattingException(string_score)
 
-    def __str__(self):
+        # Put things together and record:
+        result.append(SetScore(p1_games, p2_games, tb_score))
 
-        return self.string_score
+    return tuple(result), is_retirement
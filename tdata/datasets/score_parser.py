@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+
+
+# The most sets a score can have.
+MAX_SETS = 5
+
+# Entries of the games arrays for sets which were not played.
+NO_SET = -1
+
+# Entries of the tiebreak array: sets without a tiebreak, and tiebreaks whose
+# score is not given (as Score's tiebreak_score of None and -1).
+NO_TIEBREAK = -2
+UNKNOWN_TIEBREAK = -1
+
+# Parse error codes.
+PARSE_OK = 0
+PARSE_MISSING = 1
+PARSE_BAD_SET = 2
+PARSE_TOO_MANY_SETS = 3
+
+# Tokens marking a match which was not completed, compared in lower case.
+RETIREMENT_TOKENS = ['ret', 'ret.', 'retired', 'w/o', 'wo', 'def', 'def.']
+
+# A set: games won by the match winner, games won by the loser, and an
+# optional tiebreak score in brackets, e.g. 7-6(5). As in Score, only the
+# first digit of the loser's games is used for tiebreak sets, so the second
+# group is loose.
+SET_PATTERN = r'^(\d+)-(\d[^(]*)(?:\((\d+)\))?$'
+
+
+class ParsedScores(object):
+    """Set-by-set data of many scores, in fixed-width arrays.
+
+    Row i describes the i-th score parsed. Sets are given from the match
+    winner's point of view, in the order played. Rows with a parse error
+    have no sets.
+
+    Attributes:
+        winner_games (np.ndarray): Games won by the match winner in each set,
+            of shape (n_scores, MAX_SETS), with NO_SET for sets not played.
+        loser_games (np.ndarray): Games won by the match loser in each set,
+            laid out like winner_games.
+        tiebreaks (np.ndarray): The loser's points in each set's tiebreak
+            (as written in brackets), UNKNOWN_TIEBREAK for tiebreaks without
+            a score, or NO_TIEBREAK.
+        n_sets (np.ndarray): The number of sets in each score.
+        bo5 (np.ndarray): Whether each match was best of five, inferred as in
+            Score.find_bo5. False for retirements and parse errors.
+        retired (np.ndarray): Whether each score marks a retirement, walkover
+            or default.
+        errors (np.ndarray): A parse error code (PARSE_*) for each score.
+    """
+
+    def __init__(self, winner_games, loser_games, tiebreaks, n_sets, bo5,
+                 retired, errors):
+
+        self.winner_games = winner_games
+        self.loser_games = loser_games
+        self.tiebreaks = tiebreaks
+        self.n_sets = n_sets
+        self.bo5 = bo5
+        self.retired = retired
+        self.errors = errors
+
+    def __len__(self):
+
+        return len(self.errors)
+
+    def take(self, positions):
+        """Returns the parsed scores at the positions given."""
+
+        return ParsedScores(*[x[positions] for x in self.arrays()])
+
+    def concatenate(self, other):
+        """Returns these parsed scores followed by the other ones."""
+
+        return ParsedScores(*[np.concatenate([x, y]) for x, y in zip(
+            self.arrays(), other.arrays())])
+
+    def arrays(self):
+
+        return [self.winner_games, self.loser_games, self.tiebreaks,
+                self.n_sets, self.bo5, self.retired, self.errors]
+
+    def to_frame(self, index=None):
+        """Returns the parsed scores as a DataFrame with one column per set
+        and field, e.g. winner_games_1, loser_games_1 and tiebreak_1."""
+
+        columns = dict()
+
+        for set_number in range(MAX_SETS):
+            for name, values in [('winner_games', self.winner_games),
+                                 ('loser_games', self.loser_games),
+                                 ('tiebreak', self.tiebreaks)]:
+                columns['{}_{}'.format(name, set_number + 1)] = \
+                    values[:, set_number]
+
+        columns.update({'n_sets': self.n_sets, 'bo5': self.bo5,
+                        'retired': self.retired,
+                        'parse_error': self.errors})
+
+        return pd.DataFrame(columns, index=index)
+
+
+def parse_unique_scores(scores):
+    """Parses an array of distinct score strings. See parse_scores."""
+
+    n_scores = len(scores)
+
+    is_string = np.array([isinstance(x, str) for x in scores], dtype=bool)
+
+    tokens = pd.Series(np.where(is_string, scores, ''),
+                       dtype=object).str.split(' ').explode()
+    score_numbers = tokens.index.values
+
+    is_retirement = tokens.str.lower().isin(RETIREMENT_TOKENS).values
+
+    retired = np.zeros(n_scores, dtype=bool)
+    retired[score_numbers[is_retirement]] = True
+
+    sets = tokens[~is_retirement]
+    set_score_numbers = score_numbers[~is_retirement]
+
+    parts = sets.str.extract(SET_PATTERN)
+
+    winner_games = pd.to_numeric(parts[0]).values
+    loser_part = parts[1]
+    loser_games = pd.to_numeric(loser_part, errors='coerce').values
+    bracket = pd.to_numeric(parts[2]).values
+
+    # As in Score, a set is a tiebreak if it is 7-6 or 6-7; the loser's
+    # count is only checked for its first digit.
+    was_tiebreak = (
+        ((winner_games == 7) & (loser_part.str[0] == '6').values) |
+        ((winner_games == 6) & (loser_part.str[0] == '7').values))
+
+    loser_games = np.where(was_tiebreak, 13 - winner_games, loser_games)
+
+    tiebreaks = np.where(
+        was_tiebreak, np.where(np.isnan(bracket), UNKNOWN_TIEBREAK, bracket),
+        NO_TIEBREAK)
+
+    # Brackets are only allowed after tiebreak sets.
+    bad_set = np.isnan(winner_games) | (
+        ~was_tiebreak & (np.isnan(loser_games) | ~np.isnan(bracket)))
+
+    errors = np.full(n_scores, PARSE_OK, dtype=np.int8)
+
+    n_sets = np.bincount(set_score_numbers, minlength=n_scores)
+    errors[n_sets > MAX_SETS] = PARSE_TOO_MANY_SETS
+    errors[set_score_numbers[bad_set]] = PARSE_BAD_SET
+    errors[~is_string] = PARSE_MISSING
+
+    failed = errors != PARSE_OK
+    n_sets[failed] = 0
+
+    set_numbers = pd.Series(set_score_numbers).groupby(
+        set_score_numbers).cumcount().values
+    keep = ~failed[set_score_numbers]
+
+    rows, columns = set_score_numbers[keep], set_numbers[keep]
+
+    games = dict()
+
+    for name, values, missing in [('winner', winner_games, NO_SET),
+                                  ('loser', loser_games, NO_SET),
+                                  ('tiebreak', tiebreaks, NO_TIEBREAK)]:
+
+        array = np.full((n_scores, MAX_SETS), missing, dtype=np.int16)
+        array[rows, columns] = values[keep]
+        games[name] = array
+
+    # As Score.find_bo5: two sets are best of three, four or more best of
+    # five; otherwise, it is best of five if the winner won every set.
+    played = games['winner'] != NO_SET
+    winner_won_all = np.all(~played | (games['winner'] > games['loser']),
+                            axis=1)
+
+    bo5 = (n_sets > 3) | ((n_sets > 0) & (n_sets != 2) & winner_won_all)
+    bo5 &= ~retired & ~failed
+
+    return ParsedScores(games['winner'], games['loser'], games['tiebreak'],
+                        n_sets.astype(np.int8), bo5, retired, errors)
+
+
+def parse_scores(scores):
+    """Parses a whole column of score strings, such as "6-4 7-6(5)" or
+    "6-3 2-1 RET".
+
+    Each distinct string is only parsed once. Sets are separated by spaces;
+    "ret", "ret.", "w/o", "def" and "def." (in any case) mark a match that was
+    not completed and are otherwise skipped.
+
+    Args:
+        scores (Sequence[str]): The scores, as given by the winner. Missing
+            entries are allowed.
+
+    Returns:
+        ParsedScores: The set-by-set data, aligned with scores.
+    """
+
+    codes, uniques = pd.factorize(np.asarray(scores, dtype=object))
+
+    # Missing scores have code -1; parse them as the extra last entry.
+    parsed = parse_unique_scores(
+        np.append(np.asarray(uniques, dtype=object), np.nan))
+
+    return parsed.take(codes)
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+
+from tdata.datasets import instrumentation
+from tdata.datasets.player_index import to_day_numbers, to_day_number
+
+
+class ServeAverageIndex(object):
+    """Cumulative sums of the per-match serve averages, sorted by date, so
+    that the mean over any date range takes two binary searches.
+
+    A match's serve average is the mean of the winner's and loser's
+    proportion of serve points won. Besides all matches, the sums are kept
+    separately for each tournament and each surface. Missing averages are
+    skipped, as in pandas' mean.
+
+    Attributes:
+        groups (dict): Maps None (all matches), ('tournament', name) and
+            ('surface', surface) to a tuple of the sorted day numbers, the
+            averages in the same order, their cumulative sums and the
+            cumulative counts of the averages which are present.
+    """
+
+    def __init__(self, start_dates, averages, tournament_names, surfaces=None):
+
+        self.groups = dict()
+        self.add_to_groups(start_dates, averages, tournament_names, surfaces)
+
+    def add_to_groups(self, start_dates, averages, tournament_names,
+                      surfaces):
+
+        days = to_day_numbers(start_dates)
+        averages = np.asarray(averages, dtype=float)
+
+        self.add_to_group(None, days, averages)
+
+        group_columns = [('tournament', tournament_names)]
+
+        if surfaces is not None:
+            group_columns.append(('surface', surfaces))
+
+        for kind, values in group_columns:
+
+            codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+
+            # Group by code, keeping the date order within each group.
+            order = np.lexsort((days, codes))
+            boundaries = np.searchsorted(codes[order],
+                                         np.arange(len(uniques) + 1))
+
+            for code, name in enumerate(uniques):
+
+                members = order[boundaries[code]:boundaries[code + 1]]
+
+                self.add_to_group((kind, name), days[members],
+                                  averages[members])
+
+    def add_to_group(self, key, days, averages):
+        """Adds matches to a group (creating it if needed) and updates its
+        cumulative sums.
+
+        New matches are merged into the sorted days, after any existing
+        matches on the same day, and the sums are recomputed only from the
+        first place one was inserted. As appended matches are usually the
+        latest, that is normally just the end of the group.
+        """
+
+        order = np.argsort(days, kind='stable')
+        days, averages = days[order], averages[order]
+
+        if key not in self.groups:
+            valid = ~np.isnan(averages)
+
+            self.groups[key] = (
+                days, averages,
+                np.concatenate([[0.], np.cumsum(np.where(valid, averages,
+                                                         0.))]),
+                np.concatenate([[0], np.cumsum(valid)]))
+
+            return
+
+        old_days, old_averages, old_sums, old_counts = self.groups[key]
+
+        insert_at = np.searchsorted(old_days, days, side='right')
+
+        days = np.insert(old_days, insert_at, days)
+        averages = np.insert(old_averages, insert_at, averages)
+
+        first = insert_at[0] if len(insert_at) > 0 else len(old_days)
+
+        valid = ~np.isnan(averages[first:])
+
+        # Carry on from the sum before the first insertion, so that the sums
+        # are the same as those of a rebuild.
+        sums = np.concatenate([old_sums[:first], np.cumsum(np.concatenate(
+            [old_sums[first:first + 1],
+             np.where(valid, averages[first:], 0.)]))])
+        counts = np.concatenate([old_counts[:first], np.cumsum(np.concatenate(
+            [old_counts[first:first + 1], valid]))])
+
+        self.groups[key] = (days, averages, sums, counts)
+
+    def extend(self, start_dates, averages, tournament_names, surfaces=None):
+        """Adds matches to the index. Only the groups they belong to are
+        updated."""
+
+        self.add_to_groups(start_dates, averages, tournament_names, surfaces)
+
+    def mean(self, key=None, min_date=None, max_date=None, include_min=True,
+             include_max=False):
+        """Returns the mean serve average of the matches in a date range.
+
+        Args:
+            key (Optional[tuple]): The group to use: None for all matches,
+                ('tournament', name) or ('surface', surface).
+            min_date (Optional[datetime.date]): The lower date bound.
+            max_date (Optional[datetime.date]): The upper date bound.
+            include_min (bool): Whether matches on min_date are included.
+            include_max (bool): Whether matches on max_date are included.
+
+        Returns:
+            float: The mean, or NaN if there are no matches with averages in
+            the range.
+
+        Raises:
+            KeyError: If the group given does not exist.
+        """
+
+        days, _, sums, counts = self.groups[key]
+
+        start, end = 0, len(days)
+
+        if min_date is not None:
+            start = np.searchsorted(days, to_day_number(min_date),
+                                    side='left' if include_min else 'right')
+
+        if max_date is not None:
+            end = np.searchsorted(days, to_day_number(max_date),
+                                  side='right' if include_max else 'left')
+
+        n_matches = counts[end] - counts[start] if end > start else 0
+
+        instrumentation.add_rows(n_matches)
+
+        if n_matches == 0:
+            return np.nan
+
+        return (sums[end] - sums[start]) / n_matches
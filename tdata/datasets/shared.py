@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+
+from tdata.datasets.snapshot import save_snapshot, load_snapshot
+
+
+def shared_memory_dir():
+    """Returns /dev/shm, a file system kept in memory, where it exists and
+    the temporary directory otherwise."""
+
+    return '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+
+def publish_dataset(dataset, path=None):
+    """Publishes a dataset for worker processes to attach to.
+
+    The dataset is saved as a snapshot (see save_snapshot), so that workers
+    which attach to it memory-map the same files: the operating system
+    keeps a single copy of the arrays in memory however many workers there
+    are. Typical use:
+
+        path = publish_dataset(MatchStatDataset())
+
+        with multiprocessing.Pool(8) as pool:
+            pool.map(backtest, [(path, year) for year in years])
+
+        unpublish_dataset(path)
+
+    where backtest calls attach_dataset(path) to get the dataset.
+
+    Args:
+        dataset (Dataset): The dataset to publish.
+        path (Optional[str]): The directory to publish to. Defaults to a new
+            directory in shared_memory_dir().
+
+    Returns:
+        str: The directory to pass to attach_dataset.
+    """
+
+    if path is None:
+        path = tempfile.mkdtemp(prefix='tdata-', dir=shared_memory_dir())
+
+    # Build these once here, rather than in every worker.
+    dataset.get_player_codes()
+    dataset.get_chronological_ranks()
+
+    return save_snapshot(dataset, path)
+
+
+def attach_dataset(path):
+    """Attaches to a dataset published with publish_dataset.
+
+    The columns and indexes are memory-mapped rather than copied. String
+    columns are Categoricals over the shared codes, so only their distinct
+    values are held by each process. The dataset has the usual query API but
+    is read-only: its arrays cannot be written and append raises a
+    ValueError.
+
+    Args:
+        path (str): The directory returned by publish_dataset.
+
+    Returns:
+        Dataset: The published dataset.
+    """
+
+    dataset = load_snapshot(path, mmap=True, strings_as_categories=True)
+    dataset.read_only = True
+
+    return dataset
+
+
+def unpublish_dataset(path):
+    """Deletes a published dataset. Workers should have finished with it."""
+
+    shutil.rmtree(path)
@@ -0,0 +1,407 @@
+import os
+import json
+import pickle
+import shutil
+import hashlib
+import inspect
+import importlib
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from tdata.datasets.column_arrays import ColumnArrays
+from tdata.datasets.player_index import PlayerIndex, DateIndex, \
+    HeadToHeadIndex
+
+
+# Increase this whenever the layout of snapshots changes; snapshots of other
+# versions are then rebuilt.
+SNAPSHOT_VERSION = 2
+
+# Attributes saved as arrays (or rebuilt from the frame) rather than pickled.
+ARRAY_ATTRIBUTES = ['column_arrays', 'player_index', 'date_index',
+                    'head_to_head_index']
+
+# Caches which are rebuilt lazily. Of these, the player codes and
+# chronological ranks are saved as arrays if they have been built.
+LAZY_ATTRIBUTES = ['column_indexes', 'player_codes', 'chronological_ranks',
+                   'match_dates', 'match_stats', 'caches']
+
+# Constructor arguments which change how a dataset is loaded but not what is
+# loaded, so they are left out of the snapshot key.
+LOADING_ARGUMENTS = ['workers', 'executor']
+
+
+def default_snapshot_dir():
+    """Returns the default snapshot directory, data/snapshots."""
+
+    return os.path.join(str(Path(__file__).parents[2]), 'data', 'snapshots')
+
+
+def bind_arguments(dataset_class, arguments):
+    """Returns the constructor arguments given with the defaults of those
+    not given filled in.
+
+    Raises:
+        TypeError: If the constructor does not take the arguments given.
+    """
+
+    bound = inspect.signature(dataset_class.__init__).bind(None, **arguments)
+    bound.apply_defaults()
+
+    return {name: value for name, value in list(bound.arguments.items())[1:]}
+
+
+def snapshot_key(dataset_class, arguments, source_files):
+    """Hashes a dataset class, its constructor arguments, the version of its
+    source files' format and their contents into the key of its snapshot.
+
+    Args:
+        dataset_class (type): The Dataset subclass.
+        arguments (dict): The constructor arguments, with defaults filled in.
+        source_files (Sequence[str]): The files the dataset is loaded from.
+
+    Returns:
+        str: The hex digest.
+    """
+
+    digest = hashlib.sha256()
+
+    header = {'version': SNAPSHOT_VERSION,
+              'class': dataset_class.__name__,
+              'source_version': dataset_class.source_version(arguments),
+              'arguments': {name: repr(value) for name, value in
+                            sorted(arguments.items())
+                            if name not in LOADING_ARGUMENTS}}
+
+    digest.update(json.dumps(header, sort_keys=True).encode('utf-8'))
+
+    for path in sorted(source_files):
+
+        digest.update(os.path.basename(path).encode('utf-8'))
+
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(2 ** 20), b''):
+                digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def snapshot_path(dataset_class, key, snapshot_dir=None):
+    """Returns the directory holding the snapshot with the key given."""
+
+    if snapshot_dir is None:
+        snapshot_dir = default_snapshot_dir()
+
+    return os.path.join(snapshot_dir,
+                        '{}-{}'.format(dataset_class.__name__, key[:16]))
+
+
+def read_manifest(path):
+    """Reads a snapshot's manifest, returning None if there is no readable
+    manifest."""
+
+    try:
+        with open(os.path.join(path, 'manifest.json')) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def codes_dtype(n_values):
+    """Returns the dtype pandas uses for the codes of a Categorical with
+    n_values categories, so that saved codes can be used without a copy."""
+
+    for dtype in [np.int8, np.int16, np.int32]:
+        if n_values < np.iinfo(dtype).max:
+            return dtype
+
+    return np.int64
+
+
+def save_column(column, path, file_name):
+    """Saves a column of the stats DataFrame, returning its manifest entry
+    and the lookup (categories or distinct values) to pickle with it."""
+
+    spec = {'name': column.name, 'file': file_name + '.npy',
+            'dtype': str(column.dtype)}
+
+    if pd.api.types.is_categorical_dtype(column.dtype):
+
+        spec['kind'] = 'categorical'
+        spec['ordered'] = bool(column.cat.ordered)
+        values, lookup = column.cat.codes.values, column.cat.categories
+
+    elif column.dtype == object:
+
+        # Strings are stored dictionary-encoded, as codes into their distinct
+        # values.
+        spec['kind'] = 'object'
+        codes, lookup = pd.factorize(column.values)
+        values = codes.astype(codes_dtype(len(lookup)))
+
+    elif isinstance(column.dtype, np.dtype):
+
+        spec['kind'] = 'array'
+        values, lookup = column.values, None
+
+    else:
+
+        spec['kind'] = 'pickled'
+        spec['file'] = None
+        values, lookup = None, column
+
+    if values is not None:
+        np.save(os.path.join(path, spec['file']), values)
+
+    return spec, lookup
+
+
+def load_column(spec, lookup, path, mmap_mode, strings_as_categories=False):
+    """Restores a column saved with save_column. With
+    strings_as_categories, object columns become Categoricals over their
+    saved codes rather than being decoded."""
+
+    if spec['kind'] == 'pickled':
+        return lookup
+
+    values = np.load(os.path.join(path, spec['file']), mmap_mode=mmap_mode)
+
+    if spec['kind'] == 'array':
+        return values
+
+    if spec['kind'] == 'categorical':
+        return pd.Categorical.from_codes(values, categories=lookup,
+                                         ordered=spec['ordered'])
+
+    if strings_as_categories:
+        return pd.Categorical.from_codes(values, categories=lookup)
+
+    # Missing values have code -1, i.e. the extra last entry.
+    return np.append(np.asarray(lookup, dtype=object), np.nan)[values]
+
+
+def save_snapshot(dataset, path, key=None, arguments=None):
+    """Saves a dataset's stats DataFrame, indexes and lookups.
+
+    Numeric, date and boolean columns and the player and date indexes are
+    saved as .npy files, which load_snapshot can memory-map. String columns
+    are saved as integer codes into their distinct values. Everything else
+    (start dates, serve average index, cached averages and the dataset's
+    options) is pickled.
+
+    The snapshot is written to a temporary directory first and then moved
+    into place, so that readers never see a partial snapshot.
+
+    Args:
+        dataset (Dataset): The dataset to save.
+        path (str): The snapshot directory. It is replaced if it exists.
+        key (Optional[str]): The key of the snapshot (see snapshot_key).
+        arguments (Optional[dict]): The constructor arguments, stored in the
+            manifest for reference.
+
+    Returns:
+        str: The snapshot directory.
+
+    Raises:
+        ValueError: If the stats DataFrame has duplicate column names.
+    """
+
+    df = dataset.get_stats_df()
+
+    if not df.columns.is_unique:
+        raise ValueError('Cannot snapshot a DataFrame with duplicate '
+                         'column names.')
+
+    temp_path = '{}.tmp-{}'.format(path, os.getpid())
+
+    if os.path.isdir(temp_path):
+        shutil.rmtree(temp_path)
+
+    os.makedirs(temp_path)
+
+    specs, lookups = list(), dict()
+
+    for number, column_name in enumerate(df.columns):
+
+        spec, lookup = save_column(df[column_name], temp_path,
+                                   'column_{}'.format(number))
+
+        specs.append(spec)
+        lookups[column_name] = lookup
+
+    np.save(os.path.join(temp_path, 'player_keys.npy'),
+            dataset.player_index.keys)
+    np.save(os.path.join(temp_path, 'player_positions.npy'),
+            dataset.player_index.positions)
+    np.save(os.path.join(temp_path, 'date_keys.npy'), dataset.date_index.keys)
+    np.save(os.path.join(temp_path, 'date_positions.npy'),
+            dataset.date_index.positions)
+    np.save(os.path.join(temp_path, 'pair_codes.npy'),
+            dataset.head_to_head_index.pair_codes)
+    np.save(os.path.join(temp_path, 'pair_keys.npy'),
+            dataset.head_to_head_index.keys)
+    np.save(os.path.join(temp_path, 'pair_positions.npy'),
+            dataset.head_to_head_index.positions)
+
+    if dataset.player_codes is not None:
+        np.save(os.path.join(temp_path, 'winner_codes.npy'),
+                dataset.player_codes[0])
+        np.save(os.path.join(temp_path, 'loser_codes.npy'),
+                dataset.player_codes[1])
+
+    if dataset.chronological_ranks is not None:
+        np.save(os.path.join(temp_path, 'chronological_ranks.npy'),
+                dataset.chronological_ranks)
+
+    skipped = set(ARRAY_ATTRIBUTES + LAZY_ATTRIBUTES)
+
+    attributes = {name: value for name, value in vars(dataset).items()
+                  if name not in skipped and value is not df}
+
+    state = {'attributes': attributes,
+             'lookups': lookups,
+             'player_names': list(dataset.player_index.player_names)}
+
+    with open(os.path.join(temp_path, 'state.pkl'), 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    dataset_class = type(dataset)
+
+    manifest = {
+        'version': SNAPSHOT_VERSION,
+        'module': dataset_class.__module__,
+        'class': dataset_class.__name__,
+        'key': key,
+        'arguments': {name: repr(value) for name, value in
+                      (arguments or dict()).items()},
+        'n_rows': int(df.shape[0]),
+        'index': list(dataset.df_index),
+        'columns': specs}
+
+    with open(os.path.join(temp_path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+
+    os.rename(temp_path, path)
+
+    return path
+
+
+def load_snapshot(path, mmap=True, strings_as_categories=False):
+    """Restores a dataset saved with save_snapshot, without reading its
+    source files or rebuilding its indexes.
+
+    Args:
+        path (str): The snapshot directory.
+        mmap (bool): Whether to memory-map the saved arrays instead of
+            reading them into memory. Memory-mapped arrays are read-only.
+        strings_as_categories (bool): Whether to restore string columns as
+            Categoricals over their saved codes, which are memory-mapped
+            too, rather than as object arrays.
+
+    Returns:
+        Dataset: The restored dataset.
+
+    Raises:
+        ValueError: If the directory holds no snapshot, or one written by a
+            different version.
+    """
+
+    manifest = read_manifest(path)
+
+    if manifest is None:
+        raise ValueError('No snapshot found in {}.'.format(path))
+
+    if manifest['version'] != SNAPSHOT_VERSION:
+        raise ValueError('Snapshot {} has version {}, expected {}.'.format(
+            path, manifest['version'], SNAPSHOT_VERSION))
+
+    mmap_mode = 'r' if mmap else None
+
+    with open(os.path.join(path, 'state.pkl'), 'rb') as f:
+        state = pickle.load(f)
+
+    columns = {spec['name']: load_column(
+        spec, state['lookups'][spec['name']], path, mmap_mode,
+        strings_as_categories=strings_as_categories)
+        for spec in manifest['columns']}
+
+    # Neither step copies the columns, so memory-mapped ones stay mapped.
+    df = pd.DataFrame(columns, copy=False)
+    df.set_index(manifest['index'], drop=False, inplace=True)
+
+    def load_array(name):
+
+        file_path = os.path.join(path, name + '.npy')
+
+        if not os.path.isfile(file_path):
+            return None
+
+        return np.load(file_path, mmap_mode=mmap_mode)
+
+    dataset_class = getattr(importlib.import_module(manifest['module']),
+                            manifest['class'])
+
+    dataset = dataset_class.__new__(dataset_class)
+    vars(dataset).update(state['attributes'])
+
+    dataset.set_stats_df(df)
+    dataset.column_arrays = ColumnArrays(df)
+    dataset.player_index = PlayerIndex.from_arrays(
+        state['player_names'], load_array('player_keys'),
+        load_array('player_positions'))
+    dataset.date_index = DateIndex.from_arrays(load_array('date_keys'),
+                                               load_array('date_positions'))
+    dataset.head_to_head_index = HeadToHeadIndex.from_arrays(
+        load_array('pair_codes'), load_array('pair_keys'),
+        load_array('pair_positions'))
+
+    dataset.column_indexes = dict()
+    dataset.match_dates = None
+    dataset.match_stats = None
+    dataset.make_caches()
+    dataset.chronological_ranks = load_array('chronological_ranks')
+
+    winner_codes = load_array('winner_codes')
+    dataset.player_codes = (None if winner_codes is None else
+                            (winner_codes, load_array('loser_codes')))
+
+    return dataset
+
+
+def load_or_build(dataset_class, arguments, snapshot_dir=None, mmap=True):
+    """Restores a dataset from its snapshot if one matches its class,
+    constructor arguments and source files; otherwise constructs it and
+    saves a snapshot for next time. See Dataset.load_cached.
+
+    Raises:
+        ValueError: If the arguments ask for a streaming dataset, which has
+            nothing to snapshot.
+    """
+
+    arguments = bind_arguments(dataset_class, arguments)
+
+    if arguments.get('streaming', False):
+        raise ValueError('Streaming datasets cannot be snapshotted.')
+
+    key = snapshot_key(dataset_class, arguments,
+                       dataset_class.source_files(arguments))
+    path = snapshot_path(dataset_class, key, snapshot_dir=snapshot_dir)
+
+    manifest = read_manifest(path)
+
+    if (manifest is not None and manifest['version'] == SNAPSHOT_VERSION and
+            manifest['key'] == key):
+        return load_snapshot(path, mmap=mmap)
+
+    dataset = dataset_class(**arguments)
+
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+
+    save_snapshot(dataset, path, key=key, arguments=arguments)
+
+    return dataset
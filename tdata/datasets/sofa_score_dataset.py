@@ -3,60 +3,94 @@ import numpy as np
 import pandas as pd
 from glob import glob
 from pathlib import Path
+from functools import partial
 
 from tdata.datasets.dataset import Dataset
+from tdata.datasets.compact import compact_frame
+from tdata.datasets.parallel import read_files
 from tdata.enums.t_type import Tours
 from tdata.enums.round import Rounds
 from tdata.utils.utils import base_name_from_path
 from tdata.datasets.match_stats import MatchStats
 
 
+def find_year_csvs(t_type=Tours.atp, min_year=None):
+    """Returns the SofaScore year csvs of the tour given, from min_year on
+    if given, in order of year."""
+
+    exec_dir = Path(os.path.abspath(__file__)).parents[2]
+
+    csv_dir = os.path.join(str(exec_dir), 'data', 'sofa_csv', t_type.name)
+    csvs = glob(os.path.join(csv_dir, '*.csv'))
+    year_lookup = {int(base_name_from_path(x)): x for x in csvs}
+
+    if min_year is not None:
+        keys_to_keep = [x for x in year_lookup.keys() if x >= min_year]
+    else:
+        keys_to_keep = year_lookup.keys()
+
+    return [year_lookup[x] for x in sorted(keys_to_keep)]
+
+
 class SofaScoreDataset(Dataset):
 
-    def __init__(self, t_type=Tours.atp, min_year=None):
+    optional_stat_columns = {
+        'winners': ('winners_winner', 'winners_loser'),
+        'ues': ('ues_winner', 'ues_loser'),
+        'odds': ('odds_winner', 'odds_loser')}
 
-        exec_dir = Path(os.path.abspath(__file__)).parents[2]
+    def __init__(self, t_type=Tours.atp, min_year=None, compact=False,
+                 workers=None, executor='thread'):
 
         self.t_type = t_type
         self.min_year = min_year
 
-        csv_dir = os.path.join(str(exec_dir), 'data', 'sofa_csv', t_type.name)
-        csvs = glob(os.path.join(csv_dir, '*.csv'))
-        year_lookup = {int(base_name_from_path(x)): x for x in csvs}
+        with self.timed('read') as timer:
+            # The year csvs are read concurrently (see parallel.read_files).
+            loaded = read_files(partial(pd.read_csv, index_col=0),
+                                find_year_csvs(t_type, min_year),
+                                workers=workers, executor=executor)
+            combined = pd.concat(loaded, axis=0, ignore_index=True)
+            timer.rows += combined.shape[0]
 
-        if min_year is not None:
-            keys_to_keep = [x for x in year_lookup.keys() if x >= min_year]
-        else:
-            keys_to_keep = year_lookup.keys()
+        with self.timed('filter') as timer:
+            combined['date'] = pd.to_datetime(combined['date'])
 
-        loaded = [pd.read_csv(year_lookup[x], index_col=0) for x in
-                  sorted(keys_to_keep)]
-        combined = pd.concat(loaded, axis=0, ignore_index=True)
-        combined['date'] = pd.to_datetime(combined['date'])
+            # For now, drop qualifying
+            combined = combined[~(combined['round'] == 'qualifying')]
 
-        # For now, drop qualifying
-        combined = combined[~(combined['round'] == 'qualifying')]
+            # Also drop retirements
+            combined = combined[~combined['was_retirement']]
 
-        # Also drop retirements
-        combined = combined[~combined['was_retirement']]
+            # Rename date to start_date
+            self.df = combined.rename(columns={'date': 'start_date'})
 
-        # Rename date to start_date
-        self.df = combined.rename(columns={'date': 'start_date'})
+            self.df = self.fix_world_tour_finals(self.df)
 
-        self.df = self.fix_world_tour_finals(self.df)
+            self.df = self.df.dropna(subset=['round'])
 
-        self.df = self.df.dropna(subset=['round'])
+            # TODO: Is this slow? Could do something more efficient.
+            self.df['round_number'] = [Rounds[x].value for x in
+                                       self.df['round'].values]
 
-        # TODO: Is this slow? Could do something more efficient.
-        self.df['round_number'] = [Rounds[x].value for x in
-                                   self.df['round'].values]
+            self.check_unique(self.df)
 
-        self.check_unique(self.df)
+            self.df['year'] = self.df['start_date'].dt.year
+            timer.rows += self.df.shape[0]
 
-        super(SofaScoreDataset, self).__init__(start_date_is_exact=True)
+        if compact:
+            with self.timed('compact'):
+                self.df, self.compact_report = compact_frame(self.df)
 
         self.df = self.df.set_index(self.df_index, drop=False)
 
+        super(SofaScoreDataset, self).__init__(start_date_is_exact=True)
+
+    @classmethod
+    def source_files(cls, arguments):
+
+        return find_year_csvs(arguments['t_type'], arguments['min_year'])
+
     def fix_world_tour_finals(self, df):
 
         # WARNING: This is a bit of a band-aid and may fail.
@@ -100,6 +134,23 @@ class SofaScoreDataset(Dataset):
 
         return self.df
 
+    def set_stats_df(self, df):
+
+        self.df = df
+
+    def calculate_point_counts(self, df):
+
+        results = dict()
+
+        for role in ['winner', 'loser']:
+            for kind in ['serve', 'return']:
+                for measure in ['won', 'played']:
+
+                    results['{}_{}_points_{}'.format(role, kind, measure)] = (
+                        df['{}_points_{}_{}'.format(kind, measure, role)])
+
+        return pd.DataFrame(results, index=df.index)
+
     def calculate_stats(self, winner, loser, row):
 
         stats = dict()
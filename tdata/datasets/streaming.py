@@ -0,0 +1,117 @@
+import os
+import pandas as pd
+
+from collections import OrderedDict
+
+
+def year_from_path(path):
+    """Finds the year of a file named like atp_matches_2015.csv, i.e. ending
+    in the year."""
+
+    return int(os.path.splitext(os.path.basename(path))[0][-4:])
+
+
+def year_partitions(paths, find_year=year_from_path):
+    """Groups file paths by year.
+
+    Args:
+        paths (Iterable[str]): The files to group.
+        find_year (Callable[[str], int]): Finds the year of a file.
+
+    Returns:
+        OrderedDict: Maps each year to the sorted list of its files, in
+        increasing order of year.
+    """
+
+    partitions = dict()
+
+    for path in paths:
+        partitions.setdefault(find_year(path), list()).append(path)
+
+    return OrderedDict((year, sorted(partitions[year]))
+                       for year in sorted(partitions))
+
+
+def split_into_batches(df, batch_size=None):
+    """Splits the DataFrame given into consecutive pieces of at most
+    batch_size rows. If batch_size is None, yields the whole DataFrame."""
+
+    if batch_size is None:
+        yield df
+        return
+
+    for start in range(0, df.shape[0], batch_size):
+        yield df.iloc[start:start + batch_size]
+
+
+def iter_chronological(frames, date_column='start_date',
+                       sort_columns=('start_date', 'round_number'),
+                       batch_size=None):
+    """Merges DataFrames which are each roughly one period (e.g. one year
+    file) into a single chronological stream, holding at most two of them in
+    memory.
+
+    Files often hold some matches from before their period, such as a
+    tournament starting in late December, so rows are only released once the
+    next frame has been read and shown not to contain earlier dates.
+
+    Args:
+        frames (Iterable[pd.DataFrame]): The frames, in increasing order of
+            period.
+        date_column (str): The column holding the dates.
+        sort_columns (Sequence[str]): The columns to sort released rows by.
+        batch_size (Optional[int]): If given, the largest number of rows
+            yielded at once.
+
+    Returns:
+        Iterator[pd.DataFrame]: The rows of all frames, sorted by
+        sort_columns. The index counts the rows streamed so far.
+
+    Raises:
+        ValueError: If a frame holds dates before rows already released.
+    """
+
+    pending = None
+    released_until = None
+    n_released = 0
+
+    def release(df):
+
+        df = df.sort_values(list(sort_columns), kind='mergesort')
+        df.index = pd.RangeIndex(n_released, n_released + df.shape[0])
+
+        return df
+
+    for frame in frames:
+
+        if frame.shape[0] == 0:
+            continue
+
+        earliest = frame[date_column].min()
+
+        if released_until is not None and earliest < released_until:
+            raise ValueError(
+                'Found matches on {} after matches up to {} were already '
+                'streamed.'.format(earliest, released_until))
+
+        pending = (frame if pending is None else
+                   pd.concat([pending, frame], ignore_index=True))
+
+        # Nothing read later can be earlier than this frame's first date.
+        is_ready = (pending[date_column] < earliest).values
+
+        if is_ready.any():
+
+            ready = release(pending[is_ready])
+            pending = pending[~is_ready]
+
+            released_until = ready[date_column].max()
+            n_released += ready.shape[0]
+
+            for batch in split_into_batches(ready, batch_size):
+                yield batch
+
+    if pending is not None and pending.shape[0] > 0:
+
+        for batch in split_into_batches(release(pending), batch_size):
+            yield batch
@@ -3,42 +3,57 @@ from glob import glob
 from toolz import pipe, partial
 import pandas as pd
 from os.path import join, splitext
+from tdata.datasets.streaming import iter_chronological
+from tdata.datasets.parallel import read_files
 
 
-def get_data(sackmann_dir, tour="atp", keep_davis_cup=False, discard_retirements=True):
+def find_match_csvs(sackmann_dir, tour="atp"):
 
     all_csvs = glob(join(sackmann_dir, f"*{tour}_matches_????.csv"))
     all_csvs = sorted(all_csvs, key=lambda x: int(splitext(x)[0][-4:]))
 
+    return all_csvs
+
+
+def filter_matches(data, keep_davis_cup=False, discard_retirements=True):
+
     levels_to_drop = ["C", "S"]
 
     if not keep_davis_cup:
         levels_to_drop.append("D")
 
-    data = pipe(
-        all_csvs,
-        # Read CSV
-        lambda y: map(partial(pd.read_csv, encoding="ISO=8859-1"), y),
-        # Drop NAs in important fields
-        lambda y: map(
-            lambda x: x.dropna(subset=["winner_name", "loser_name", "score"]), y
-        ),
-        # Drop retirements and walkovers
-        # TODO: Make this optional
-        lambda y: map(
-            lambda x: x
-            if not discard_retirements
-            else x[~x["score"].astype(str).str.contains("RET|W/O|DEF|nbsp|Def.")],
-            y,
-        ),
-        # Drop scores that appear truncated
-        lambda y: map(lambda x: x[x["score"].astype(str).str.len() > 4], y),
-        # Drop challengers and futures
-        # TODO: Make this optional too
-        lambda y: map(lambda x: x[~x["tourney_level"].isin(levels_to_drop)], y),
-        pd.concat,
+    # Drop NAs in important fields
+    data = data.dropna(subset=["winner_name", "loser_name", "score"])
+
+    # Drop retirements and walkovers
+    # TODO: Make this optional
+    if discard_retirements:
+        data = data[
+            ~data["score"].astype(str).str.contains("RET|W/O|DEF|nbsp|Def.")
+        ]
+
+    # Drop scores that appear truncated
+    data = data[data["score"].astype(str).str.len() > 4]
+
+    # Drop challengers and futures
+    # TODO: Make this optional too
+    data = data[~data["tourney_level"].isin(levels_to_drop)]
+
+    return data
+
+
+def read_filtered_csv(csv_path, keep_davis_cup=False, discard_retirements=True):
+    """Reads a year csv and drops the matches filter_matches drops."""
+
+    return filter_matches(
+        pd.read_csv(csv_path, encoding="ISO=8859-1"),
+        keep_davis_cup=keep_davis_cup,
+        discard_retirements=discard_retirements,
     )
 
+
+def add_derived_columns(data):
+
     round_numbers = {
         "R128": 1,
         "RR": 1,
@@ -63,10 +78,6 @@ def get_data(sackmann_dir, tour="atp", keep_davis_cup=False, discard_retirements
     )
     data["year"] = data["tourney_date"].dt.year
 
-    # Sort by date and round and reset index
-    data = data.sort_values(["tourney_date", "round_number"])
-    data = data.reset_index(drop=True)
-
     data["pts_won_serve_winner"] = data["w_1stWon"] + data["w_2ndWon"]
     data["pts_won_serve_loser"] = data["l_1stWon"] + data["l_2ndWon"]
 
@@ -82,6 +93,79 @@ def get_data(sackmann_dir, tour="atp", keep_davis_cup=False, discard_retirements
     return data
 
 
+def get_data(
+    sackmann_dir,
+    tour="atp",
+    keep_davis_cup=False,
+    discard_retirements=True,
+    workers=None,
+    executor="thread",
+):
+    """Reads and filters the year csvs of a tour.
+
+    The csvs are read and filtered concurrently by a pool of workers (see
+    tdata.datasets.parallel.read_files), and concatenated in order of year.
+    """
+
+    data = pipe(
+        find_match_csvs(sackmann_dir, tour),
+        lambda y: read_files(
+            partial(
+                read_filtered_csv,
+                keep_davis_cup=keep_davis_cup,
+                discard_retirements=discard_retirements,
+            ),
+            y,
+            workers=workers,
+            executor=executor,
+        ),
+        pd.concat,
+    )
+
+    data = add_derived_columns(data)
+
+    # Sort by date and round and reset index
+    data = data.sort_values(["tourney_date", "round_number"])
+    data = data.reset_index(drop=True)
+
+    return data
+
+
+def stream_data(
+    sackmann_dir,
+    tour="atp",
+    keep_davis_cup=False,
+    discard_retirements=True,
+    batch_size=None,
+):
+    """Reads the same matches as get_data, one year file at a time.
+
+    Yields DataFrames in chronological order, holding at most two years in
+    memory. The index counts the matches yielded so far, as in get_data. If
+    batch_size is given, no DataFrame has more rows than this.
+    """
+
+    frames = pipe(
+        find_match_csvs(sackmann_dir, tour),
+        lambda y: map(
+            partial(
+                read_filtered_csv,
+                keep_davis_cup=keep_davis_cup,
+                discard_retirements=discard_retirements,
+            ),
+            y,
+        ),
+        lambda y: map(add_derived_columns, y),
+    )
+
+    return iter_chronological(
+        frames,
+        date_column="tourney_date",
+        sort_columns=["tourney_date", "round_number"],
+        batch_size=batch_size,
+    )
+
+
 def compute_game_margins(string_scores):
     def compute_margin(sample_set):
 
@@ -182,7 +182,7 @@ class SackmannImporter(object):
 
         for set_num, set_data in enumerate(sack_score.sets):
 
-            sack_set = set_data['score']
+            sack_set = set_data.score
             match_winner_games = sack_set[0]
             match_loser_games = sack_set[1]
 
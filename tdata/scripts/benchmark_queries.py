@@ -0,0 +1,51 @@
+"""Benchmarks the Dataset query methods on a deterministic fixture and saves
+the latencies as JSON. Pass --baseline with the results of an earlier run to
+list the scenarios which got slower."""
+
+import argparse
+
+from tdata.benchmarks.fixture import DATASET_FIXTURES
+from tdata.benchmarks.query_benchmark import run_suite, save_results, \
+    load_results, compare_results
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--output', default='query_benchmark.json')
+    parser.add_argument('--label', default=None)
+    parser.add_argument('--datasets', nargs='*', default=None,
+                        choices=list(DATASET_FIXTURES))
+    parser.add_argument('--queries-per-scenario', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--eager', action='store_true',
+                        help='Fetch CompletedMatches rather than views.')
+    parser.add_argument('--warm-caches', action='store_true',
+                        help='Keep the dataset caches between queries.')
+    parser.add_argument('--baseline', default=None)
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = run_suite(dataset_names=args.datasets,
+                        queries_per_scenario=args.queries_per_scenario,
+                        seed=args.seed, lazy=not args.eager,
+                        warm_caches=args.warm_caches, label=args.label)
+
+    save_results(results, args.output)
+
+    for dataset_name, dataset_results in results['datasets'].items():
+
+        overall = dataset_results['overall']
+
+        print('{}: p50 {:.3f} ms, p99 {:.3f} ms, {:.0f} queries/s'.format(
+            dataset_name, overall['p50_ms'], overall['p99_ms'],
+            overall['throughput_per_s']))
+
+    if args.baseline is not None:
+
+        regressions = compare_results(load_results(args.baseline), results,
+                                      tolerance=args.tolerance)
+
+        for dataset_name, scenario, old, new in regressions:
+            print('Slower: {} {}: {:.3f} ms -> {:.3f} ms'.format(
+                dataset_name, scenario, old, new))
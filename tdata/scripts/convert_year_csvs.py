@@ -0,0 +1,12 @@
+"""Converts the MatchStat year csvs into Feather files, which MatchStatDataset
+reads instead of the csvs when they are up to date. Run again after updating
+the csvs."""
+
+from tdata.datasets.match_stat_dataset import convert_year_csvs
+
+
+if __name__ == '__main__':
+
+    written = convert_year_csvs()
+
+    print('Wrote {} Feather files.'.format(len(written)))
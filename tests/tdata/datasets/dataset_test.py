@@ -1,6 +1,34 @@
-from datetime import date
+import os
+import time
+import shutil
+import pytest
+import numpy as np
+import pandas as pd
+from datetime import date, timedelta
+from tdata.datasets.dataset import Dataset
 from tdata.datasets.sackmann_dataset import SackmannDataset
-from tdata.datasets.match_stat_dataset import MatchStatDataset
+from tdata.datasets.match_stat_dataset import (
+    MatchStatDataset, find_year_csvs, read_year_csv, read_year_file,
+    convert_year_csvs, current_feather_schema, feather_path_for_csv,
+    FEATHER_VERSION)
+from tdata.datasets.rolling_stats import RollingStatsEngine
+from tdata.datasets.serve_averages import ServeAverageIndex
+from tdata.datasets.ratings import EloEngine, INITIAL_RATING
+from tdata.datasets.shared import publish_dataset, attach_dataset
+from tdata.datasets.snapshot import bind_arguments, snapshot_key
+from tdata.datasets import instrumentation
+from tdata.datasets.cache import LRUCache
+from tdata.datasets.column_arrays import ColumnArrays
+from tdata.datasets.parallel import read_files
+from tdata.datasets.linkage import (link_records, dataset_records,
+                                    save_links, load_links, name_similarity)
+from tdata.benchmarks.fixture import make_matches, make_dataset
+from tdata.benchmarks.query_benchmark import (run_suite, run_benchmark,
+                                              make_query_mix, save_results,
+                                              load_results, compare_results)
+from tdata.datasets.score import Score
+from tdata.datasets.score_parser import (parse_scores, NO_TIEBREAK, PARSE_OK,
+                                         PARSE_BAD_SET, PARSE_MISSING)
 
 
 class TestSackmannDataset(object):
@@ -40,3 +68,1102 @@ class TestSackmannDataset(object):
                 print(match)
 
             assert(len(matches) == 6)
+
+
+@pytest.fixture(scope='module')
+def match_stat_dataset():
+
+    return MatchStatDataset(min_year=2014)
+
+
+class TestPlayerIndex(object):
+
+    def test_player_matches_in_range_and_sorted(self, match_stat_dataset):
+
+        matches = list(match_stat_dataset.get_player_matches(
+            'Roger Federer', min_date=date(2014, 1, 1),
+            max_date=date(2015, 1, 1)))
+
+        assert(len(matches) > 0)
+
+        keys = [(x.date, x.tournament_round) for x in matches]
+
+        assert(keys == sorted(keys))
+        assert(all('Roger Federer' in [x.winner, x.loser] for x in matches))
+        assert(all(date(2014, 1, 1) <= x.date.date() < date(2015, 1, 1)
+                   for x in matches))
+
+    def test_surface(self, match_stat_dataset):
+
+        matches = list(match_stat_dataset.get_player_matches(
+            'Roger Federer', surface='clay'))
+
+        assert(len(matches) > 0)
+        assert(all(x.surface == 'clay' for x in matches))
+
+    def test_unknown_player(self, match_stat_dataset):
+
+        matches = list(match_stat_dataset.get_player_matches('Nobody'))
+
+        assert(len(matches) == 0)
+
+
+class TestMatchView(object):
+
+    def test_lazy_matches_agree(self, match_stat_dataset):
+
+        kwargs = {'min_date': date(2015, 1, 1), 'max_date': date(2015, 3, 1)}
+
+        eager = list(match_stat_dataset.get_matches_between(**kwargs))
+        lazy = list(match_stat_dataset.get_matches_between(lazy=True,
+                                                           **kwargs))
+
+        assert(len(eager) == len(lazy))
+
+        for eager_match, lazy_match in zip(eager, lazy):
+
+            assert(eager_match.winner == lazy_match.winner)
+            assert(eager_match.date == lazy_match.date)
+            assert(str(eager_match.score) == str(lazy_match.score))
+            assert(eager_match.bo5 == lazy_match.bo5)
+            assert(
+                eager_match.stats[eager_match.winner].serve_points_won ==
+                lazy_match.stats[lazy_match.winner].serve_points_won)
+
+
+class TestPlayerHistories(object):
+
+    def test_batch_agrees_with_single_queries(self, match_stat_dataset):
+
+        queries = [('Roger Federer', date(2015, 1, 19), 2, None),
+                   ('Rafael Nadal', date(2016, 5, 1), None, 'clay'),
+                   ('Nobody', date(2016, 1, 1), None, None)]
+
+        names, max_dates, before_rounds, surfaces = zip(*queries)
+
+        histories = match_stat_dataset.get_player_histories(
+            names, max_dates=max_dates, before_rounds=before_rounds,
+            surfaces=surfaces)
+
+        assert(len(histories) == len(queries))
+
+        for i, (name, max_date, before_round, surface) in enumerate(queries):
+
+            expected = list(match_stat_dataset.get_player_matches(
+                name, max_date=max_date, before_round=before_round,
+                surface=surface))
+
+            found = list(match_stat_dataset.matches_at(histories[i]))
+
+            assert([str(x) for x in found] == [str(x) for x in expected])
+
+
+class TestRollingStats(object):
+
+    def test_matches_last_n_days(self, match_stat_dataset):
+
+        aggregates = RollingStatsEngine(
+            windows_days=(365,), windows_matches=(), half_lives_days=(),
+            by_surface=False).compute(match_stat_dataset)
+
+        df = match_stat_dataset.get_stats_df()
+
+        assert(aggregates.index.equals(df.index))
+
+        row_number = df.shape[0] - 1
+        row = df.iloc[row_number]
+
+        previous = list(match_stat_dataset.get_player_matches(
+            row['winner'], min_date=row['start_date'] - timedelta(days=364),
+            max_date=row['start_date'], before_round=row['round_number']))
+
+        assert(aggregates['winner_365d_matches'].iloc[row_number] ==
+               len(previous))
+
+
+class TestServeAverages(object):
+
+    def test_tournament_average_matches_slice(self, match_stat_dataset):
+
+        min_date, max_date = date(2014, 1, 1), date(2016, 1, 1)
+
+        df = match_stat_dataset.get_stats_df()
+
+        subset = df[(df['tournament_name'] == 'Wimbledon') &
+                    (df['start_date'] > str(min_date)) &
+                    (df['start_date'] < str(max_date))]
+
+        expected = ((subset['winner_serve_points_won_pct'] +
+                     subset['loser_serve_points_won_pct']) / 2).mean()
+
+        found = match_stat_dataset.get_tournament_serve_average(
+            'Wimbledon', min_date=min_date, max_date=max_date)
+
+        assert(found == pytest.approx(expected))
+
+    def test_extending_matches_a_rebuild(self):
+
+        rng = np.random.RandomState(0)
+
+        n_matches = 200
+        start_dates = pd.to_datetime('2010-01-01') + pd.to_timedelta(
+            np.sort(rng.randint(0, 300, size=n_matches)), unit='D')
+        averages = rng.uniform(0.5, 0.7, size=n_matches)
+        averages[rng.rand(n_matches) < 0.1] = np.nan
+        names = rng.choice(['A', 'B', 'C'], size=n_matches)
+        surfaces = rng.choice(['clay', 'grass'], size=n_matches)
+
+        rebuilt = ServeAverageIndex(start_dates, averages, names, surfaces)
+
+        # Mostly later matches, but some fall before earlier ones.
+        chunks = [np.arange(0, 120), np.arange(150, 200), np.arange(120, 150)]
+
+        extended = ServeAverageIndex(start_dates[chunks[0]],
+                                     averages[chunks[0]], names[chunks[0]],
+                                     surfaces[chunks[0]])
+
+        for chunk in chunks[1:]:
+            extended.extend(start_dates[chunk], averages[chunk], names[chunk],
+                            surfaces[chunk])
+
+        assert(set(extended.groups) == set(rebuilt.groups))
+
+        for key, arrays in rebuilt.groups.items():
+            for expected, found in zip(arrays, extended.groups[key]):
+                np.testing.assert_array_equal(found, expected)
+
+
+class TestMatchQuery(object):
+
+    def test_combined_filters(self, match_stat_dataset):
+
+        df = match_stat_dataset.get_stats_df()
+
+        players = {'Novak Djokovic', 'Rafael Nadal'}
+
+        expected = df[df['winner'].isin(players) & df['loser'].isin(players) &
+                      (df['surface'] == 'clay') & (df['round_number'] >= 5)]
+
+        positions = match_stat_dataset.query().player(
+            'Novak Djokovic').opponent('Rafael Nadal').surface(
+                'clay').rounds(min_round=5).positions()
+
+        found = df.iloc[positions]
+
+        assert(len(expected) > 0)
+        assert(set(found.index) == set(expected.index))
+        assert(found['start_date'].is_monotonic_increasing)
+
+    def test_surface_and_dates_agree_with_date_index(self):
+
+        dataset = MatchStatDataset(min_year=2016, drop_qual=False)
+        df = dataset.get_stats_df()
+
+        max_date = date(2017, 7, 3)
+
+        # Qualifying rounds are not numeric; they count as the earliest.
+        date_positions = dataset.date_index.lookup(max_date=max_date,
+                                                   before_round=0)
+        expected = date_positions[
+            (df['surface'].values[date_positions] == 'grass')]
+
+        on_max_date = df.iloc[expected]['start_date'] == str(max_date)
+
+        assert(on_max_date.any())
+        assert(pd.to_numeric(df.iloc[expected]['round_number'][on_max_date],
+                             errors='coerce').isnull().all())
+
+        # Grass matches are fewer than those in the period, so these are
+        # found from the surface index and filtered by date.
+        query = dataset.query().surface('grass').dates(max_date=max_date,
+                                                        before_round=0)
+
+        assert(query.candidates()[2] == {'surface'})
+        assert(list(query.positions()) == list(expected))
+
+
+class TestCompactMode(object):
+
+    def test_same_matches_less_memory(self, match_stat_dataset):
+
+        compact = MatchStatDataset(min_year=2014, compact=True)
+
+        report = compact.compact_report
+
+        assert(report.loc['surface', 'new_dtype'] == 'category')
+        assert(report['bytes_saved'].sum() > 0)
+
+        expected = match_stat_dataset.get_player_matches(
+            'Roger Federer', surface='grass')
+        found = compact.get_player_matches('Roger Federer', surface='grass')
+
+        assert([str(x) for x in found] == [str(x) for x in expected])
+
+
+class TestScoreParser(object):
+
+    def test_matches_score_objects(self, match_stat_dataset):
+
+        parsed = match_stat_dataset.get_parsed_scores()
+        scores = match_stat_dataset.get_stats_df()['score'].values
+
+        for position in range(0, len(scores), 97):
+
+            score = Score(scores[position], 'winner', 'loser')
+
+            assert(parsed.errors[position] == PARSE_OK)
+            assert(parsed.n_sets[position] == len(score.sets))
+            assert(parsed.bo5[position] == score.bo5)
+
+            for set_number, cur_set in enumerate(score.sets):
+                assert((parsed.winner_games[position, set_number],
+                        parsed.loser_games[position, set_number]) ==
+                       cur_set.score)
+
+    def test_retirements_and_tiebreaks(self):
+
+        parsed = parse_scores(['7-6(5) 6-3 RET', 'w/o', '6-4 Ret.',
+                               '6-4 2-1 Retired', 'WO', '6-4 6-x', None])
+
+        assert(list(parsed.retired) == [True, True, True, True, True, False,
+                                        False])
+        assert(list(parsed.tiebreaks[0, :2]) == [5, NO_TIEBREAK])
+        assert(list(parsed.n_sets[:5]) == [2, 0, 1, 2, 0])
+        assert(list(parsed.errors) == [PARSE_OK] * 5 + [PARSE_BAD_SET,
+                                                        PARSE_MISSING])
+
+
+class TestStreaming(object):
+
+    def test_same_matches_in_date_order(self):
+
+        loaded = MatchStatDataset(min_year=2015)
+        streamed = MatchStatDataset(min_year=2015, streaming=True)
+
+        batches = list(streamed.iter_batches(batch_size=1000))
+        combined = pd.concat(batches)
+
+        assert(max(x.shape[0] for x in batches) <= 1000)
+        assert(combined['start_date'].is_monotonic_increasing)
+
+        key = ['winner', 'loser', 'round', 'tournament_name', 'start_date']
+
+        assert(sorted(map(tuple, combined[key].values)) ==
+               sorted(map(tuple, loaded.get_stats_df()[key].values)))
+
+
+class TestAppend(object):
+
+    def test_append_matches_full_load(self, match_stat_dataset):
+
+        df = match_stat_dataset.get_stats_df()
+        cutoff = pd.Timestamp('2016-06-01')
+
+        dataset = MatchStatDataset(min_year=2014)
+        dataset.set_stats_df(df[df['start_date'] < cutoff].copy())
+        Dataset.__init__(dataset, start_date_is_exact=False)
+
+        averages_before = dataset.calculate_tour_average(2016)
+
+        dataset.append(df[df['start_date'] >= cutoff])
+
+        assert(dataset.calculate_tour_average(2016) != averages_before)
+        assert(dataset.calculate_tour_average(2016) ==
+               pytest.approx(match_stat_dataset.calculate_tour_average(2016)))
+
+        for name in ['Roger Federer', 'Andy Murray']:
+
+            expected = match_stat_dataset.get_player_matches(
+                name, min_date=date(2016, 1, 1), surface='grass')
+            found = dataset.get_player_matches(
+                name, min_date=date(2016, 1, 1), surface='grass')
+
+            assert([str(x) for x in found] == [str(x) for x in expected])
+
+    def test_rejects_other_columns(self, match_stat_dataset):
+
+        new_rows = match_stat_dataset.get_stats_df().iloc[:2].drop(
+            columns=['score'])
+
+        with pytest.raises(ValueError):
+            match_stat_dataset.append(new_rows)
+
+    def test_rejected_append_leaves_dataset_unchanged(self):
+
+        dataset = MatchStatDataset(min_year=2017, compact=True)
+        dtypes_before = dataset.get_stats_df().dtypes.copy()
+        n_matches = dataset.get_stats_df().shape[0]
+
+        new_rows = dataset.get_stats_df().iloc[:1].astype(object)
+        new_rows['winner'] = 'Nobody Yet'
+        new_rows['winner_aces'] = 'lots'
+
+        with pytest.raises(ValueError):
+            dataset.append(new_rows)
+
+        assert(dataset.get_stats_df().dtypes.equals(dtypes_before))
+        assert('Nobody Yet' not in
+               dataset.get_stats_df()['winner'].cat.categories)
+
+        new_rows['winner_aces'] = 3
+        dataset.append(new_rows)
+
+        assert(dataset.get_stats_df().shape[0] == n_matches + 1)
+        assert(len(list(dataset.get_player_matches('Nobody Yet'))) == 1)
+
+
+class TestSnapshot(object):
+
+    def test_restores_saved_dataset(self, tmp_path):
+
+        built = MatchStatDataset.load_cached(snapshot_dir=str(tmp_path),
+                                             min_year=2016)
+        restored = MatchStatDataset.load_cached(snapshot_dir=str(tmp_path),
+                                                min_year=2016)
+
+        assert(len(list(tmp_path.iterdir())) == 1)
+
+        pd.testing.assert_frame_equal(built.get_stats_df(),
+                                      restored.get_stats_df())
+
+        assert(restored.calculate_tour_average(2016) ==
+               built.calculate_tour_average(2016))
+
+        for name in ['Roger Federer', 'Andy Murray']:
+
+            expected = built.get_player_matches(name, surface='grass')
+            found = restored.get_player_matches(name, surface='grass')
+
+            assert([str(x) for x in found] == [str(x) for x in expected])
+
+    def test_other_arguments_get_own_snapshot(self, tmp_path):
+
+        MatchStatDataset.load_cached(snapshot_dir=str(tmp_path),
+                                     min_year=2016)
+        MatchStatDataset.load_cached(snapshot_dir=str(tmp_path),
+                                     min_year=2016, drop_qual=False)
+
+        assert(len(list(tmp_path.iterdir())) == 2)
+
+    def test_key_follows_the_files_read(self, monkeypatch):
+
+        csvs = find_year_csvs(min_year=2016)
+
+        if any(current_feather_schema(x) is None for x in csvs):
+            pytest.skip('The year csvs have not been converted to Feather.')
+
+        arguments = bind_arguments(MatchStatDataset, {'min_year': 2016})
+        source_files = MatchStatDataset.source_files(arguments)
+
+        assert(source_files == [feather_path_for_csv(x) for x in csvs])
+        assert(MatchStatDataset.source_files(
+            dict(arguments, use_feather=False)) == csvs)
+
+        key = snapshot_key(MatchStatDataset, arguments, source_files)
+
+        monkeypatch.setattr(
+            'tdata.datasets.match_stat_dataset.FEATHER_VERSION',
+            FEATHER_VERSION + 1)
+
+        assert(snapshot_key(MatchStatDataset, arguments, source_files) !=
+               key)
+
+
+class TestSharedDataset(object):
+
+    def test_attached_dataset_answers_queries(self, match_stat_dataset,
+                                              tmp_path):
+
+        path = publish_dataset(match_stat_dataset,
+                               path=str(tmp_path / 'shared'))
+        attached = attach_dataset(path)
+
+        assert(attached.calculate_tour_average(2015) ==
+               match_stat_dataset.calculate_tour_average(2015))
+
+        for name in ['Roger Federer', 'Andy Murray']:
+
+            expected = match_stat_dataset.get_player_matches(
+                name, max_date=date(2016, 1, 1), surface='grass')
+            found = attached.get_player_matches(
+                name, max_date=date(2016, 1, 1), surface='grass')
+
+            assert([str(x) for x in found] == [str(x) for x in expected])
+
+    def test_attached_dataset_is_read_only(self, match_stat_dataset,
+                                           tmp_path):
+
+        path = publish_dataset(match_stat_dataset,
+                               path=str(tmp_path / 'shared'))
+        attached = attach_dataset(path)
+
+        with pytest.raises(ValueError):
+            attached.append(match_stat_dataset.get_stats_df().iloc[:2])
+
+
+class TestQueryBenchmark(object):
+
+    def test_query_mix_is_deterministic(self, match_stat_dataset):
+
+        first = make_query_mix(match_stat_dataset, queries_per_scenario=5)
+        second = make_query_mix(match_stat_dataset, queries_per_scenario=5)
+
+        assert(first == second)
+
+    def test_suite_covers_every_dataset(self, tmp_path):
+
+        pd.testing.assert_frame_equal(make_matches(max_year=2011),
+                                      make_matches(max_year=2011))
+
+        results = run_suite(queries_per_scenario=2, max_year=2011)
+
+        path = str(tmp_path / 'results.json')
+        save_results(results, path)
+        loaded = load_results(path)
+
+        assert(list(loaded['datasets']) == [
+            'MatchStatDataset', 'SackmannDataset', 'SofaScoreDataset',
+            'OnCourtDataset'])
+
+        for dataset_results in loaded['datasets'].values():
+            assert(dataset_results['overall']['count'] == 2 * len(
+                dataset_results['scenarios']))
+            assert(dataset_results['overall']['p99_ms'] >=
+                   dataset_results['overall']['p50_ms'])
+
+        assert(compare_results(loaded, loaded) == [])
+
+    def test_queries_run_with_cold_caches(self):
+
+        dataset = make_dataset('MatchStatDataset',
+                               make_matches(max_year=2011))
+        queries = make_query_mix(dataset, queries_per_scenario=1)
+        queries = [x for x in queries if x.method == 'get_player_matches']
+
+        def hits():
+            return dataset.cache_stats()['hits'].sum()
+
+        hits_before = hits()
+        run_benchmark(dataset, queries * 3)
+
+        assert(hits() == hits_before)
+
+        run_benchmark(dataset, queries * 3, warm_caches=True)
+
+        assert(hits() > hits_before)
+
+
+class TestInstrumentation(object):
+
+    def test_records_phases_queries_and_cache_use(self):
+
+        instrumentation.reset()
+        instrumentation.enable()
+
+        try:
+            dataset = make_dataset('MatchStatDataset',
+                                   make_matches(max_year=2011))
+            matches = list(dataset.get_player_matches('Player 000'))
+
+            for year in [2010, 2010, 2011]:
+                dataset.calculate_tour_average(year)
+        finally:
+            instrumentation.disable()
+
+        timings = instrumentation.timings()
+
+        assert(timings['MatchStatDataset.index']['rows'] ==
+               dataset.get_stats_df().shape[0])
+        assert(timings['MatchStatDataset.get_player_matches']['calls'] == 1)
+        assert(timings['MatchStatDataset.get_player_matches']['rows'] ==
+               len(matches))
+
+        assert(instrumentation.counters() == {
+            'MatchStatDataset.player_matches.miss': 1,
+            'MatchStatDataset.tour_averages.hit': 1,
+            'MatchStatDataset.tour_averages.miss': 2})
+
+        dataset.calculate_tour_average(2010)
+
+        assert(instrumentation.counters()[
+            'MatchStatDataset.tour_averages.hit'] == 1)
+
+        instrumentation.reset()
+
+    def test_times_iterating_the_matches_returned(self):
+
+        dataset = make_dataset('MatchStatDataset', make_matches(max_year=2010))
+        calculate_stats = dataset.calculate_stats
+
+        def slow_calculate_stats(*args, **kwargs):
+            time.sleep(0.01)
+            return calculate_stats(*args, **kwargs)
+
+        dataset.calculate_stats = slow_calculate_stats
+
+        instrumentation.reset()
+        instrumentation.enable()
+
+        try:
+            matches = dataset.get_player_matches('Player 000')
+
+            time.sleep(0.2)
+
+            matches = list(matches)
+        finally:
+            instrumentation.disable()
+
+        timing = instrumentation.timings()[
+            'MatchStatDataset.get_player_matches']
+
+        assert(timing['calls'] == 1)
+        assert(timing['rows'] == len(matches))
+        assert(0.01 * len(matches) <= timing['seconds'] <
+               0.01 * len(matches) + 0.2)
+
+        instrumentation.reset()
+
+
+class TestMatchStatsArray(object):
+
+    def test_agrees_with_calculate_stats(self, match_stat_dataset):
+
+        stats_array = match_stat_dataset.get_match_stats()
+        arrays = match_stat_dataset.column_arrays
+
+        assert(len(stats_array) == len(arrays))
+
+        serve_pcts = stats_array.pct_won_serve('winner')
+        return_pcts = stats_array.pct_won_return('loser')
+
+        for position in range(0, len(arrays), 997):
+
+            winner = arrays['winner'][position]
+            loser = arrays['loser'][position]
+
+            expected = match_stat_dataset.calculate_stats(
+                winner, loser, arrays.row(position))
+            view = stats_array.row(position)
+
+            assert(serve_pcts[position] ==
+                   pytest.approx(expected[winner].pct_won_serve))
+            assert(return_pcts[position] ==
+                   pytest.approx(expected[loser].pct_won_return))
+            assert(view[loser].serve_points_won ==
+                   expected[loser].serve_points_won)
+            assert(view[winner].player_name == winner)
+
+    def test_sackmann_stats_use_point_counts(self):
+
+        dataset = make_dataset('SackmannDataset', make_matches(max_year=2011))
+
+        matches = list(dataset.get_player_matches('Player 000'))
+        served = dataset.get_match_stats().pct_won_serve('winner')
+
+        assert(len(matches) > 0)
+        assert(matches[0].stats[matches[0].winner].pct_won_serve ==
+               pytest.approx(served[dataset.player_index.lookup(
+                   'Player 000')[0]]))
+
+
+class TestLinkage(object):
+
+    def make_records(self, rows):
+
+        return pd.DataFrame(rows, columns=['id', 'player_1', 'player_2',
+                                           'date'])
+
+    def test_links_across_conventions(self):
+
+        left = self.make_records([
+            ('a', 'Roger Federer', 'Rafael Nadal', pd.Timestamp(2017, 6, 26)),
+            ('b', 'Roger Federer', 'Rafael Nadal', pd.Timestamp(2017, 7, 3)),
+            ('c', 'Juan Martin del Potro', 'Alex DE Minaur',
+             pd.Timestamp(2018, 1, 15)),
+            ('d', 'Stan Wawrinka', 'Andy Murray', pd.Timestamp(2016, 5, 2))])
+
+        right = self.make_records([
+            (1, 'Nadal R.', 'Federer R.', pd.Timestamp(2017, 7, 5)),
+            (2, 'Federer Roger', 'Nadal Rafael', pd.Timestamp(2017, 6, 28)),
+            (3, 'Del Potro J.M.', 'De Minaur A.', pd.Timestamp(2018, 1, 17)),
+            (4, 'Dominic Thiem', 'Andy Murray', pd.Timestamp(2016, 5, 4))])
+
+        links = link_records(left, right, max_days=7)
+        linked = dict(zip(links['left_id'], links['right_id']))
+
+        assert(linked == {'a': '2', 'b': '1', 'c': '3'})
+        assert(links.set_index('left_id').loc['b', 'swapped'])
+        assert(name_similarity('darya kasatkina', 'daria kasatkina') > 0.85)
+
+    def test_dataset_records_link_to_themselves(self, match_stat_dataset):
+
+        records = dataset_records(match_stat_dataset).iloc[:2000]
+        links = link_records(records, records)
+
+        assert(links.shape[0] == records.shape[0])
+        assert((links['left_id'] == links['right_id']).all())
+
+    def test_existing_links_are_kept(self, tmpdir):
+
+        left = self.make_records([
+            ('a', 'Roger Federer', 'Rafael Nadal', pd.Timestamp(2017, 6, 26)),
+            ('b', 'Novak Djokovic', 'Andy Murray', pd.Timestamp(2017, 6, 26))])
+        right = self.make_records([
+            ('1', 'Federer R.', 'Nadal R.', pd.Timestamp(2017, 6, 28)),
+            ('2', 'N. Djokovic', 'Marray A.', pd.Timestamp(2017, 6, 28))])
+
+        links = link_records(left, right)
+        assert(list(links['left_id']) == ['a'])
+
+        manual = pd.DataFrame([{
+            'left_id': 'b', 'right_id': '2', 'score': 1.,
+            'day_difference': 2, 'swapped': False, 'method': 'manual'}])
+        path = str(tmpdir.join('links.csv'))
+        save_links(pd.concat([links, manual], ignore_index=True), path)
+
+        relinked = link_records(left, right, existing=load_links(path))
+
+        assert(list(relinked['left_id']) == ['a', 'b'])
+        assert(list(relinked['method']) == ['auto', 'manual'])
+
+    def test_integer_ids_survive_saving(self, tmpdir):
+
+        left = self.make_records([
+            ('z', 'Roger Federer', 'Rafael Nadal', pd.Timestamp(2017, 6, 26)),
+            ('z2', 'Novak Djokovic', 'Andy Murray',
+             pd.Timestamp(2017, 6, 26))])
+        right = self.make_records([
+            (2, 'Federer R.', 'Nadal R.', pd.Timestamp(2017, 6, 28)),
+            (3, 'Djokovic N.', 'Murray A.', pd.Timestamp(2017, 6, 28))])
+
+        path = str(tmpdir.join('links.csv'))
+        save_links(link_records(left.iloc[:1], right), path)
+
+        relinked = link_records(left, right, existing=load_links(path))
+
+        assert(list(relinked['left_id']) == ['z', 'z2'])
+        assert(list(relinked['right_id']) == ['2', '3'])
+        assert(list(relinked['method']) == ['auto', 'auto'])
+
+        save_links(relinked, path)
+
+        pd.testing.assert_frame_equal(load_links(path), relinked)
+
+
+class TestHeadToHead(object):
+
+    def test_agrees_with_player_matches(self, match_stat_dataset):
+
+        for first, second in [('Roger Federer', 'Novak Djokovic'),
+                              ('Andy Murray', 'Stan Wawrinka')]:
+
+            expected = [str(x) for x in match_stat_dataset.get_player_matches(
+                first, max_date=date(2017, 1, 1), surface='hard')
+                if second in (x.winner, x.loser)]
+
+            for player, opponent in [(first, second), (second, first)]:
+
+                found = match_stat_dataset.get_head_to_head(
+                    player, opponent, max_date=date(2017, 1, 1),
+                    surface='hard')
+
+                assert([str(x) for x in found] == expected)
+
+        assert(list(match_stat_dataset.get_head_to_head(
+            'Roger Federer', 'Nobody')) == [])
+
+    def test_totals_add_up_matches(self, match_stat_dataset):
+
+        totals = match_stat_dataset.get_head_to_head_totals(
+            ['Roger Federer', 'Nobody'], ['Rafael Nadal', 'Roger Federer'],
+            max_dates=[date(2018, 1, 1), None])
+
+        matches = list(match_stat_dataset.get_head_to_head(
+            'Roger Federer', 'Rafael Nadal', max_date=date(2018, 1, 1)))
+
+        assert(totals['matches'].tolist() == [len(matches), 0])
+        assert(totals.loc[0, 'wins'] ==
+               sum(x.winner == 'Roger Federer' for x in matches))
+        assert(totals.loc[0, 'return_points_won'] == sum(
+            x.stats['Roger Federer'].return_points_won for x in matches))
+
+    def test_append_extends_index(self, match_stat_dataset):
+
+        df = match_stat_dataset.get_stats_df()
+        cutoff = pd.Timestamp('2016-06-01')
+
+        dataset = MatchStatDataset(min_year=2014)
+        dataset.set_stats_df(df[df['start_date'] < cutoff].copy())
+        Dataset.__init__(dataset, start_date_is_exact=False)
+
+        dataset.append(df[df['start_date'] >= cutoff])
+
+        histories = dataset.get_head_to_head_histories(
+            ['Roger Federer', 'Alexander Zverev'],
+            ['Rafael Nadal', 'Roger Federer'])
+        expected = match_stat_dataset.get_head_to_head_histories(
+            ['Roger Federer', 'Alexander Zverev'],
+            ['Rafael Nadal', 'Roger Federer'])
+
+        assert(histories.lengths.tolist() == expected.lengths.tolist())
+        assert(histories.lengths[1] > 0)
+
+
+class TestCaches(object):
+
+    def test_lru_cache_evicts_least_recently_used(self):
+
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+
+        assert(cache.lookup('a') == (True, 1))
+
+        cache.put('c', 3)
+
+        assert('b' not in cache)
+        assert(cache.lookup('b') == (False, None))
+        assert(cache.discard(lambda key: key == 'a') == 1)
+        assert(cache.stats()['evictions'] == 1)
+        assert(cache.stats()['hit_rate'] == 0.5)
+
+    def test_player_matches_are_cached_and_invalidated(self):
+
+        matches = make_matches(max_year=2011)
+        first_year = matches[matches['year'] == 2010]
+
+        dataset = make_dataset('MatchStatDataset', first_year)
+        full = make_dataset('MatchStatDataset', matches)
+
+        for _ in range(2):
+            found = list(dataset.get_player_matches(
+                'Player 000', max_date=date(2012, 1, 1), lazy=True))
+
+        stats = dataset.cache_stats().loc['player_matches']
+        assert((stats['hits'], stats['misses']) == (1, 1))
+
+        dataset.calculate_tour_average(2011)
+        dataset.append(full.get_stats_df()[
+            full.get_stats_df()['year'] == 2011])
+
+        after = list(dataset.get_player_matches(
+            'Player 000', max_date=date(2012, 1, 1), lazy=True))
+        expected = list(full.get_player_matches(
+            'Player 000', max_date=date(2012, 1, 1), lazy=True))
+
+        assert(len(after) == len(expected) > len(found))
+        assert(dataset.calculate_tour_average(2011) ==
+               pytest.approx(full.calculate_tour_average(2011)))
+
+    def test_caches_are_bounded(self):
+
+        dataset = make_dataset('MatchStatDataset',
+                               make_matches(max_year=2010))
+        dataset.caches['player_matches'].resize(5)
+
+        for number in range(20):
+            dataset.get_player_matches('Player {:03d}'.format(number))
+
+        assert(len(dataset.caches['player_matches']) == 5)
+
+
+class TestColumnProfiles(object):
+
+    def test_core_profile_reads_fewer_columns(self, match_stat_dataset):
+
+        full = match_stat_dataset.get_stats_df()
+        core = MatchStatDataset(min_year=2014, columns='core').get_stats_df()
+
+        assert(core.shape[0] == full.shape[0])
+        assert(core.shape[1] < full.shape[1])
+        assert('h2h' not in core.columns)
+        pd.testing.assert_frame_equal(full[core.columns], core)
+
+    def test_stale_feather_files_are_converted_again(self, tmp_path):
+
+        csv_dir = tmp_path / 'year_csvs'
+        csv_dir.mkdir()
+        csv_path = str(csv_dir / '2016_atp.csv')
+        shutil.copy(find_year_csvs(min_year=2016)[0], csv_path)
+
+        # As written before the Feather files were versioned.
+        feather_path = feather_path_for_csv(csv_path)
+        os.makedirs(os.path.dirname(feather_path))
+        read_year_csv(csv_path).astype(str).reset_index(
+            drop=True).to_feather(feather_path)
+
+        assert(current_feather_schema(csv_path) is None)
+        pd.testing.assert_frame_equal(read_year_file(csv_path),
+                                      read_year_csv(csv_path))
+
+        assert(convert_year_csvs(str(csv_dir)) == [feather_path])
+        assert(convert_year_csvs(str(csv_dir)) == [])
+        assert(current_feather_schema(csv_path) is not None)
+
+        columns = ['winner', 'loser', 'start_date', 'not_a_column']
+
+        pd.testing.assert_frame_equal(
+            read_year_file(csv_path, columns=columns),
+            read_year_csv(csv_path, columns=columns))
+
+    def test_column_list_adds_to_core(self):
+
+        dataset = MatchStatDataset(min_year=2016, columns=['winner_aces'])
+        columns = dataset.get_stats_df().columns
+
+        assert('winner_aces' in columns)
+        assert('winner_serve_1st_won' in columns)
+        assert('loser_aces' not in columns)
+
+        with pytest.raises(ValueError):
+            MatchStatDataset(min_year=2016, columns='everything')
+
+
+class TestParallelLoading(object):
+
+    def test_read_files_keeps_order(self):
+
+        paths = list(range(20))
+
+        assert(read_files(str, paths, workers=4) == [str(x) for x in paths])
+        assert(read_files(str, paths, workers=1) == [str(x) for x in paths])
+
+        with pytest.raises(ValueError):
+            read_files(str, paths, workers=0)
+
+        with pytest.raises(ValueError):
+            read_files(str, paths, executor='gpu')
+
+    @pytest.mark.parametrize('executor', ['thread', 'process'])
+    def test_workers_load_the_same_matches(self, executor):
+
+        sequential = MatchStatDataset(min_year=2014, workers=1)
+        concurrent = MatchStatDataset(min_year=2014, workers=3,
+                                      executor=executor)
+
+        pd.testing.assert_frame_equal(sequential.get_stats_df(),
+                                      concurrent.get_stats_df())
+
+    def test_workers_share_snapshot(self, tmp_path):
+
+        MatchStatDataset.load_cached(snapshot_dir=str(tmp_path),
+                                     min_year=2016, workers=1)
+        MatchStatDataset.load_cached(snapshot_dir=str(tmp_path),
+                                     min_year=2016, workers=2)
+
+        assert(len(list(tmp_path.iterdir())) == 1)
+
+
+class TestElo(object):
+
+    def test_ratings_start_equal_and_follow_results(self, match_stat_dataset):
+
+        engine = EloEngine()
+        ratings = engine.compute(match_stat_dataset)
+
+        df = match_stat_dataset.get_stats_df()
+
+        assert(ratings.index.equals(df.index))
+        assert(ratings.notnull().all().all())
+
+        first = match_stat_dataset.date_index.positions[0]
+
+        assert(ratings['winner_elo'].iloc[first] == INITIAL_RATING)
+        assert(ratings['winner_elo_prob'].iloc[first] == 0.5)
+        assert(ratings['winner_expected_spw'].iloc[first] ==
+               pytest.approx(ratings['loser_expected_spw'].iloc[first]))
+
+        # Over many matches, the winners should mostly be favourites.
+        assert((ratings['winner_elo_prob'] > 0.5).mean() > 0.6)
+        assert((ratings['winner_blended_elo_prob'] > 0.5).mean() > 0.6)
+
+        current = engine.current_ratings()
+
+        assert(current.loc['Novak Djokovic', 'elo'] >
+               current['elo'].quantile(0.99))
+        assert(current['matches'].sum() == 2 * df.shape[0])
+
+    def test_update_matches_full_pass(self, match_stat_dataset):
+
+        df = match_stat_dataset.get_stats_df()
+        cutoff = pd.Timestamp('2016-06-01')
+
+        expected = EloEngine().compute(match_stat_dataset)
+
+        dataset = MatchStatDataset(min_year=2014)
+        dataset.set_stats_df(df[df['start_date'] < cutoff].copy())
+        Dataset.__init__(dataset, start_date_is_exact=False)
+
+        engine = EloEngine()
+        before = engine.compute(dataset)
+
+        new_rows = df[df['start_date'] >= cutoff]
+        dataset.append(new_rows)
+        after = engine.update(new_rows)
+
+        found = pd.concat([before, after])
+
+        pd.testing.assert_frame_equal(found, expected.loc[found.index])
+
+        with pytest.raises(ValueError):
+            engine.update(df[df['start_date'] < cutoff])
+
+    def test_rates_qualifying_rounds(self):
+
+        full = MatchStatDataset(min_year=2016, drop_qual=False)
+        df = full.get_stats_df()
+
+        assert(pd.to_numeric(df['round_number'], errors='coerce')
+               .isnull().any())
+
+        expected = EloEngine().compute(full)
+
+        assert(expected['winner_elo'].notnull().all())
+
+        cutoff = pd.Timestamp('2017-06-01')
+
+        dataset = MatchStatDataset(min_year=2016, drop_qual=False)
+        dataset.set_stats_df(df[df['start_date'] < cutoff].copy())
+        Dataset.__init__(dataset, start_date_is_exact=False)
+
+        engine = EloEngine()
+        before = engine.compute(dataset)
+        after = engine.update(df[df['start_date'] >= cutoff])
+
+        found = pd.concat([before, after])
+
+        pd.testing.assert_frame_equal(found, expected.loc[found.index])
+
+
+def row_wise_date_estimate(df):
+    """The loop estimate_date_using_round replaced, with rounds which are
+    not numeric keeping their start date."""
+
+    rounds = pd.to_numeric(df['round_number'], errors='coerce')
+    adjusted_dates = df['start_date'].copy()
+
+    tournament_years = set(
+        tuple(x) for x in df[['tournament_name', 'year']].values.tolist())
+
+    for cur_tournament, cur_year in tournament_years:
+
+        relevant = ((df['tournament_name'] == cur_tournament) &
+                    (df['year'] == cur_year) & rounds.notnull())
+
+        min_round = rounds[relevant].min()
+
+        adjusted_dates[relevant] += pd.to_timedelta(
+            rounds[relevant] - min_round, unit='D')
+
+    return adjusted_dates
+
+
+class TestMatchDates(object):
+
+    def test_estimate_matches_row_wise_loop(self, match_stat_dataset):
+
+        df = pd.DataFrame({
+            'tournament_name': ['A', 'A', 'A', 'A', 'B', 'B', 'A'],
+            'year': [2016, 2016, 2016, 2016, 2016, 2016, 2017],
+            'round_number': [3, 5, 'FQ', None, 2, 7., 4],
+            'start_date': pd.to_datetime(
+                ['2016-01-04'] * 4 + ['2016-02-01'] * 2 + ['2017-01-02'])},
+            index=list('abcdefg'))
+
+        estimated = match_stat_dataset.estimate_date_using_round(df)
+
+        pd.testing.assert_series_equal(estimated, row_wise_date_estimate(df))
+        assert(list(estimated.dt.day) == [4, 6, 4, 4, 1, 6, 2])
+
+        full = match_stat_dataset.get_stats_df()
+
+        pd.testing.assert_series_equal(
+            match_stat_dataset.get_match_dates(), row_wise_date_estimate(full))
+
+    def test_records_use_match_dates(self, match_stat_dataset):
+
+        records = dataset_records(match_stat_dataset)
+        df = match_stat_dataset.get_stats_df()
+
+        final = (df['round'] == 'F').values
+
+        assert((records['date'].values[final] >
+                df['start_date'].values[final]).all())
+
+
+class TestFeatherFiles(object):
+
+    def test_feather_reads_like_csv(self, tmp_path):
+
+        csv_dir = tmp_path / 'year_csvs'
+        csv_dir.mkdir()
+        csv_path = str(csv_dir / '2016_atp.csv')
+        shutil.copy(find_year_csvs(min_year=2016)[0], csv_path)
+
+        feather_path = feather_path_for_csv(csv_path)
+
+        assert(convert_year_csvs(str(csv_dir)) == [feather_path])
+
+        from_csv = read_year_csv(csv_path)
+        from_feather = read_year_file(csv_path)
+
+        pd.testing.assert_frame_equal(from_feather, from_csv)
+
+        # Missing strings are NaN, as from the csv, rather than None.
+        assert(from_feather['h2h'].isnull().any())
+        assert(not any(x is None for x in from_feather['h2h'].values))
+
+        # Updating the csv makes the Feather file stale.
+        later = os.path.getmtime(feather_path) + 10
+        os.utime(csv_path, (later, later))
+
+        assert(current_feather_schema(csv_path) is None)
+        assert(convert_year_csvs(str(csv_dir)) == [feather_path])
+
+
+class TestColumnArrays(object):
+
+    def test_rows_read_like_frame(self):
+
+        dataset = MatchStatDataset(min_year=2016, compact=True)
+
+        assert(not hasattr(dataset, 'dict_version'))
+
+        df = dataset.get_stats_df().iloc[:50].copy()
+
+        # Missing categorical entries read as NaN.
+        df.iloc[1, df.columns.get_loc('surface')] = np.nan
+        assert(pd.api.types.is_categorical_dtype(df['surface'].dtype))
+
+        column_arrays = ColumnArrays(df)
+
+        for position in [0, 1, 49]:
+
+            row = column_arrays.row(position)
+            expected = df.iloc[position]
+
+            assert(set(row) == set(df.columns))
+
+            for column_name in df.columns:
+
+                value = row[column_name]
+
+                if pd.isnull(expected[column_name]):
+                    assert(pd.isnull(value))
+                else:
+                    assert(value == expected[column_name])
+
+            assert(isinstance(row['start_date'], pd.Timestamp))
+
+    def test_matches_built_by_position(self):
+
+        dataset = MatchStatDataset(min_year=2017, stat_matches_only=False)
+        df = dataset.get_stats_df()
+
+        matches = list(dataset.get_player_matches('Roger Federer'))
+        expected = df[(df['winner'] == 'Roger Federer') |
+                      (df['loser'] == 'Roger Federer')]
+
+        assert(len(matches) == expected.shape[0])
+        assert(sorted(str(x.date) for x in matches) ==
+               sorted(str(x) for x in expected['start_date']))